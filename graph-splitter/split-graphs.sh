@@ -23,6 +23,9 @@ HS_SINK_FILE="$SINK_DIR/vql_started_at.txt"
 # File containing mapping between graph iri and base64-translated directory name.
 INDEX_FILE="$SINK_DIR/vql_graph_folder.csv"
 
+# Directory to write metrics of each run to, for the Prometheus textfile collector. Empty: do not write metrics.
+METRICS_DIR="${METRICS_DIR:-}"
+
 # File enabling processing of last real 'rdf_out_*' file by chained processes
 SHAM_PATCH_FILE="rdf_out_99999999999999-99999999999999"
 
@@ -61,13 +64,17 @@ COUNT_NQUADS=0
 # Count of files this run
 COUNT_FILES=0
 
+# Metrics of this run, as 'name{labels} value' or 'name value', see write_metrics.
+METRICS=()
+RUN_STARTED=$(date +%s.%N)
+
 
 ###############################
 # process_file
 # Read the header of the file and move the file to the appropriate directory. The name of the target directory is the
 # base64 translation of the graph iri.
 #
-# Globals:      SOURCE_DIR, SINK_DIR, COUNT_FILES, COUNT_NQUADS
+# Globals:      SOURCE_DIR, SINK_DIR, COUNT_FILES, COUNT_NQUADS, SHAM_PATCH_FILE
 # Arguments:    filename: the base name of the file to process.
 # Returns:      None
 process_file() {
@@ -102,6 +109,7 @@ process_file() {
     fi
 
     snk_file="$SINK_DIR/$base/$filename"
+    disable_processing_of_last_patch "$SINK_DIR/$base/"
     mv "$src_file" "$snk_file"
 
     # Statistics..
@@ -185,34 +193,85 @@ verify_handshake() {
 
 ###############################
 # disable_processing_of_last_patch
-# Disable processing of last real 'rdf_out_*' file in sink directories by chained processes.
+# Disable processing of last real 'rdf_out_*' file in a sink directory by chained processes. Called before a file
+# is filed to the directory, so directories that receive no files keep their sham file.
 #
-# Globals:      SINK_DIR, SHAM_PATCH_FILE
-# Arguments:    None
+# Globals:      SHAM_PATCH_FILE
+# Arguments:    dir: the sink directory, ending with '/'
 # Returns:      None
 disable_processing_of_last_patch() {
-    for dir in $SINK_DIR/*/; do
-        if [ -e "$dir$SHAM_PATCH_FILE" ]; then
-            rm "$dir$SHAM_PATCH_FILE"
-        fi
-    done
+    local dir="$1"
+    if [ -e "$dir$SHAM_PATCH_FILE" ]; then
+        rm "$dir$SHAM_PATCH_FILE"
+    fi
 }
 
 ###############################
 # enable_processing_of_last_patch
-# Enable processing of last real 'rdf_out_*' file in sink directories by chained processes.
+# Enable processing of last real 'rdf_out_*' file in sink directories by chained processes. Only directories without
+# a sham file, i.e. directories that received files this run or that were left without a sham file by an interrupted
+# run, get a new one, so watchers of chained processes see the other directories as unchanged.
 #
 # Globals:      SINK_DIR, SHAM_PATCH_FILE
 # Arguments:    None
 # Returns:      None
 enable_processing_of_last_patch() {
     for dir in $SINK_DIR/*/; do
-        if [ -d "$dir" ]; then
+        if [ -d "$dir" ] && [ ! -e "$dir$SHAM_PATCH_FILE" ]; then
             touch "$dir$SHAM_PATCH_FILE"
         fi
     done
 }
 
+###############################
+# write_metrics
+# Write the metrics of this run to METRICS_DIR as <basename>.prom for the Prometheus textfile collector and append
+# them as one line to the JSON run log <basename>.json. Metric names are those of the resourcesync-generator,
+# see resourcesync-generator/oai-rs/metrics.py.
+#
+# Globals:      METRICS_DIR, METRICS
+# Arguments:    basename: the file name without extension
+#               service: the value of the service label
+# Returns:      None
+write_metrics() {
+    local basename="$1"
+    local service="$2"
+    if [ -z "$METRICS_DIR" ]; then
+        return 0
+    fi
+    mkdir -p "$METRICS_DIR"
+    local prom="$METRICS_DIR/$basename.prom"
+    local json="" seen=" " metric name labels value
+    for metric in "${METRICS[@]}"; do
+        name="${metric%%[{ ]*}"
+        value="${metric##* }"
+        labels=""
+        if [[ "$metric" == *"{"* ]]; then
+            labels="${metric#*\{}"
+            labels=",${labels%%\}*}"
+        fi
+        if [[ "$seen" != *" $name "* ]]; then
+            echo "# TYPE $name gauge"
+            seen="$seen$name "
+        fi
+        echo "$name{service=\"$service\"$labels} $value"
+        json="$json, {\"name\": \"$name\", \"labels\": {$(echo "${labels#,}" | sed 's/\([a-z_]*\)="/"\1": "/g; s/",/", /g')}, \"value\": $value}"
+    done > "$prom.tmp"
+    mv "$prom.tmp" "$prom"
+    echo "{\"labels\": {\"service\": \"$service\"}, \"metrics\": [${json#, }]}" >> "$METRICS_DIR/$basename.json"
+}
+
+###############################
+# elapsed
+# Seconds elapsed since a point in time.
+#
+# Globals:      None
+# Arguments:    start: the point in time, as given by 'date +%s.%N'
+# Returns:      the elapsed seconds on &1
+elapsed() {
+    awk -v start="$1" -v now="$(date +%s.%N)" 'BEGIN { printf "%.3f", now - start }'
+}
+
 ###############################
 # change_owner_if_needed
 # Check if chown is requested, if so recursively change the owner of the files in SINK_DIR.
@@ -256,13 +315,14 @@ report_totals()
 }
 
 # Verify that handshake files in source directory and sink directory are equal.
+phase_started=$(date +%s.%N)
 verify_handshake
-
-# Disable processing of last real 'rdf_out_*' file in sink directories by chained processes.
-disable_processing_of_last_patch
+METRICS+=("vql_phase_seconds{phase=\"handshake\"} $(elapsed "$phase_started")")
 
 # distribute rdf-patch files in the source directory over directories per graph in the sink directory.
+phase_started=$(date +%s.%N)
 distribute_files_per_graph_iri
+METRICS+=("vql_phase_seconds{phase=\"split\"} $(elapsed "$phase_started")")
 
 # Enable processing of last real 'rdf_out_-*' file in sink directories by chained processes.
 enable_processing_of_last_patch
@@ -273,6 +333,11 @@ change_owner_if_needed
 # Keep track of filed files and N-Quads, echo the results of this run to the console.
 report_totals
 
+# Write metrics of this run.
+METRICS+=("vql_quads_exported $COUNT_NQUADS" "vql_files_exported $COUNT_FILES")
+METRICS+=("vql_run_seconds $(elapsed "$RUN_STARTED")" "vql_last_run_timestamp_seconds $(date +%s)")
+write_metrics graph_splitter graph-splitter
+
 
 
 
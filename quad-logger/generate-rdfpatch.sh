@@ -18,6 +18,19 @@ MAX_QUADS_PER_FILE=${MAX_QUADS_PER_FILE:-100000}
 # Should we dump the current state of the quad store and then exit.
 DUMP_AND_EXIT=${DUMP_AND_EXIT:-n}
 
+# Number of partitions of graphs that are dumped at the same time over separate connections. (max. 99)
+DUMP_PARTITIONS=${DUMP_PARTITIONS:-1}
+
+# Should we write rdf-patch files to a directory per graph, as the graph-splitter does.
+SPLIT_BY_GRAPH=${SPLIT_BY_GRAPH:-n}
+
+# Directory to write metrics of each run to, for the Prometheus textfile collector. Empty: do not write metrics.
+METRICS_DIR=${METRICS_DIR:-}
+
+# Strategy for buffering N-Quads per graph while parsing transaction logs: split|buffer|bounded.
+# Selects the file sql-proc/${BUFFER_STRATEGY}_nquads.sql.
+BUFFER_STRATEGY=${BUFFER_STRATEGY:-split}
+
 DEFAULT_EXCLUDED_GRAPHS="http://www.openlinksw.com/schemas/virtrdf# \
 http://www.w3.org/ns/ldp# \
 http://www.w3.org/2002/07/owl# \
@@ -44,6 +57,9 @@ fi
 # File for keeping last log suffix.
 LAST_LOG_SUFFIX="$DUMP_DIR/vql_lastlogsuffix.txt"
 
+# File with the position in the last transaction log up to which it was parsed.
+LAST_LOG_POSITION="$DUMP_DIR/vql_lastlogposition.txt"
+
 # File signalling stored procedures are up to date.
 MD5_STORED_PROCEDURES="md5_stored_procedures"
 
@@ -51,17 +67,30 @@ MD5_STORED_PROCEDURES="md5_stored_procedures"
 STARTED_AT_FILE="$DUMP_DIR/vql_started_at.txt"
 
 # File enabling processing of last real 'rdf_out_*' file by chained processes
-SHAM_RDF_OUT_FILE="$DUMP_DIR/rdf_out_99999999999999-99999999999999"
+SHAM_PATCH_FILE="rdf_out_99999999999999-99999999999999"
 
 # File with dump information, also used to check if a successful dump has been executed.
 DUMP_INFO_FILE="$DUMP_DIR/vql_rdfdump_info.txt"
 
+# File with the graphs per partition of a partitioned dump. Removed when the dump has been completed.
+DUMP_PLAN_FILE="$DUMP_DIR/vql_dump_plan.txt"
+
+# Directory where partitions of a partitioned dump write their files, out of sight of chained processes, until the
+# dump has been completed.
+DUMP_STAGING_DIR="$DUMP_DIR/.vql_dump_staging"
+
 # File with total number exported nquads thus far.
 COUNT_NQUADS_FILE="$DUMP_DIR/vql_nquads_count.txt"
 
 # File with total number exported files thus far.
 COUNT_NFILES_FILE="$DUMP_DIR/vql_files_count.txt"
 
+# Metrics of this run, as 'name{labels} value' or 'name value', see write_metrics.
+METRICS=()
+RUN_STARTED=$(date +%s.%N)
+RUN_NQUADS=0
+RUN_NFILES=0
+
 ##########################################################
 ## FUNCTIONS #############################################
 
@@ -116,7 +145,7 @@ write_md5_stored_procedures()
 # assert_procedures_stored
 # Assert that stored procedures are available on the Virtuoso server; insert them if needed.
 #
-# Globals:      INSERT_PROCEDURES, ISQL_CMD, ISQL_ERROR_FILE, MD5_STORED_PROCEDURES
+# Globals:      BUFFER_STRATEGY, INSERT_PROCEDURES, ISQL_CMD, ISQL_ERROR_FILE, MD5_STORED_PROCEDURES
 # Environment:  Procedure files are in the directory 'sql-proc', relative to current directory.
 # Arguments:    None
 # Returns:      None
@@ -124,9 +153,14 @@ write_md5_stored_procedures()
 assert_procedures_stored()
 {
 	# files are in the directory 'sql-proc'
-	local files=(utils.sql dump_nquads.sql parse_trx_logs.sql split_nquads.sql)
+	local files=(utils.sql dump_nquads.sql parse_trx_logs.sql "${BUFFER_STRATEGY}_nquads.sql")
 	# the number of procedures that start with 'vql_*'
-	local procedures_count=12
+	local procedures_count=16
+
+	if [ ! -f "sql-proc/${BUFFER_STRATEGY}_nquads.sql" ]; then
+		echo "Unknown buffer strategy '$BUFFER_STRATEGY'. Possible values: split|buffer|bounded" >&2
+		exit 1
+	fi
 
 	$ISQL_CMD <<-'EOF' > query_result 2>$ISQL_ERROR_FILE
 		SET CSV=ON;
@@ -191,6 +225,57 @@ assert_dump_completed_normal()
 	fi
 }
 
+###############################
+# split_rdfpatch
+# Split the stream on &0 into rdf-patch files, starting a new file at each line starting with marker.
+# Only lines starting with one of the characters in keep are written. Files are named prefix followed by a 14 digit
+# serial number. The last part of the stream only contains information on the run and is written to info_file,
+# if given. See split-rdfpatch.py.
+#
+# If SPLIT_BY_GRAPH is 'y' files are written to a directory per graph.
+#
+# Globals:      SPLIT_BY_GRAPH
+# Arguments:    prefix, marker, keep, info_file (optional), digits (optional, default 14)
+# Returns:      'checkpoint quad_count file_count last_trx_log last_trx_pos completed' of the last part of the stream on &1
+# Exit status:  1 if the stream was empty.
+split_rdfpatch()
+{
+	python split-rdfpatch.py --prefix "$1" --marker "$2" --keep "$3" --info_file "${4:-}" \
+		--digits "${5:-14}" --graph_dirs "$SPLIT_BY_GRAPH"
+}
+
+###############################
+# enable_processing_of_last_patch
+# Enable processing of last real 'rdf_out_*' file in DUMP_DIR and its graph directories by chained processes.
+# split-rdfpatch.py removes the sham file from a directory before it writes the first file to it, so only directories
+# that received files, or that were left without a sham file by an interrupted run, get a new sham file. Watchers of
+# chained processes see the other directories as unchanged.
+#
+# Globals:      DUMP_DIR, SHAM_PATCH_FILE
+# Arguments:    None
+# Returns:      None
+enable_processing_of_last_patch()
+{
+	for dir in "$DUMP_DIR"/ "$DUMP_DIR"/*/; do
+		if [ -d "$dir" ] && [ ! -e "$dir$SHAM_PATCH_FILE" ]; then
+			touch "$dir$SHAM_PATCH_FILE"
+		fi
+	done
+}
+
+###############################
+# sql_string
+# Escape a value for use in an SQL string literal. Graph iri's may contain single quotes.
+#
+# Globals:      None
+# Arguments:    value: the value to escape
+# Returns:      value with each single quote doubled on &1
+sql_string()
+{
+	local value="$1"
+	printf "%s" "${value//\'/\'\'}"
+}
+
 ###############################
 # dump_nquads
 # Call vql_dump_nquads on server.
@@ -201,7 +286,7 @@ assert_dump_completed_normal()
 dump_nquads()
 {
 	$ISQL_CMD <<-EOF 2>$ISQL_ERROR_FILE
-		vql_dump_nquads($MAX_QUADS_PER_FILE, '$EXCLUDED_GRAPHS');
+		vql_dump_nquads($MAX_QUADS_PER_FILE, '$(sql_string "$EXCLUDED_GRAPHS")');
 		exit;
 		EOF
 }
@@ -220,8 +305,8 @@ dump_nquads()
 # other processes trying to keep in sync with this one.
 # This method writes the timestamp of the for last transaction log to the file LAST_LOG_SUFFIX.
 #
-# Globals:      DUMP_DIR, LAST_LOG_SUFFIX, STARTED_AT_FILE, DUMP_INFO_FILE, COUNT_NQUADS_FILE, COUNT_NFILES_FILE,
-#               SHAM_RDF_OUT_FILE
+# Globals:      DUMP_DIR, LAST_LOG_SUFFIX, LAST_LOG_POSITION, STARTED_AT_FILE, DUMP_INFO_FILE, COUNT_NQUADS_FILE,
+#               COUNT_NFILES_FILE, SHAM_PATCH_FILE
 # Arguments:    None
 # Returns:      None
 execute_dump()
@@ -230,35 +315,259 @@ execute_dump()
 	printf $(date +"%Y%m%d%H%M%S") > "$STARTED_AT_FILE"
 
     local output="$DUMP_DIR/rdf_out_00000000000000-"
-	dump_nquads | grep "^#\|^\+" | csplit -f "$output" -n 14 -sz - "/^# at checkpoint  /" {*}
+	# The last part of the dump only contains information on the dump.
+	local lastfile="$DUMP_DIR/vql_rdfdump_info.tmp"
+	local info
+	info=$(dump_nquads | split_rdfpatch "$output" "# at checkpoint  " "#+" "$lastfile") || true
 	assert_no_isql_error
-	local lastfile=$(ls "$output"* | sort -r | head -n 1)
-	if [[ -z "${lastfile// }" ]]; then
+	if [[ -z "${info// }" ]]; then
         echo "Error: execute_dump ended abnormal." >&2
         exit 1
 	fi
 	assert_dump_completed_normal "$lastfile"
 
-	# The last file only contains information on the dump.
-	local checkpoint=$(cat $lastfile | grep "# at checkpoint" | sed -e s/[^0-9]//g)
-	local nquads=$(cat $lastfile | grep "# quad count" | sed -e s/[^0-9]//g)
-	local nfiles=$(cat $lastfile | grep "# file count" | sed -e s/[^0-9]//g)
+	local checkpoint nquads nfiles last_log last_pos completed
+	read -r checkpoint nquads nfiles last_log last_pos completed <<< "$info"
 
 	# Set the marker file to mark dump has completed
 	mv "$lastfile" "$DUMP_INFO_FILE"
 
-	# Write checkpoint as lastlogsuffix in dedicated file.
-	printf "$checkpoint" > "$LAST_LOG_SUFFIX"
+	# Write checkpoint as lastlogsuffix in dedicated file. Logs after the checkpoint are read from their start.
+	printf "${checkpoint%-}" > "$LAST_LOG_SUFFIX"
+	rm -f "$LAST_LOG_POSITION"
 
 	# Keep track of the number of exported N-Quads
 	printf "$nquads" > "$COUNT_NQUADS_FILE"
+	# Absent values are written as '-'.
+	if [[ "$nquads" =~ ^[0-9]+$ ]]; then RUN_NQUADS=$((RUN_NQUADS + nquads)); fi
+	if [[ "$nfiles" =~ ^[0-9]+$ ]]; then RUN_NFILES=$((RUN_NFILES + nfiles)); fi
 
 	# Keep track of the number of exported files
 	printf "$nfiles" > "$COUNT_NFILES_FILE"
 
 	# Processes in chain will not consider last file (in alphabetical sort order) with pattern rdf_out_*.
 	# Enable processing of last dump file by creating an extra file.
-	touch "$SHAM_RDF_OUT_FILE"
+	enable_processing_of_last_patch
+
+	# report
+	echo "Dump reported in '$DUMP_INFO_FILE'" >&2
+	echo "$(cat $DUMP_INFO_FILE)" >&2
+}
+
+###############################
+# start_dump
+# Call vql_dump_start on server.
+#
+# Globals:      EXCLUDED_GRAPHS
+# Arguments:    None
+# Returns:      checkpoint, trx file, checkpoint interval and graphs on &1
+start_dump()
+{
+	$ISQL_CMD <<-EOF 2>$ISQL_ERROR_FILE
+		vql_dump_start('$(sql_string "$EXCLUDED_GRAPHS")');
+		exit;
+		EOF
+}
+
+###############################
+# plan_partitions
+# Distribute the graphs listed by vql_dump_start over DUMP_PARTITIONS partitions. Graphs are assigned in descending
+# order of quad count to the partition with the least quads so far.
+#
+# Globals:      DUMP_PARTITIONS
+# Arguments:    path: path to the output of vql_dump_start
+# Returns:      a line '# partition      <partition> <graph iri>' for each graph on &1
+plan_partitions()
+{
+	grep "^# graph " "$1" | sort -k4,4nr | awk -v n="$DUMP_PARTITIONS" '
+		BEGIN { for (i = 0; i < n; i++) size[i] = 0 }
+		{
+			p = 0
+			for (i = 1; i < n; i++) if (size[i] < size[p]) p = i
+			size[p] += $4
+			printf "# partition      %d %s\n", p, $3
+		}'
+}
+
+###############################
+# plan_value
+# Get a value from DUMP_PLAN_FILE.
+#
+# Globals:      DUMP_PLAN_FILE
+# Arguments:    key: the key of the value, f.i. 'at checkpoint'
+# Returns:      the value on &1
+plan_value()
+{
+	grep "^# $1 " "$DUMP_PLAN_FILE" | sed "s/^# $1 *//"
+}
+
+###############################
+# dump_partition
+# Dump the graphs of one partition of DUMP_PLAN_FILE to rdf-patch-formatted files in the directory
+# DUMP_STAGING_DIR/pp with the name pattern 'rdf_out_00000000000000-ppxxxxxxxxxxxx', where 'pp' is the 2 digit
+# partition number and 'xxxxxxxxxxxx' is a 12 digit serial number. The files are moved to DUMP_DIR by
+# publish_staged_partitions when all partitions are done, so an earlier, unfinished run of the partition only left
+# files in its staging directory; these are removed first. The last part of the dump stream is written to
+# 'vql_dump_partition_pp.txt' when the partition has been dumped completely, which marks the partition as done.
+#
+# Globals:      DUMP_DIR, DUMP_STAGING_DIR, DUMP_PLAN_FILE, MAX_QUADS_PER_FILE, ISQL_CMD
+# Arguments:    partition: the partition number
+# Returns:      None
+# Exit status:  1 if the partition was not dumped completely.
+dump_partition()
+{
+	local partition="$1"
+	local pp=$(printf "%02d" "$partition")
+	local ISQL_ERROR_FILE="$DUMP_DIR/isql_partition_$pp.errors"
+	local lastfile="$DUMP_DIR/vql_dump_partition_$pp.tmp"
+	local stage="$DUMP_STAGING_DIR/$pp"
+	local checkpoint=$(plan_value "at checkpoint")
+	local graphs=$(awk -v p="$partition" '$2 == "partition" && $3 == p { printf "%s ", $4 }' "$DUMP_PLAN_FILE")
+
+	rm -rf "$stage"
+	mkdir -p "$stage"
+	if [ -z "$graphs" ]; then
+		printf "# at checkpoint  $checkpoint\n# quad count     0\n# file count     0\n" > "$DUMP_DIR/vql_dump_partition_$pp.txt"
+		return 0
+	fi
+
+	$ISQL_CMD <<-EOF 2>$ISQL_ERROR_FILE | split_rdfpatch "$stage/rdf_out_00000000000000-$pp" "# at checkpoint  " "#+" "$lastfile" 12 > /dev/null || true
+		vql_dump_graphs($MAX_QUADS_PER_FILE, '$(sql_string "$graphs")', '$checkpoint');
+		exit;
+		EOF
+	assert_no_isql_error
+	if ! grep -q "^# graphs done " "$lastfile" 2>/dev/null; then
+		echo "Error: dump of partition $pp ended abnormal." >&2
+		exit 1
+	fi
+	mv "$lastfile" "$DUMP_DIR/vql_dump_partition_$pp.txt"
+	rm -f "$ISQL_ERROR_FILE"
+	echo "Dumped partition $pp" >&2
+}
+
+###############################
+# publish_staged_partitions
+# Move the files of all partitions in DUMP_STAGING_DIR to DUMP_DIR, together with the graph directories they are in,
+# and remove DUMP_STAGING_DIR. Graph directories that are new to DUMP_DIR are added to its graph folder index.
+# The sham file is removed from each directory files are moved to, see enable_processing_of_last_patch.
+# Files that were moved already by an interrupted earlier call are skipped.
+#
+# Globals:      DUMP_DIR, DUMP_STAGING_DIR, SHAM_PATCH_FILE
+# Arguments:    None
+# Returns:      None
+publish_staged_partitions()
+{
+	local stage line iri dirname file
+	for stage in "$DUMP_STAGING_DIR"/*/; do
+		[ -d "$stage" ] || continue
+		if [ -e "${stage}vql_graph_folder.csv" ]; then
+			while IFS= read -r line; do
+				iri="${line%,*}"
+				dirname="${line##*,}"
+				if [ ! -d "$DUMP_DIR/$dirname" ]; then
+					mkdir "$DUMP_DIR/$dirname"
+					echo "$iri,$dirname" >> "$DUMP_DIR/vql_graph_folder.csv"
+				fi
+				rm -f "$DUMP_DIR/$dirname/$SHAM_PATCH_FILE"
+				for file in "$stage$dirname"/rdf_out_*; do
+					if [ -e "$file" ]; then
+						mv "$file" "$DUMP_DIR/$dirname/"
+					fi
+				done
+			done < "${stage}vql_graph_folder.csv"
+		fi
+		for file in "$stage"rdf_out_*; do
+			if [ -e "$file" ]; then
+				rm -f "$DUMP_DIR/$SHAM_PATCH_FILE"
+				mv "$file" "$DUMP_DIR/"
+			fi
+		done
+	done
+	rm -rf "$DUMP_STAGING_DIR"
+}
+
+###############################
+# execute_partitioned_dump
+# Dump all quads on the server in DUMP_PARTITIONS partitions of graphs at the same time, see dump_partition.
+# The graphs per partition are kept in DUMP_PLAN_FILE. If a partitioned dump did not complete, the next run only
+# dumps the partitions that were not done; the check that no transactions took place since the start of the
+# dump covers the whole dump. Partitions write to DUMP_STAGING_DIR; their files only appear in DUMP_DIR, where
+# chained processes pick them up, when the dump has been completed.
+# Writes the same files as execute_dump.
+#
+# Globals:      DUMP_DIR, DUMP_STAGING_DIR, DUMP_PLAN_FILE, DUMP_PARTITIONS, ISQL_CMD, LAST_LOG_SUFFIX, LAST_LOG_POSITION, STARTED_AT_FILE,
+#               DUMP_INFO_FILE, COUNT_NQUADS_FILE, COUNT_NFILES_FILE, SHAM_PATCH_FILE
+# Arguments:    None
+# Returns:      None
+# Exit status:  1 if one of the partitions or the dump did not complete normally.
+execute_partitioned_dump()
+{
+	if [ -e "$DUMP_PLAN_FILE" ]; then
+		echo "Resuming partitioned dump..." >&2
+		# automatic checkpoints may have been enabled by a restart of the server.
+		$ISQL_CMD <<-EOF > /dev/null 2>$ISQL_ERROR_FILE
+			checkpoint_interval(-1);
+			exit;
+			EOF
+		assert_no_isql_error
+	else
+		echo "Executing dump in $DUMP_PARTITIONS partitions..." >&2
+		printf $(date +"%Y%m%d%H%M%S") > "$STARTED_AT_FILE"
+		local plan="$DUMP_DIR/vql_dump_plan.tmp"
+		start_dump | grep "^# " > "$plan" || true
+		assert_no_isql_error
+		echo "# partitions     $DUMP_PARTITIONS" >> "$plan"
+		plan_partitions "$plan" >> "$plan"
+		mv "$plan" "$DUMP_PLAN_FILE"
+	fi
+
+	local partitions=$(plan_value "partitions")
+	local pids=() failed=0 partition
+	for ((partition = 0; partition < partitions; partition++)); do
+		if [ ! -e "$DUMP_DIR/vql_dump_partition_$(printf "%02d" "$partition").txt" ]; then
+			dump_partition "$partition" &
+			pids+=($!)
+		fi
+	done
+	for pid in "${pids[@]:-}"; do
+		if [ -n "$pid" ] && ! wait "$pid"; then
+			failed=1
+		fi
+	done
+	if [ "$failed" != 0 ]; then
+		echo "Error: partitioned dump did not complete. Unfinished partitions are dumped on the next run." >&2
+		exit 1
+	fi
+
+	local checkpoint=$(plan_value "at checkpoint") startdate=$(plan_value "dump started")
+	local lastfile="$DUMP_DIR/vql_rdfdump_info.tmp"
+	$ISQL_CMD <<-EOF 2>$ISQL_ERROR_FILE | grep "^# " > "$lastfile" || true
+		vql_dump_finish('$(plan_value "trx file")', '$startdate', $(plan_value "cp interval"));
+		exit;
+		EOF
+	assert_no_isql_error
+	assert_dump_completed_normal "$lastfile"
+	publish_staged_partitions
+
+	local nquads=$(cat "$DUMP_DIR"/vql_dump_partition_*.txt | awk '/^# quad count/ { n += $4 } END { print n + 0 }')
+	local nfiles=$(cat "$DUMP_DIR"/vql_dump_partition_*.txt | awk '/^# file count/ { n += $4 } END { print n + 0 }')
+	{
+		echo "# at checkpoint  $checkpoint"
+		echo "# dump started   $startdate"
+		cat "$lastfile"
+		echo "# quad count     $nquads"
+		echo "# file count     $nfiles"
+		echo "# partitions     $partitions"
+	} > "$DUMP_INFO_FILE"
+	rm "$lastfile" "$DUMP_PLAN_FILE" "$DUMP_DIR"/vql_dump_partition_*.txt
+
+	printf "$checkpoint" > "$LAST_LOG_SUFFIX"
+	rm -f "$LAST_LOG_POSITION"
+	printf "$nquads" > "$COUNT_NQUADS_FILE"
+	printf "$nfiles" > "$COUNT_NFILES_FILE"
+	RUN_NQUADS=$((RUN_NQUADS + nquads))
+	RUN_NFILES=$((RUN_NFILES + nfiles))
+	enable_processing_of_last_patch
 
 	# report
 	echo "Dump reported in '$DUMP_INFO_FILE'" >&2
@@ -269,7 +578,8 @@ execute_dump()
 # dump_if_needed
 # Check if an initial dump has to be made and execute dump if needed.
 #
-# Globals:      DUMP_INITIAL_STATE, DUMP_DIR, DUMP_INFO_FILE, STARTED_AT_FILE, COUNT_NQUADS_FILE, COUNT_NFILES_FILE
+# Globals:      DUMP_INITIAL_STATE, DUMP_DIR, DUMP_INFO_FILE, DUMP_PLAN_FILE, DUMP_PARTITIONS, STARTED_AT_FILE,
+#               COUNT_NQUADS_FILE, COUNT_NFILES_FILE
 # Arguments:    None
 # Returns:      None
 # Exit status:  1 if dump did not complete normally.
@@ -278,9 +588,13 @@ dump_if_needed()
 {
 	if [ "$DUMP_INITIAL_STATE" = "y" ]; then
 		if [ ! -e "$DUMP_INFO_FILE" ]; then
-				if ls "$DUMP_DIR/rdf_out_"* 1> /dev/null 2>&1; then
+				if [ -e "$DUMP_PLAN_FILE" ]; then
+					execute_partitioned_dump
+				elif ls "$DUMP_DIR/rdf_out_"* "$DUMP_DIR"/*/rdf_out_* 1> /dev/null 2>&1; then
 						echo "Error: 'rdf_out_-*' files found in '$DUMP_DIR'. Remove 'rdf_out_-*' files before dumping." >&2
 						exit 1
+				elif [ "$DUMP_PARTITIONS" -gt 1 ]; then
+					execute_partitioned_dump
 				else
 					execute_dump
 				fi
@@ -309,12 +623,14 @@ dump_if_needed()
 #
 # Globals:      MAX_QUADS_PER_FILE, LOG_FILE_LOCATION
 # Arguments:    latestlogsuffix: timestamp of last transaction log inspected
+#               latestlogposition: position up to which that log was parsed, -1 if it was parsed completely
 # Returns:      dump stream on &1, can be picked up with -
 parse_nquads()
 {
     local latestlogsuffix="$1"
+    local latestlogposition="$2"
 	$ISQL_CMD <<-EOF 2>$ISQL_ERROR_FILE
-		vql_parse_trx_files('$LOG_FILE_LOCATION', '$latestlogsuffix', $MAX_QUADS_PER_FILE);
+		vql_parse_trx_files('$LOG_FILE_LOCATION', '$latestlogsuffix', $MAX_QUADS_PER_FILE, $latestlogposition);
 		exit;
 		EOF
 }
@@ -328,20 +644,18 @@ parse_nquads()
 # the last file with this name pattern. This method will create a sham file with the name
 # 'rdf_out_99999999999999-99999999999999' when finished,
 # thus enabling the processing of the last real 'rdf_out_*' file.
-# This method writes the timestamp of the last transaction log processed to the file LAST_LOG_SUFFIX.
+# This method writes the timestamp of the last transaction log processed to the file LAST_LOG_SUFFIX and the
+# position up to which that log was processed to the file LAST_LOG_POSITION. The newest transaction log is processed
+# up to its last complete record, the next run resumes at that position.
 # This method reads and keeps track of the amount of N-Quads and files processed in the files COUNT_NQUADS_FILE
 # and COUNT_NFILES_FILE.
 #
-# Globals:      DUMP_DIR, SHAM_RDF_OUT_FILE, LAST_LOG_SUFFIX, COUNT_NQUADS_FILE, COUNT_NFILES_FILE, STARTED_AT_FILE
+# Globals:      DUMP_DIR, SHAM_PATCH_FILE, LAST_LOG_SUFFIX, LAST_LOG_POSITION, COUNT_NQUADS_FILE, COUNT_NFILES_FILE,
+#               STARTED_AT_FILE
 # Arguments:    None
 # Returns:      None
 sync_transaction_logs()
 {
-    if [ -e "$SHAM_RDF_OUT_FILE" ]; then
-		# Prevent posible synchronous processing of the last rdf_out_* file.
-		rm "$SHAM_RDF_OUT_FILE"
-	fi
-
     local exp_nquads=$(<"$COUNT_NQUADS_FILE")
     local exp_nfiles=$(<"$COUNT_NFILES_FILE")
 
@@ -349,35 +663,39 @@ sync_transaction_logs()
 	if [ -e "$LAST_LOG_SUFFIX" ]; then
 		latestlogsuffix=$(<"$LAST_LOG_SUFFIX")
 	fi
-	echo "Reading transaction logs. Last log read had timestamp $latestlogsuffix" >&2
+	local latestlogposition=-1
+	if [ -s "$LAST_LOG_POSITION" ]; then
+		latestlogposition=$(<"$LAST_LOG_POSITION")
+	fi
+	echo "Reading transaction logs. Last log read had timestamp $latestlogsuffix, position $latestlogposition" >&2
 
 	# write nquads to marked output file
 	local mark=$(date +"%Y%m%d%H%M%S")
 	local output="$DUMP_DIR/rdf_out_$mark-"
 
-    parse_nquads "$latestlogsuffix" | grep "^#\|^\+\|^-" | csplit -f "$output" -n 14 -sz - "/^# at checkpoint /" {*}
+    # The last part of the stream only contains information on the sync and is not kept.
+	local info
+	info=$(parse_nquads "$latestlogsuffix" "$latestlogposition" | split_rdfpatch "$output" "# at checkpoint " "#+-") || true
 	assert_no_isql_error
-
-    # The last file only contains information on the sync.
-	local lastfile=$(ls "$output"* | sort -r | head -n 1)
-	if [[ -z "${lastfile// }" ]]; then
+	if [[ -z "${info// }" ]]; then
         echo "Error: sync_transaction_logs ended abnormal." >&2
         exit 1
 	fi
-	local nquads=$(cat $lastfile | grep "# quad count" | sed -e s/[^0-9]//g)
-	local nfiles=$(cat $lastfile | grep "# file count" | sed -e s/[^0-9]//g)
-	local last_log=$(cat $lastfile | grep "# last trx log" | sed -e s/[^0-9]//g)
-	rm "$lastfile"
+	local checkpoint nquads nfiles last_log last_pos completed
+	read -r checkpoint nquads nfiles last_log last_pos completed <<< "$info"
 
-    # Write lastlogsuffix in dedicated file.
-	printf "$last_log" > "$LAST_LOG_SUFFIX"
+    # Write lastlogsuffix and the position in that log in dedicated files.
+	printf "${last_log%-}" > "$LAST_LOG_SUFFIX"
+	printf "${last_pos%-}" > "$LAST_LOG_POSITION"
 
 	# Processes in chain will not consider last file (in alphabetical sort order) with pattern rdf_out_*.
 	# Enable processing of last patch file by creating an extra file.
-	touch "$SHAM_RDF_OUT_FILE"
+	enable_processing_of_last_patch
 
 	# Keep scores...
     if [ "$nquads" -gt 0 ]; then
+	    RUN_NQUADS=$((RUN_NQUADS + nquads))
+	    RUN_NFILES=$((RUN_NFILES + nfiles))
 	    exp_nquads=$((exp_nquads + nquads))
 	    printf "$exp_nquads" > "$COUNT_NQUADS_FILE"
 	    exp_nfiles=$((exp_nfiles + nfiles))
@@ -389,6 +707,57 @@ sync_transaction_logs()
 
 }
 
+###############################
+# write_metrics
+# Write the metrics of this run to METRICS_DIR as <basename>.prom for the Prometheus textfile collector and append
+# them as one line to the JSON run log <basename>.json. Metric names are those of the resourcesync-generator,
+# see resourcesync-generator/oai-rs/metrics.py.
+#
+# Globals:      METRICS_DIR, METRICS
+# Arguments:    basename: the file name without extension
+#               service: the value of the service label
+# Returns:      None
+write_metrics()
+{
+	local basename="$1"
+	local service="$2"
+	if [ -z "$METRICS_DIR" ]; then
+		return 0
+	fi
+	mkdir -p "$METRICS_DIR"
+	local prom="$METRICS_DIR/$basename.prom"
+	local json="" seen=" " metric name labels value
+	for metric in "${METRICS[@]}"; do
+		name="${metric%%[{ ]*}"
+		value="${metric##* }"
+		labels=""
+		if [[ "$metric" == *"{"* ]]; then
+			labels="${metric#*\{}"
+			labels=",${labels%%\}*}"
+		fi
+		if [[ "$seen" != *" $name "* ]]; then
+			echo "# TYPE $name gauge"
+			seen="$seen$name "
+		fi
+		echo "$name{service=\"$service\"$labels} $value"
+		json="$json, {\"name\": \"$name\", \"labels\": {$(echo "${labels#,}" | sed 's/\([a-z_]*\)="/"\1": "/g; s/",/", /g')}, \"value\": $value}"
+	done > "$prom.tmp"
+	mv "$prom.tmp" "$prom"
+	echo "{\"labels\": {\"service\": \"$service\"}, \"metrics\": [${json#, }]}" >> "$METRICS_DIR/$basename.json"
+}
+
+###############################
+# elapsed
+# Seconds elapsed since a point in time.
+#
+# Globals:      None
+# Arguments:    start: the point in time, as given by 'date +%s.%N'
+# Returns:      the elapsed seconds on &1
+elapsed()
+{
+	awk -v start="$1" -v now="$(date +%s.%N)" 'BEGIN { printf "%.3f", now - start }'
+}
+
 ###############################
 # change_owner_if_needed
 # Check if chown is requested, if so recursively change the owner of the files in DUMP_DIR.
@@ -416,10 +785,19 @@ assert_procedures_stored
 assert_virtuoso_configuration
 
 # Check if an initial dump has to be made and execute dump if needed.
+phase_started=$(date +%s.%N)
 dump_if_needed
+METRICS+=("vql_phase_seconds{phase=\"dump\"} $(elapsed "$phase_started")")
 
 # Parse newly found transaction logs to rdf patch files.
+phase_started=$(date +%s.%N)
 sync_transaction_logs
+METRICS+=("vql_phase_seconds{phase=\"parse\"} $(elapsed "$phase_started")")
+
+# Write metrics of this run.
+METRICS+=("vql_quads_exported $RUN_NQUADS" "vql_files_exported $RUN_NFILES")
+METRICS+=("vql_run_seconds $(elapsed "$RUN_STARTED")" "vql_last_run_timestamp_seconds $(date +%s)")
+write_metrics quad_logger quad-logger
 
 # Check if chown is requested, if so recursively change the owner of the files in DUMP_DIR.
 change_owner_if_needed
@@ -0,0 +1,210 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Split the output stream of vql_dump_nquads, vql_dump_graphs or vql_parse_trx_files into rdf-patch files, as
+#
+#   grep "^#\|^\+\|^-" | csplit -f "$prefix" -n 14 -sz - "/^$marker/" {*}
+#
+# does, in one pass over the stream, with the number of digits of -n given by --digits. Each file is written under a
+# temporary name and renamed when complete.
+# The last part of the stream only contains information on the run. It is not written as an rdf-patch file;
+# if --info_file is given it is written to that file.
+# The values of the information part are written to stdout on one line, separated by spaces:
+#
+#   checkpoint quad_count file_count last_trx_log last_trx_pos completed
+#
+# where completed is 'y' if the information part has a '# dump completed' line and 'n' otherwise.
+# Absent values are written as '-'.
+#
+# With --graph_dirs, files with a '# graph' header are written to the subdirectory of the directory of prefix that
+# is named after the url safe base64 translation of the graph iri, as the graph-splitter does. The mapping of
+# graph iri to directory name is kept in vql_graph_folder.csv.
+#
+# The sham file rdf_out_99999999999999-99999999999999 is removed from each directory before the first file is written
+# to it, so chained processes do not take the last file of a directory that is being written to. Directories that
+# receive no files keep their sham file. See enable_processing_of_last_patch in generate-rdfpatch.sh.
+#
+# Exit status:  1 if the stream was empty.
+
+import base64
+import os
+import re
+import sys
+from argparse import ArgumentParser
+
+BLOCK_SIZE = 1024 * 1024
+
+INFO_KEYS = [("checkpoint", b"# at checkpoint"),
+             ("quad_count", b"# quad count"),
+             ("file_count", b"# file count"),
+             ("last_trx_log", b"# last trx log"),
+             ("last_trx_pos", b"# last trx pos")]
+DUMP_COMPLETED = b"# dump completed "
+GRAPH_HEADER = b"# graph "
+FILE_INDEX = "vql_graph_folder.csv"
+SHAM_PATCH_FILE = "rdf_out_99999999999999-99999999999999"
+
+
+class PatchSplitter(object):
+    """
+    Writes lines of a stream to successive files, starting a new file at each line that starts with marker.
+    """
+
+    def __init__(self, prefix, marker, keep, digits=14, graph_dirs=False):
+        """
+        :param prefix: path and file name prefix of the files to write
+        :param marker: start a new file at lines that start with marker
+        :param keep: only lines that start with one of these characters are written
+        :param digits: the number of digits of the serial number in file names
+        :param graph_dirs: write files with a graph header to a subdirectory per graph
+        """
+        self.prefix = prefix
+        self.graph_dirs = graph_dirs
+        self.graph_folders = None
+        self.disabled_dirs = set()
+        self.graph = None
+        self.marker = marker
+        self.keep = tuple(keep[i:i + 1] for i in range(len(keep)))
+        self.digits = digits
+        self.count = 0
+        self.out = None
+        self.tmp_path = None
+        self.info = {}
+
+    def split(self, stream, info_file=None):
+        """
+        Split stream into files.
+        :param stream: binary stream to read from
+        :param info_file: path to write the last part of the stream to. Default: None, do not keep the last part
+        :return: dictionary of values found in the last part of the stream, or None if no part was found
+        """
+        rest = b""
+        while True:
+            block = stream.read(BLOCK_SIZE)
+            if not block:
+                break
+            lines = (rest + block).split(b"\n")
+            rest = lines.pop()
+            for line in lines:
+                self.write_line(line)
+        if rest:
+            self.write_line(rest)
+
+        if self.out is None:
+            return None
+        self.out.close()
+        if info_file:
+            os.rename(self.tmp_path, info_file)
+        else:
+            os.remove(self.tmp_path)
+        return self.info
+
+    def write_line(self, line):
+        if not line.startswith(self.keep):
+            return
+        if self.out is None or line.startswith(self.marker):
+            self.next_file()
+        if line.startswith(b"#"):
+            self.collect(line)
+        self.out.write(line)
+        self.out.write(b"\n")
+
+    def next_file(self):
+        """
+        Complete the current file and start the next one.
+        """
+        if self.out is not None:
+            self.out.close()
+            path = self.path(self.count)
+            self.disable_processing_of_last_patch(os.path.dirname(path))
+            os.rename(self.tmp_path, path)
+            self.count += 1
+        # several splitters may write to the same directory, each with its own prefix
+        self.tmp_path = os.path.join(os.path.dirname(self.prefix), "vql_split_%s.tmp" % os.path.basename(self.prefix))
+        self.out = open(self.tmp_path, "wb", BLOCK_SIZE)
+        self.info = {}
+        self.graph = None
+
+    def path(self, index):
+        name = "%s%0*d" % (os.path.basename(self.prefix), self.digits, index)
+        directory = os.path.dirname(self.prefix)
+        if self.graph_dirs and self.graph:
+            directory = os.path.join(directory, self.graph_folder(self.graph))
+        return os.path.join(directory, name)
+
+    def disable_processing_of_last_patch(self, directory):
+        """
+        Remove the sham file from directory, once per run.
+        :param directory: the directory a file is written to
+        """
+        if directory in self.disabled_dirs:
+            return
+        sham_file = os.path.join(directory, SHAM_PATCH_FILE)
+        if os.path.exists(sham_file):
+            os.remove(sham_file)
+        self.disabled_dirs.add(directory)
+
+    def graph_folder(self, graph):
+        """
+        Get the name of the directory for graph, create it and add it to the index file if it does not exist.
+        :param graph: the graph iri
+        :return: the name of the directory
+        """
+        index_path = os.path.join(os.path.dirname(self.prefix), FILE_INDEX)
+        if self.graph_folders is None:
+            self.graph_folders = {}
+            if os.path.isfile(index_path):
+                with open(index_path, "rb") as index_file:
+                    for line in index_file:
+                        if b"," in line:
+                            iri, dirname = line.rstrip(b"\n").rsplit(b",", 1)
+                            self.graph_folders[iri] = dirname.decode("ascii")
+
+        dirname = self.graph_folders.get(graph)
+        if dirname is None:
+            dirname = base64.urlsafe_b64encode(graph + b"\n").decode("ascii")
+            self.graph_folders[graph] = dirname
+        directory = os.path.join(os.path.dirname(self.prefix), dirname)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+            with open(index_path, "ab") as index_file:
+                index_file.write(graph + b"," + dirname.encode("ascii") + b"\n")
+        return dirname
+
+    def collect(self, line):
+        if self.graph is None and line.startswith(GRAPH_HEADER):
+            self.graph = line[len(GRAPH_HEADER):].strip()
+        for key, start in INFO_KEYS:
+            if line.startswith(start):
+                self.info[key] = re.sub(b"[^0-9]", b"", line).decode("ascii")
+        if line.startswith(DUMP_COMPLETED):
+            self.info["completed"] = "y"
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    # parser arguments:
+    # --prefix: path and file name prefix of rdf-patch files, f.i. /output/rdf_out_20160712144328-
+    # --marker: start a new file at lines starting with this marker, f.i. '# at checkpoint '
+    # --keep: only keep lines starting with one of these characters. Default: '#+-'
+    # --info_file: path to write the last part of the stream to. Default: do not keep the last part
+    # --graph_dirs: 'y' to write files to a subdirectory per graph. Default: 'n'
+    # --digits: the number of digits of the serial number in file names. Default: 14
+    parser.add_argument('--prefix', required=True)
+    parser.add_argument('--marker', required=True)
+    parser.add_argument('--keep', default="#+-")
+    parser.add_argument('--info_file', default="")
+    parser.add_argument('--graph_dirs', default="n")
+    parser.add_argument('--digits', type=int, default=14)
+    args = parser.parse_args()
+
+    stdin = getattr(sys.stdin, "buffer", sys.stdin)
+    splitter = PatchSplitter(args.prefix, args.marker.encode("utf-8"), args.keep.encode("utf-8"),
+                             digits=args.digits, graph_dirs=args.graph_dirs == "y")
+    info = splitter.split(stdin, args.info_file)
+    if info is None:
+        sys.stderr.write("No rdf-patch found in input stream.\n")
+        sys.exit(1)
+
+    values = [info.get(key) or "-" for key, start in INFO_KEYS] + [info.get("completed", "n")]
+    sys.stdout.write(" ".join(values) + "\n")
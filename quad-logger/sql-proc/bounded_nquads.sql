@@ -0,0 +1,142 @@
+-- This file follows procedure signatures of split_nquads.sql and buffer_nquads.sql, making the files interchangeable.
+
+-- Translate raw input into RDF-patch formatted N-Quads; subdivide N-Quads over graph iri, buffer N-Quads up to
+-- maxq per graph iri, output N-Quads per graph when maxq has been reached.
+--
+-- This strategy keeps quads per graph in chunks of a fixed size, so that adding a quad only copies the chunk that
+-- is being filled, never all quads of the graph. The total number of quads buffered over all graphs is limited:
+-- when the limit is reached, the graph with most quads buffered is output first.
+-- The limit defaults to 4 * maxq and can be set in the registry, f.i.
+--      registry_set('vql_max_buffered_quads', '1000000');
+--
+-- Layout of the buffer dict:
+--      'counts'    dict of graph iri -> number of quads buffered for the graph
+--      'heads'     dict of graph iri -> chunk being filled
+--      'chunks'    dict of vector(graph iri, chunk index) -> full chunk
+--      'buffered'  number of quads buffered over all graphs
+--      'budget'    maximum number of quads buffered over all graphs
+CREATE PROCEDURE vql_buffer_nquad(IN op ANY, IN raw_s ANY, IN raw_p ANY, IN raw_o ANY, IN raw_g ANY,
+        IN buffer ANY, IN report ANY, IN at_checkpoint VARCHAR, IN maxq INT := 100000) {
+
+    DECLARE qline, g_iri VARCHAR;
+    DECLARE counts, heads, chunks, head, budget, g, c, largest ANY;
+    DECLARE n, pos, chunk_size, max_n INT;
+
+    chunk_size := 256;
+
+    -- increase quad count in report
+    dict_inc_or_put(report, 'quad_count', 1);
+
+    counts := dict_get(buffer, 'counts');
+    if (counts is null) {
+        -- Dictionary objects are always passed by reference.
+        counts := dict_new();
+        dict_put(buffer, 'counts', counts);
+        dict_put(buffer, 'heads', dict_new());
+        dict_put(buffer, 'chunks', dict_new());
+        dict_put(buffer, 'buffered', 0);
+        budget := registry_get('vql_max_buffered_quads');
+        if (isstring(budget) and atoi(budget) > 0) {
+            dict_put(buffer, 'budget', atoi(budget));
+        } else {
+            dict_put(buffer, 'budget', 4 * maxq);
+        }
+    }
+    heads := dict_get(buffer, 'heads');
+    chunks := dict_get(buffer, 'chunks');
+
+    g_iri := __ro2sq(raw_g);
+    qline := vql_create_nquad(op, raw_s, raw_p, raw_o, raw_g, dict_get(report, 'iris'));
+
+    n := dict_get(counts, g_iri, 0);
+    pos := mod(n, chunk_size);
+    head := dict_get(heads, g_iri);
+    if (head is null) {
+        head := make_array(chunk_size, 'any');
+    }
+    aset(head, pos, qline);
+    if (pos = chunk_size - 1) {
+        dict_put(chunks, vector(g_iri, n / chunk_size), head);
+        dict_remove(heads, g_iri);
+    } else {
+        dict_put(heads, g_iri, head);
+    }
+    n := n + 1;
+    dict_put(counts, g_iri, n);
+    dict_inc_or_put(buffer, 'buffered', 1);
+
+    if (n >= maxq) {
+        vql_print_graph(g_iri, buffer, at_checkpoint, report);
+    } else if (dict_get(buffer, 'buffered', 0) >= dict_get(buffer, 'budget', 0)) {
+        -- output the graph with most quads buffered
+        max_n := 0;
+        dict_iter_rewind(counts);
+        while (dict_iter_next(counts, g, c)) {
+            if (c > max_n) {
+                max_n := c;
+                largest := g;
+            }
+        }
+        dbg_printf('VQL: Buffer limit of %d quads reached', dict_get(buffer, 'budget', 0));
+        vql_print_graph(largest, buffer, at_checkpoint, report);
+    }
+}
+
+
+CREATE PROCEDURE vql_print_buffer(IN buffer ANY, IN report ANY, IN at_checkpoint VARCHAR) {
+
+    DECLARE counts, g_iris ANY;
+    DECLARE i INT;
+
+    counts := dict_get(buffer, 'counts');
+    if (counts is not null) {
+        g_iris := dict_list_keys(counts, 0);
+        for (i := 0; i < length(g_iris); i := i + 1) {
+            vql_print_graph(g_iris[i], buffer, at_checkpoint, report);
+        }
+    }
+}
+
+
+-- In this strategy g_name is the graph iri and g_vector is the buffer dict. Quads of the graph are removed from
+-- the buffer after output.
+CREATE PROCEDURE vql_print_graph(IN g_name STRING, IN g_vector ANY, IN at_checkpoint VARCHAR, IN report ANY) {
+
+    DECLARE counts, heads, chunks, chunk ANY;
+    DECLARE len, full, rest, chunk_size, j, k INT;
+
+    chunk_size := 256;
+
+    counts := dict_get(g_vector, 'counts');
+    heads := dict_get(g_vector, 'heads');
+    chunks := dict_get(g_vector, 'chunks');
+
+    len := dict_get(counts, g_name, 0);
+    if (len > 0) {
+        dbg_printf('VQL: Exporting %d N-Quads from graph %s', len, g_name);
+        -- increase file count in report
+        dict_inc_or_put(report, 'file_count', 1);
+        -- header
+        result(concat('# at checkpoint  ', at_checkpoint));
+        result(concat('# graph          ', g_name));
+
+        full := len / chunk_size;
+        for (k := 0; k < full; k := k + 1) {
+            chunk := dict_get(chunks, vector(g_name, k));
+            for (j := 0; j < chunk_size; j := j + 1) {
+                result(chunk[j]);
+            }
+            dict_remove(chunks, vector(g_name, k));
+        }
+        rest := mod(len, chunk_size);
+        if (rest > 0) {
+            chunk := dict_get(heads, g_name);
+            for (j := 0; j < rest; j := j + 1) {
+                result(chunk[j]);
+            }
+        }
+        dict_remove(heads, g_name);
+        dict_remove(counts, g_name);
+        dict_put(g_vector, 'buffered', dict_get(g_vector, 'buffered', 0) - len);
+    }
+}
@@ -15,7 +15,7 @@ CREATE PROCEDURE vql_buffer_nquad(IN op ANY, IN raw_s ANY, IN raw_p ANY, IN raw_
     dict_inc_or_put(report, 'quad_count', 1);
 
     g_iri := __ro2sq(raw_g);
-    qline := vql_create_nquad(op, raw_s, raw_p, raw_o, raw_g);
+    qline := vql_create_nquad(op, raw_s, raw_p, raw_o, raw_g, dict_get(report, 'iris'));
     g_name := encode_base64(g_iri);
 
     g_vector := dict_get(buffer, g_name); -- g_vector may be <DB NULL>
@@ -17,6 +17,7 @@ CREATE PROCEDURE vql_dump_nquads(IN maxq INT := 100000, IN excluded_graphs VARCH
     result_names(nquad);
     buffer := dict_new(); -- Dictionary objects are always passed by reference.
     report := dict_new();
+    dict_put(report, 'iris', dict_new()); -- cache of formatted graph and predicate iris, see vql_create_nquad.
 
     startdate := datestring_GMT(now());
     SET isolation = 'serializable';
@@ -95,6 +96,149 @@ CREATE PROCEDURE vql_dump_nquads(IN maxq INT := 100000, IN excluded_graphs VARCH
 --      FILTER ( sql:vql_exclude_iri(?g, ?:excludes) = 0 )
 
 
+-- A dump partitioned by graph runs in three steps:
+--      vql_dump_start: set a checkpoint, disable automatic checkpoints and list the graphs to dump.
+--      vql_dump_graphs: dump a set of graphs. Disjoint sets of graphs can be dumped over several connections at the
+--              same time.
+--      vql_dump_finish: check that no transactions took place since the start of the dump and enable automatic
+--              checkpoints.
+-- The output of vql_dump_graphs is the same as that of vql_dump_nquads for the graphs in the set.
+
+-- Start a dump partitioned by graph. Outputs the checkpoint, the current transaction file, the saved checkpoint
+-- interval and a line with iri and quad count for each graph that is not excluded.
+-- Parameters:
+--      excluded_graphs: a space-separated string of graph iris that will be excluded from the dump.
+--              Default value is -, not excluding graphs.
+CREATE PROCEDURE vql_dump_start(IN excluded_graphs VARCHAR := '-') {
+
+    DECLARE nquad, excludes, at_checkpoint, currenttrx ANY;
+    DECLARE cpinterval    INTEGER;
+
+    result_names(nquad);
+
+    -- disable automatic checkpoints during dump, vql_dump_finish enables them.
+    cpinterval := checkpoint_interval (-1);
+
+    DECLARE EXIT HANDLER FOR SQLSTATE '*' {
+        checkpoint_interval (cpinterval);
+        result(concat('# ERROR [', __SQL_STATE, '] ',  __SQL_MESSAGE));
+        resignal;
+    };
+
+    -- Set a checkpoint
+    EXEC ('CHECKPOINT');
+    -- Full path to current transaction file.
+    currenttrx := cfg_item_value(virtuoso_ini_path(), 'Database', 'TransactionFile');
+    at_checkpoint := right(regexp_replace(currenttrx, '[^0-9]', ''), 14);
+
+    result(concat('# at checkpoint  ', at_checkpoint));
+    result(concat('# dump started   ', datestring_GMT(now())));
+    result(concat('# trx file       ', currenttrx));
+    result(concat('# cp interval    ', cpinterval));
+
+    -- See note at foot of vql_dump_nquads.
+    excludes := split_and_decode(excluded_graphs, 0, '\0\0 ');
+
+    FOR (SELECT * FROM (sparql
+            define input:storage ""
+            define input:param "excludes"
+            SELECT ?g (COUNT(*) AS ?n) { GRAPH ?g { ?s ?p ?o } .
+                FILTER ( bif:position(?g, ?:excludes) = 0 )
+            } GROUP BY ?g ) AS sub OPTION (loop)) DO
+    {
+        result(concat('# graph          ', __ro2sq("g"), ' ', "n"));
+    }
+}
+;
+
+-- Dump the quads of a set of graphs as rdf-patch-formatted resultset.
+-- Parameters:
+--      maxq: see vql_dump_nquads.
+--      graphs: a space-separated string of the iris of the graphs to dump.
+--      at_checkpoint: the checkpoint reported by vql_dump_start.
+CREATE PROCEDURE vql_dump_graphs(IN maxq INT, IN graphs VARCHAR, IN at_checkpoint VARCHAR) {
+
+    DECLARE nquad, buffer, report, includes, g_iri ANY;
+    DECLARE i INT;
+
+    result_names(nquad);
+    buffer := dict_new(); -- Dictionary objects are always passed by reference.
+    report := dict_new();
+    dict_put(report, 'iris', dict_new()); -- cache of formatted graph and predicate iris, see vql_create_nquad.
+
+    SET isolation = 'serializable';
+
+    DECLARE EXIT HANDLER FOR SQLSTATE '*' {
+        result(concat('# ERROR [', __SQL_STATE, '] ',  __SQL_MESSAGE));
+        resignal;
+    };
+
+    includes := split_and_decode(graphs, 0, '\0\0 ');
+
+    for (i := 0; i < length(includes); i := i + 1) {
+        g_iri := includes[i];
+        FOR (SELECT * FROM (sparql
+                define input:storage ""
+                define input:param "g_iri"
+                SELECT ?s ?p ?o ?g { GRAPH ?g { ?s ?p ?o } .
+                    FILTER ( ?g = iri(?:g_iri) )
+                } ) AS sub OPTION (loop)) DO
+        {
+            vql_buffer_nquad('+', "s", "p", "o", "g", buffer, report, at_checkpoint, maxq);
+        }
+    }
+
+    -- output the rest of the buffer
+    vql_print_buffer(buffer, report, at_checkpoint);
+
+    result(concat('# at checkpoint  ', at_checkpoint));
+    result(concat('# graphs done    ', datestring_GMT(now())));
+    result(concat('# quad count     ', dict_get(report, 'quad_count', 0)));
+    result(concat('# file count     ', dict_get(report, 'file_count', 0)));
+}
+;
+
+-- Finish a dump partitioned by graph.
+-- Parameters:
+--      currenttrx: the transaction file reported by vql_dump_start.
+--      startdate: the start date reported by vql_dump_start.
+--      cpinterval: the checkpoint interval reported by vql_dump_start.
+CREATE PROCEDURE vql_dump_finish(IN currenttrx VARCHAR, IN startdate VARCHAR, IN cpinterval INT) {
+
+    DECLARE nquad, rst ANY;
+
+    result_names(nquad);
+
+    DECLARE EXIT HANDLER FOR SQLSTATE '*' {
+        checkpoint_interval (cpinterval);
+        result(concat('# ERROR [', __SQL_STATE, '] ',  __SQL_MESSAGE));
+        resignal;
+    };
+
+    -- Datetime string in name of transaction logs has seconds resolution.
+    -- Set the next checkpoint at least 1 second later than the checkpoint of vql_dump_start.
+    delay(1);
+
+    -- See if currenttrx is stil the current transaction log.
+    IF (currenttrx <> cfg_item_value(virtuoso_ini_path(), 'Database', 'TransactionFile')) {
+        signal('DMPER', concat(': A checkpoint has been executed since start of dump at ', startdate, '. Dump invalid.'));
+    }
+    EXEC ('CHECKPOINT');
+
+    -- Enable automatic checkpoints with saved interval.
+    checkpoint_interval (cpinterval);
+
+    -- See if currenttrx is free of transactions...
+    rst := vql_check_trx(currenttrx);
+    IF (rst[0] > 0 OR rst[1] > 0) {
+        signal('DMPER', concat(': There have been ', rst[0], ' inserts and ', rst[1], ' deletes during dump. Dump invalid.'));
+    }
+
+    -- Mark the dump as completed.
+    result(concat('# dump completed ', datestring_GMT(now())));
+}
+;
+
 CREATE PROCEDURE vql_check_trx (IN f VARCHAR) {
     DECLARE h, op, inserts, deletes, line, lines ANY;
     DECLARE pos INT;
@@ -22,17 +22,29 @@
 -- #define LOG_SEQUENCE_64   12 /* series name, count */
 -- #define LOG_USER_TEXT     15 /* SQL string log'd by an user */
 
-CREATE PROCEDURE vql_parse_trx_files(IN path VARCHAR, IN at_checkpoint VARCHAR, IN maxq INT := 100000){
+-- Progress is kept as the timestamp of the last transaction log parsed and the position in that log after the last
+-- complete log record read. The newest transaction log, which Virtuoso is probably still writing to, is parsed up to
+-- its last complete record; the next run resumes at that position.
+-- Parameters:
+--      path: directory of the transaction logs
+--      at_checkpoint: timestamp of the last transaction log parsed
+--      maxq: the maximum amount of quads per graph in one file
+--      at_position: position in the log with timestamp at_checkpoint up to which it was parsed.
+--              Default value: -1, the log with timestamp at_checkpoint has been parsed completely.
+CREATE PROCEDURE vql_parse_trx_files(IN path VARCHAR, IN at_checkpoint VARCHAR, IN maxq INT := 100000,
+        IN at_position INT := -1){
 
     DECLARE nquad, buffer, report, files, trx_files ANY;
     DECLARE filename, last_log, time_stamp VARCHAR;
-    DECLARE i INT;
+    DECLARE i, last_pos, newest, stopped INT;
 
     result_names (nquad);
     buffer := dict_new(); -- Dictionary objects are always passed by reference.
     report := dict_new();
+    dict_put(report, 'iris', dict_new()); -- cache of formatted graph and predicate iris, see vql_create_nquad.
 
     last_log := at_checkpoint;
+    last_pos := at_position;
 
     if (not ends_with(path, '/')) {
         path := concat(path, '/');
@@ -51,62 +63,98 @@ CREATE PROCEDURE vql_parse_trx_files(IN path VARCHAR, IN at_checkpoint VARCHAR,
 
     -- dbg_printf('VQL: Count of trx files is %d', length(trx_files));
     gvector_sort(trx_files, 1, 0, 1); -- last param: nonzero for ascending sort
-    -- skip the newest one, virtuoso is probably running so it will still be changing, discard logs already parsed
-    for (i := 1; i < length(trx_files) - 1; i := i + 1) {
+    -- resume in the log parsed last, discard logs already parsed. The newest one is read up to its last complete record.
+    stopped := 0;
+    for (i := 1; i < length(trx_files) and not stopped; i := i + 1) {
         filename := trx_files[i];
+        newest := 0;
+        if (i = length(trx_files) - 1) {
+            newest := 1;
+        }
         time_stamp := regexp_match('[0-9]{14}', filename);
         if (time_stamp > at_checkpoint) {
             -- write n-quads found in file to buffer
-            vql_parse_file(buffer, report, concat(path, filename), at_checkpoint, maxq);
+            last_pos := vql_parse_file(buffer, report, concat(path, filename), at_checkpoint, maxq, 0, newest, stopped);
             last_log := time_stamp;
             -- dbg_printf('VQL: Last log timestamp is %s', last_log);
+        } else if (time_stamp = at_checkpoint and at_position >= 0) {
+            last_pos := vql_parse_file(buffer, report, concat(path, filename), at_checkpoint, maxq, at_position,
+                newest, stopped);
         }
     }
 
     -- output the rest of the buffer
     vql_print_buffer(buffer, report, at_checkpoint);
 
-    -- output timestamp of last transaction log parsed, count of exported quads and files.
+    -- output timestamp of last transaction log parsed, position in that log, count of exported quads and files.
     result(concat('# at checkpoint  ', at_checkpoint));
     result(concat('# quad count     ', dict_get(report, 'quad_count', 0)));
     result(concat('# file count     ', dict_get(report, 'file_count', 0)));
     result(concat('# last trx log   ', last_log));
+    if (last_pos >= 0) {
+        result(concat('# last trx pos   ', last_pos));
+    }
 }
 
 
-CREATE PROCEDURE vql_parse_file(IN buffer ANY, IN report ANY, IN file VARCHAR, IN at_checkpoint VARCHAR, IN maxq INT) {
+-- Parse the transaction log file from position start_pos and return the position after the last complete log record.
+-- Only the newest log may end in a record that cannot be read: Virtuoso is probably still writing it. Reading then
+-- stops at the last complete record and stopped is set, the next run resumes there. Any other error is raised, so
+-- that the rest of a log is never skipped.
+CREATE PROCEDURE vql_parse_file(IN buffer ANY, IN report ANY, IN file VARCHAR, IN at_checkpoint VARCHAR, IN maxq INT,
+        IN start_pos INT, IN newest INT, INOUT stopped INT) {
 
     DECLARE handle, quad, line, lines ANY;
     DECLARE op VARCHAR;
-    DECLARE pos, i INT;
-
-    handle := file_open (file, 0);
-    while ((lines := read_log (handle, pos)) is not null) {
-        quad := null;
-        for (i := 0; i < length (lines); i := i + 1) {
-            line := lines[i];
-            if (line[0] in (1, 8, 9, 13)) {
-                -- LOG_INSERT, LOG_INSERT_SOFT, LOG_INSERT_REPL and LOG_KEY_INSERT are all additions
-                op := '+';
-                if (line[0] = 13) {
-                    -- with LOG_KEY_INSERT a flag is inserted in the line so the quad ends up in line[2] instead of line[1]
-                    quad := line[2];
-                } else {
+    DECLARE pos, done_pos, i, reading INT;
+
+    done_pos := start_pos;
+    handle := file_open (file, start_pos);
+    reading := 1;
+    while (reading) {
+        lines := null;
+        {
+            DECLARE EXIT HANDLER FOR SQLSTATE '*' {
+                if (not newest) {
+                    resignal;
+                }
+                dbg_printf('VQL: Stopped reading %s at position %d: %s', file, done_pos, __SQL_MESSAGE);
+                stopped := 1;
+            };
+            lines := read_log (handle, pos);
+        }
+        if (lines is null) {
+            reading := 0;
+        } else {
+            quad := null;
+            for (i := 0; i < length (lines); i := i + 1) {
+                line := lines[i];
+                if (line[0] in (1, 8, 9, 13)) {
+                    -- LOG_INSERT, LOG_INSERT_SOFT, LOG_INSERT_REPL and LOG_KEY_INSERT are all additions
+                    op := '+';
+                    if (line[0] = 13) {
+                        -- with LOG_KEY_INSERT a flag is inserted in the line so the quad ends up in line[2] instead of line[1]
+                        quad := line[2];
+                    } else {
+                        quad := line[1];
+                    }
+                } else if (line[0] in (3, 14)) {
+                    -- LOG_DELETE and LOG_KEY_DELETE are both deletions
+                    op := '-';
                     quad := line[1];
                 }
-            } else if (line[0] in (3, 14)) {
-                -- LOG_DELETE and LOG_KEY_DELETE are both deletions
-                op := '-';
-                quad := line[1];
-            }
-            if (quad is not null) {
-                --if the operation was in one of the handled cases
-                if (quad[0] = 271) {
-                    -- the table DB.DBA.RDF_QUAD (id=271) is the one that's always updated. So we can ignore the others
-                    -- dbg_obj_print(quad);
-                    vql_buffer_nquad(op, quad[2], quad[3], quad[4], quad[1], buffer, report, at_checkpoint, maxq);
+                if (quad is not null) {
+                    --if the operation was in one of the handled cases
+                    if (quad[0] = 271) {
+                        -- the table DB.DBA.RDF_QUAD (id=271) is the one that's always updated. So we can ignore the others
+                        -- dbg_obj_print(quad);
+                        vql_buffer_nquad(op, quad[2], quad[3], quad[4], quad[1], buffer, report, at_checkpoint, maxq);
+                    }
                 }
             }
+            -- the record has been read completely
+            done_pos := pos;
         }
     }
+    return done_pos;
 }
@@ -12,7 +12,7 @@ CREATE PROCEDURE vql_buffer_nquad(IN op ANY, IN raw_s ANY, IN raw_p ANY, IN raw_
     DECLARE qline, g_iri VARCHAR;
 
     g_iri := __ro2sq(raw_g);
-    qline := vql_create_nquad(op, raw_s, raw_p, raw_o, raw_g);
+    qline := vql_create_nquad(op, raw_s, raw_p, raw_o, raw_g, dict_get(report, 'iris'));
     -- g_name := encode_base64(g_iri);
 
     if (g_iri <> dict_get(buffer, 'last_iri', '') or dict_get(report, 'current_graph_quad_count', 0) >= maxq) {
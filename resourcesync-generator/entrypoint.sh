@@ -4,11 +4,60 @@ RUN_INTERVAL=${RUN_INTERVAL:-3600s}
 MAX_FILES_COMPRESSED=${MAX_FILES_COMPRESSED:-1000}
 WRITE_SEPARATE_MANIFEST=${WRITE_SEPARATE_MANIFEST:-y}
 MOVE_RESOURCES=${MOVE_RESOURCES:-n}
+WORKERS=${WORKERS:-1}
+COMPRESSION=${COMPRESSION:-}
+COMPRESSION_LEVEL=${COMPRESSION_LEVEL:-}
+DEDUPLICATE=${DEDUPLICATE:-n}
+MAX_PACKAGE_SIZE=${MAX_PACKAGE_SIZE:-}
+MAX_COMPRESSED_SIZE=${MAX_COMPRESSED_SIZE:-}
+MAX_PACKAGE_AGE=${MAX_PACKAGE_AGE:-}
+WATCH=${WATCH:-n}
+POLL_INTERVAL=${POLL_INTERVAL:-10}
+SPLIT_SOURCE_DIR="${SPLIT_SOURCE_DIR:-}"
+MAX_QUADS_PER_FILE=${MAX_QUADS_PER_FILE:-0}
+METRICS_DIR="${METRICS_DIR:-}"
+VERSIONED_SINK=${VERSIONED_SINK:-n}
+STORAGE=${STORAGE:-local}
+S3_BUCKET="${S3_BUCKET:-}"
+S3_PREFIX="${S3_PREFIX:-}"
+S3_ENDPOINT_URL="${S3_ENDPOINT_URL:-}"
+UPLOAD_WORKERS=${UPLOAD_WORKERS:-4}
 SOURCE_DIR="${SOURCE_DIR:-/input}"
 SINK_DIR="${SINK_DIR:-/output}"
 BUILDER_CLASS="${BUILDER_CLASS:-zipsynchronizer.ZipSynchronizer}"
 
-echo "Starting resourcesync-generator. RUN_INTERVAL=$RUN_INTERVAL" >&2
+echo "Starting resourcesync-generator. RUN_INTERVAL=$RUN_INTERVAL WATCH=$WATCH" >&2
+
+if [ "$WATCH" == "y" ]; then
+
+  # Unbuffered output, so that the log of the resident process is up to date.
+  exec env PYTHONUNBUFFERED=1 ./rsync.py --source_dir "$SOURCE_DIR" \
+  --sink_dir "$SINK_DIR" \
+  --publish_url "${HTTP_SERVER_URL}" \
+  --builder_class "${BUILDER_CLASS}" \
+  --max_files_compressed "${MAX_FILES_COMPRESSED}" \
+  --write_separate_manifest "${WRITE_SEPARATE_MANIFEST}" \
+  --move_resources "${MOVE_RESOURCES}" \
+  --workers "${WORKERS}" \
+  --compression "${COMPRESSION}" \
+  --compression_level "${COMPRESSION_LEVEL}" \
+  --deduplicate "${DEDUPLICATE}" \
+  --max_package_size "${MAX_PACKAGE_SIZE}" \
+  --max_compressed_size "${MAX_COMPRESSED_SIZE}" \
+  --max_package_age "${MAX_PACKAGE_AGE}" \
+  --split_source_dir "${SPLIT_SOURCE_DIR}" \
+  --max_quads_per_file "${MAX_QUADS_PER_FILE}" \
+  --metrics_dir "${METRICS_DIR}" \
+  --versioned_sink "${VERSIONED_SINK}" \
+  --storage "${STORAGE}" \
+  --s3_bucket "${S3_BUCKET}" \
+  --s3_prefix "${S3_PREFIX}" \
+  --s3_endpoint_url "${S3_ENDPOINT_URL}" \
+  --upload_workers "${UPLOAD_WORKERS}" \
+  --watch y \
+  --run_interval "${RUN_INTERVAL}" \
+  --poll_interval "${POLL_INTERVAL}"
+fi
 
 while true; do
 
@@ -18,7 +67,23 @@ while true; do
   --builder_class "${BUILDER_CLASS}" \
   --max_files_compressed "${MAX_FILES_COMPRESSED}" \
   --write_separate_manifest "${WRITE_SEPARATE_MANIFEST}" \
-  --move_resources "${MOVE_RESOURCES}"
+  --move_resources "${MOVE_RESOURCES}" \
+  --workers "${WORKERS}" \
+  --compression "${COMPRESSION}" \
+  --compression_level "${COMPRESSION_LEVEL}" \
+  --deduplicate "${DEDUPLICATE}" \
+  --max_package_size "${MAX_PACKAGE_SIZE}" \
+  --max_compressed_size "${MAX_COMPRESSED_SIZE}" \
+  --max_package_age "${MAX_PACKAGE_AGE}" \
+  --split_source_dir "${SPLIT_SOURCE_DIR}" \
+  --max_quads_per_file "${MAX_QUADS_PER_FILE}" \
+  --metrics_dir "${METRICS_DIR}" \
+  --versioned_sink "${VERSIONED_SINK}" \
+  --storage "${STORAGE}" \
+  --s3_bucket "${S3_BUCKET}" \
+  --s3_prefix "${S3_PREFIX}" \
+  --s3_endpoint_url "${S3_ENDPOINT_URL}" \
+  --upload_workers "${UPLOAD_WORKERS}"
 
   if [ -n "${CHOWN_TO_ID:-}" ]; then
         chown -R "$CHOWN_TO_ID:$CHOWN_TO_ID" "$PUBLISH_DIR"
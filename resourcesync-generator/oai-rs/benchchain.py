@@ -0,0 +1,211 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import sys
+# Enable dynamic imports
+sys.path.append(".")
+
+import json, os, resource, shutil, tempfile, time
+from argparse import ArgumentParser
+from graphsplitter import GraphSplitter
+from syncdirector import FILE_HANDSHAKE
+from watcher import SHAM_RDF_OUT_FILE
+from zipsynchronizer import ZipSynchronizer
+
+# Measure the throughput of the publish path on synthetic rdf patch files on local disk: distribute the files over
+# directories per graph (split), list and index them (index), package them (zip) and publish resource dumps (metadata).
+# Results can be saved as a baseline and compared with a baseline in later runs.
+
+STAGES = ["split", "index", "zip", "metadata"]
+CHECKPOINT = "20160101000000"
+
+
+def generate(source_dir, graphs, files_per_graph, quads_per_file):
+    """
+    Write rdf patch files in the format of the quad-logger to source_dir, together with a handshake and the sham
+    file that enables processing of the last file. Files of the graphs alternate, as in the output of the quad-logger.
+    :param source_dir: the directory to write to
+    :param graphs: the number of graphs
+    :param files_per_graph: the number of files per graph
+    :param quads_per_file: the number of N-Quads per file
+    :return: (number of files, number of bytes) written
+    """
+    if not os.path.isdir(source_dir):
+        os.makedirs(source_dir)
+    with open(os.path.join(source_dir, FILE_HANDSHAKE), "w") as hs_file:
+        hs_file.write(CHECKPOINT)
+
+    count = 0
+    size = 0
+    for i in range(files_per_graph):
+        for g in range(graphs):
+            graph = "http://example.com/graph/%d" % g
+            lines = ["# at checkpoint  %s\n" % CHECKPOINT, "# graph          %s\n" % graph]
+            for q in range(quads_per_file):
+                lines.append("+ <http://example.com/s/%d/%d> <http://example.com/p/%d> \"literal %d\" <%s> .\n"
+                             % (i, q, q % 10, q, graph))
+            data = "".join(lines)
+            with open(os.path.join(source_dir, "rdf_out_%s-%014d" % (CHECKPOINT, count)), "w") as patch_file:
+                patch_file.write(data)
+            count += 1
+            size += len(data)
+    open(os.path.join(source_dir, SHAM_RDF_OUT_FILE), "w").close()
+    return count, size
+
+
+class TimedZipSynchronizer(ZipSynchronizer):
+    """
+    A ZipSynchronizer that adds the time spent in listing, packaging and publishing metadata to timings.
+    """
+
+    def __init__(self, timings, *args, **kwargs):
+        """
+        :param timings: dictionary of stage name and seconds spent in that stage
+        """
+        ZipSynchronizer.__init__(self, *args, **kwargs)
+        self.timings = timings
+
+    def patch_files(self):
+        start = time.time()
+        try:
+            return ZipSynchronizer.patch_files(self)
+        finally:
+            self.timings["index"] += time.time() - start
+
+    def add_patch_files(self, patch_files, rdf_out_files):
+        start = time.time()
+        try:
+            return ZipSynchronizer.add_patch_files(self, patch_files, rdf_out_files)
+        finally:
+            self.timings["index"] += time.time() - start
+
+    def create_zip(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return ZipSynchronizer.create_zip(self, *args, **kwargs)
+        finally:
+            self.timings["zip"] += time.time() - start
+
+    def publish_metadata(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return ZipSynchronizer.publish_metadata(self, *args, **kwargs)
+        finally:
+            self.timings["metadata"] += time.time() - start
+
+
+def benchmark(work_dir, graphs, files_per_graph, quads_per_file, max_files_compressed=50000):
+    """
+    Generate rdf patch files in work_dir and time the stages of the publish path.
+    :param work_dir: an empty directory on the disk to measure
+    :param graphs: the number of graphs
+    :param files_per_graph: the number of files per graph
+    :param quads_per_file: the number of N-Quads per file
+    :param max_files_compressed: the maximum number of files in one package
+    :return: dictionary with 'stages': {stage: {'seconds', 'files_per_sec', 'mb_per_sec'}}, 'files', 'bytes' and
+                'peak_rss_kb', the peak resident set size of this process
+    """
+    source_dir = os.path.join(work_dir, "source")
+    sink_dir = os.path.join(work_dir, "sink")
+    publish_dir = os.path.join(work_dir, "publish")
+    files, size = generate(source_dir, graphs, files_per_graph, quads_per_file)
+    timings = dict((stage, 0.0) for stage in STAGES)
+
+    # the splitter and synchronizers report on every graph
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    try:
+        start = time.time()
+        dirnames = GraphSplitter(source_dir, sink_dir).split()
+        timings["split"] = time.time() - start
+        for dirname in sorted(dirnames):
+            sync = TimedZipSynchronizer(timings, os.path.join(sink_dir, dirname), os.path.join(publish_dir, dirname),
+                                        "http://example.com/%s/" % dirname,
+                                        max_files_compressed=max_files_compressed)
+            sync.publish()
+    finally:
+        sys.stdout.close()
+        sys.stdout, sys.stderr = stdout, stderr
+
+    stages = {}
+    for stage in STAGES:
+        seconds = max(timings[stage], 1e-6)
+        stages[stage] = {"seconds": timings[stage],
+                         "files_per_sec": files / seconds,
+                         "mb_per_sec": size / (1024.0 * 1024.0) / seconds}
+    return {"stages": stages, "files": files, "bytes": size,
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def compare(result, baseline, tolerance=0.2):
+    """
+    Compare the result of a benchmark with a baseline.
+    :param result: the result of benchmark
+    :param baseline: the result of an earlier benchmark with the same parameters
+    :param tolerance: the fraction throughput may drop or peak memory may rise before it counts as a regression
+    :return: list of regressions, empty if there are none
+    """
+    regressions = []
+    for stage in STAGES:
+        was = baseline["stages"][stage]["files_per_sec"]
+        now = result["stages"][stage]["files_per_sec"]
+        if now < was * (1 - tolerance):
+            regressions.append("%s: %.1f files/sec, baseline %.1f files/sec" % (stage, now, was))
+    if result["peak_rss_kb"] > baseline["peak_rss_kb"] * (1 + tolerance):
+        regressions.append("peak rss: %d kB, baseline %d kB" % (result["peak_rss_kb"], baseline["peak_rss_kb"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    # parser arguments:
+    # --graphs: the number of graphs
+    # --files_per_graph: the number of files per graph
+    # --quads_per_file: the number of N-Quads per file
+    # --max_files_compressed: the maximum number of files in one package
+    # --work_dir: directory on the disk to measure, a temporary directory is created in it. Default: system default
+    # --baseline: json file with a baseline to compare with, or to write with --save_baseline
+    # --save_baseline: write the result to the baseline file instead of comparing
+    # --tolerance: fraction throughput may drop or peak memory may rise before it counts as a regression
+    parser.add_argument('--graphs', type=int, default=10)
+    parser.add_argument('--files_per_graph', type=int, default=100)
+    parser.add_argument('--quads_per_file', type=int, default=1000)
+    parser.add_argument('--max_files_compressed', type=int, default=50000)
+    parser.add_argument('--work_dir', default=None)
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--save_baseline', action="store_true")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    parameters = {"graphs": args.graphs, "files_per_graph": args.files_per_graph,
+                  "quads_per_file": args.quads_per_file, "max_files_compressed": args.max_files_compressed}
+    work_dir = tempfile.mkdtemp(dir=args.work_dir)
+    try:
+        result = benchmark(work_dir, **parameters)
+    finally:
+        shutil.rmtree(work_dir)
+    result["parameters"] = parameters
+
+    print "%d files, %d bytes, %d graphs" % (result["files"], result["bytes"], args.graphs)
+    print "%-10s %10s %12s %10s" % ("stage", "seconds", "files/sec", "MB/sec")
+    for stage in STAGES:
+        values = result["stages"][stage]
+        print "%-10s %10.3f %12.1f %10.2f" % (stage, values["seconds"], values["files_per_sec"], values["mb_per_sec"])
+    print "peak rss   %d kB" % result["peak_rss_kb"]
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(result, baseline_file, indent=2, sort_keys=True)
+        print "Saved baseline to %s" % args.baseline
+    elif args.baseline:
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("parameters") != parameters:
+            print "Baseline %s was measured with other parameters: %s" % (args.baseline, baseline.get("parameters"))
+            sys.exit(2)
+        regressions = compare(result, baseline, args.tolerance)
+        for regression in regressions:
+            print "REGRESSION %s" % regression
+        if regressions:
+            sys.exit(1)
+        print "No regressions compared to %s" % args.baseline
@@ -0,0 +1,90 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import sys
+# Enable dynamic imports
+sys.path.append(".")
+
+import os, shutil, tarfile, tempfile, time
+from argparse import ArgumentParser
+from glob import glob
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+from zipwriter import ZipWriter
+from tarsynchronizer import compressor, CompressingFile, COMPRESSION_XZ, COMPRESSION_ZSTD
+
+# Compare compression ratio and throughput of the codecs available for published dumps.
+
+CODECS = [("store", None), ("deflate", 1), ("deflate", 6), ("deflate", 9),
+          (COMPRESSION_XZ, 0), (COMPRESSION_XZ, 6), (COMPRESSION_ZSTD, 3), (COMPRESSION_ZSTD, 19)]
+
+
+def package(files, path, compression, level):
+    """
+    Package files in the way the synchronizer for the compression does.
+    :param files: paths of the files to package
+    :param path: path of the package to write
+    :param compression: 'store', 'deflate', 'xz' or 'zstd'
+    :param level: the compression level
+    """
+    if compression in ("store", "deflate"):
+        zf = ZipWriter(path, compression=ZIP_STORED if compression == "store" else ZIP_DEFLATED,
+                       compresslevel=level if level is not None else -1)
+        for file in files:
+            zf.write_resource(file, os.path.basename(file))
+        zf.close()
+    else:
+        out = CompressingFile(path, compressor(compression, level))
+        tar = tarfile.open(fileobj=out, mode="w|", format=tarfile.PAX_FORMAT)
+        for file in files:
+            tar.add(file, os.path.basename(file))
+        tar.close()
+        out.close()
+
+
+def benchmark(files, repeat=3):
+    """
+    Package files with each codec, repeat times.
+    :param files: paths of the files to package
+    :param repeat: the number of times each codec is run; the fastest run counts.
+    :return: list of (codec, level, ratio, MB/sec) or (codec, level, None, reason) if the codec is not available.
+    """
+    size = sum(os.stat(file).st_size for file in files)
+    work_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        for compression, level in CODECS:
+            path = os.path.join(work_dir, "bench")
+            try:
+                best = None
+                for i in range(repeat):
+                    start = time.time()
+                    package(files, path, compression, level)
+                    elapsed = time.time() - start
+                    best = elapsed if best is None else min(best, elapsed)
+            except RuntimeError as err:
+                results.append((compression, level, None, str(err)))
+                continue
+            ratio = float(size) / os.stat(path).st_size
+            results.append((compression, level, ratio, size / (1024.0 * 1024.0) / max(best, 1e-6)))
+    finally:
+        shutil.rmtree(work_dir)
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    # parser arguments:
+    # --source_dir: directory containing rdf patch files. Default: sample
+    # --repeat: the number of runs per codec
+    parser.add_argument('--source_dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample"))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    files = sorted(glob(os.path.join(args.source_dir, "rdf_out_*")))
+    print "%d files, %d bytes" % (len(files), sum(os.stat(file).st_size for file in files))
+    print "%-8s %5s %8s %10s" % ("codec", "level", "ratio", "MB/sec")
+    for compression, level, ratio, speed in benchmark(files, args.repeat):
+        if ratio is None:
+            print "%-8s %5s %s" % (compression, level, speed)
+        else:
+            print "%-8s %5s %8.2f %10.2f" % (compression, level, ratio, speed)
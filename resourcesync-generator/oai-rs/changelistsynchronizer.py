@@ -0,0 +1,147 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import os, shutil, resync.w3c_datetime as w3cdt
+from synchronizer import RS_CAPABILITY_LIST_XML, RS_RESOURCE_DUMP_XML, PATTERN_RDF_OUT
+from zipsynchronizer import ZipSynchronizer
+from resync.resource import Resource
+from resync.resource_list import ResourceList
+from resync.resource_dump import ResourceDump
+from resync.change_list import ChangeList
+from resync.capability_list import CapabilityList
+from resync.utils import compute_md5_for_file
+from patchfiles import PatchFileList
+from urlset import Urlset
+
+# Strategy to publish rdf patch files as resource dumps in g-zip format, and the rdf patch files that are not yet
+# in a completed package as a change list.
+
+RS_CHANGE_LIST_XML = "change-list.xml"
+CHANGE_CREATED = "created"
+
+
+class ChangeListSynchronizer(ZipSynchronizer):
+    """
+    Publishes resource dumps as ZipSynchronizer does, and in addition a change list with the rdf patch files that
+    are not yet in a completed package. Each of these files is published as is in publish_dir, at the uri it has
+    in the manifests of packages, and listed as 'created' with its md5, length and lastmod.
+    See: http://www.openarchives.org/rs/1.0/resourcesync#ChangeList
+
+    Rdf patch files are only ever created, and their names sort by time. A destination that has the completed
+    packages of resource-dump.xml can keep up by polling change-list.xml and fetching new files only, instead of
+    downloading the end package again and again. Changes before the 'from' attribute of the change list are in
+    completed packages. Once a file is packaged in a completed package it is removed from the change list and,
+    unless move_resources is set, from publish_dir.
+
+    The change list holds at most max_files_compressed entries, so it needs no sitemapindex.
+    Change dumps are not written: the completed packages listed in resource-dump.xml serve that purpose.
+    """
+
+    def do_publish(self):
+        """
+        Publish resource dumps, then the change list.
+        :return: see ZipSynchronizer.do_publish
+        """
+        result = ZipSynchronizer.do_publish(self)
+        with self.metrics.timer("publish_metadata", graph=self.graph):
+            self.publish_changes()
+        return result
+
+    def publish_changes(self):
+        """
+        Publish the rdf patch files in resource_dir that are not yet in a completed package, write change-list.xml
+        if the list of changes differs from the published one and remove files that are no longer listed.
+        """
+        changes = ResourceList()
+        self.list_patch_files(changes)
+
+        change_list_path = os.path.join(self.publish_dir, RS_CHANGE_LIST_XML)
+        change_list_doc = Urlset(change_list_path)
+        # the graph-splitter may append to the newest file, so files are compared by md5 as well.
+        old_keys = [(resource.uri, resource.md5) for resource in PatchFileList.read(change_list_path)] \
+            if change_list_doc.exists() else []
+        old_locs = [uri for uri, md5 in old_keys]
+        for resource in changes:
+            if resource.md5 is None:
+                resource.md5 = compute_md5_for_file(resource.path)
+                resource.lastmod = self.extract_timestamp(resource.path)
+        new_locs = [resource.uri for resource in changes]
+
+        for resource in changes:
+            self.publish_file(resource.path)
+
+        if [(resource.uri, resource.md5) for resource in changes] != old_keys or not change_list_doc.exists():
+            change_list = ChangeList()
+            change_list.link_set(rel="up", href=self.publish_url + RS_CAPABILITY_LIST_XML)
+            for resource in changes:
+                change_list.add(Resource(uri=resource.uri, lastmod=resource.lastmod, md5=resource.md5,
+                                         length=resource.length, change=CHANGE_CREATED))
+            now = w3cdt.datetime_to_str(no_fractions=True)
+            change_list.md_from = self.first_modified(change_list) or now
+            change_list.md_until = now
+            with open(change_list_path + ".tmp", "w") as change_list_file:
+                change_list_file.write(change_list.as_xml())
+            os.rename(change_list_path + ".tmp", change_list_path)
+
+        # Files that are no longer listed are in a completed package.
+        if not self.move_resources:
+            for loc in set(old_locs).difference(new_locs):
+                filename = os.path.basename(loc)
+                path = os.path.join(self.publish_dir, filename)
+                if filename.startswith(PATTERN_RDF_OUT) and os.path.isfile(path):
+                    os.remove(path)
+
+        self.write_capability_list()
+
+    def publish_file(self, path):
+        """
+        Make a resource file available in publish_dir under its own name. The file is hard linked if possible,
+        otherwise copied. A published file that differs from the resource file, because the graph-splitter appended
+        to it, is replaced.
+        :param path: the local path of the resource file in resource_dir
+        """
+        target = os.path.join(self.publish_dir, os.path.basename(path))
+        if os.path.isfile(target):
+            stat, target_stat = os.stat(path), os.stat(target)
+            if (stat.st_dev, stat.st_ino) == (target_stat.st_dev, target_stat.st_ino) \
+                    or (stat.st_size, stat.st_mtime) == (target_stat.st_size, target_stat.st_mtime):
+                return
+            os.remove(target)
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copy2(path, target + ".tmp")
+            os.rename(target + ".tmp", target)
+
+    def write_capability_list(self):
+        """
+        (Re)write capability-list.xml if it does not list the resource dump and the change list.
+        """
+        capa_list_url = self.publish_url + RS_CAPABILITY_LIST_XML
+        capa_list_path = os.path.join(self.publish_dir, RS_CAPABILITY_LIST_XML)
+        capabilities = [(ChangeList(), self.publish_url + RS_CHANGE_LIST_XML)]
+        if os.path.isfile(os.path.join(self.publish_dir, RS_RESOURCE_DUMP_XML)):
+            capabilities.insert(0, (ResourceDump(), self.publish_url + RS_RESOURCE_DUMP_XML))
+
+        capa_list_doc = Urlset(capa_list_path)
+        if capa_list_doc.exists() and set(capa_list_doc.locs()) == set(url for capability, url in capabilities):
+            return
+
+        capa_list = CapabilityList()
+        capa_list.link_set(rel="up", href=self.src_desc_url)
+        for capability, url in capabilities:
+            capa_list.add_capability(capability, url)
+        with open(capa_list_path + ".tmp", "w") as capa_list_file:
+            capa_list_file.write(capa_list.as_xml())
+        os.rename(capa_list_path + ".tmp", capa_list_path)
+
+        print "New %s. See %s" % (RS_CAPABILITY_LIST_XML, capa_list_url)
+
+    @staticmethod
+    def first_modified(resourcelist):
+        """
+        :param resourcelist: the resourcelist to be inspected
+        :return: the earliest last modified date of resources in resourcelist or None if resourcelist is empty
+        """
+        lastmods = [resource.lastmod for resource in resourcelist if resource.lastmod]
+        return min(lastmods) if lastmods else None
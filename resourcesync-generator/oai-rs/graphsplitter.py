@@ -0,0 +1,408 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import sys
+# Enable dynamic imports
+sys.path.append(".")
+
+import base64, os, shutil
+from argparse import ArgumentParser
+from glob import glob
+from synchronizer import PATTERN_RDF_OUT
+from syncdirector import FILE_HANDSHAKE, FILE_INDEX, FILE_FILED_FILES
+from watcher import SHAM_RDF_OUT_FILE
+from metrics import Metrics
+from resourceindex import ResourceIndex, FILE_RESOURCE_INDEX
+
+# Split rdf patch files over graph iri in the same way graph-splitter/split-graphs.sh does, without starting
+# processes for each file.
+
+FILE_FILED_NQUADS = "vql_nquads_count.txt"
+# Number of rdf patch files of the quad-logger filed. With max_quads_per_file set this is larger than the number of
+# files filed in FILE_FILED_FILES, because files are concatenated.
+FILE_FILED_PARTS = "vql_parts_count.txt"
+FILE_COALESCE_TMP = "vql_coalesce.tmp"
+FILE_METRICS = "graph_splitter"
+
+GRAPH_HEADER = "# graph "
+HEADER_LINES = 3
+HEADER_SIZE = 8 * 1024
+BLOCK_SIZE = 1024 * 1024
+
+
+class GraphSplitter(object):
+    """
+    Distributes rdf patch files in source_dir over directories per graph in sink_dir. The names of these directories
+    are the base64 translation of the graph iri. The mapping of graph iri to directory name is kept in
+    vql_graph_folder.csv in sink_dir.
+
+    If max_quads_per_file is set, consecutive files of the same graph are concatenated into one file of up to
+    max_quads_per_file N-Quads. The concatenated file has the name of its first part and keeps the headers of all
+    parts, so the first '# at checkpoint' line is that of its first part. New files are also appended to the newest
+    file in the directory of their graph, filed by an earlier run, so a graph that receives a few N-Quads with each
+    run of the quad-logger does not get a file per run. The newest file of a directory is never in a completed
+    package: the resourcesync-generator removes files of completed packages from the directory.
+    """
+
+    def __init__(self, source_dir, sink_dir, max_quads_per_file=0, metrics_dir=None):
+        """
+        Initialize a new GraphSplitter.
+        :param source_dir: directory with rdf patch files not subdivided over graph iri
+        :param sink_dir: directory for rdf patch files subdivided over graph iri
+        :param max_quads_per_file: the maximum number of N-Quads in a concatenated file. Default: 0, do not concatenate
+        :param metrics_dir: directory to write metrics of each run to, see metrics.py. Default: None, do not write
+        :return:
+        """
+        self.source_dir = source_dir
+        self.sink_dir = sink_dir
+        self.max_quads_per_file = max_quads_per_file
+        self.metrics_dir = metrics_dir
+        self.metrics = Metrics(service="graph-splitter")
+        self.index_path = os.path.join(self.sink_dir, FILE_INDEX)
+        # graph iri -> directory name, read from the index file once
+        self.graph_folders = None
+        self.handshake = None
+        # files written to sink_dir, rdf patch files of the quad-logger they were made of and their N-Quads
+        self.count_files = 0
+        self.count_parts = 0
+        self.count_nquads = 0
+
+    def split(self):
+        """
+        Verify the handshake and distribute rdf patch files in source_dir over directories per graph in sink_dir.
+        The last rdf patch file in alphabetical order is not processed, chained source services may be handling it.
+        :return: set of names of the directories files were filed to, or None if the handshake could not be verified.
+        """
+        for directory in (self.source_dir, self.sink_dir):
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+                print >> sys.stderr, "Created %s" % directory
+
+        self.count_files = 0
+        self.count_parts = 0
+        self.count_nquads = 0
+        self.metrics = Metrics(service="graph-splitter")
+        with self.metrics.timer("handshake"):
+            self.handshake = self.verify_handshake()
+        if self.handshake is None:
+            self.write_metrics()
+            return None
+
+        filenames = sorted(os.path.basename(path) for path in glob(os.path.join(self.source_dir, PATTERN_RDF_OUT + "*")))
+        # do not process the last file (alphabetically) - chained source services may be handling those.
+        filenames = filenames[:-1]
+        print >> sys.stderr, "Found %d files with prefix %s* in %s" % (len(filenames), PATTERN_RDF_OUT, self.source_dir)
+
+        with self.metrics.timer("split"):
+            dirnames = self.distribute(filenames)
+
+        self.enable_processing_of_last_patch()
+        self.report_totals()
+        self.write_metrics()
+        return dirnames
+
+    def distribute(self, filenames):
+        """
+        Move or concatenate rdf patch files to the directories of their graph.
+        :param filenames: names of the rdf patch files in source_dir to distribute
+        :return: set of names of the directories files were filed to
+        """
+        moves = []
+        for filename in filenames:
+            src_file = os.path.join(self.source_dir, filename)
+            graph, lines = self.read_file(src_file)
+            if graph is None:
+                # this is a message file, ending a dump ar patch run from quad-logger.
+                continue
+            # each file has 2 header lines
+            moves.append((src_file, self.graph_folder(graph), filename, lines - 2))
+            self.count_parts += 1
+            self.count_nquads += lines - 2
+
+        tails = {}
+        if self.max_quads_per_file > 0:
+            for dirname in set(move[1] for move in moves):
+                tail = self.newest_file(dirname)
+                if tail is not None:
+                    tails[dirname] = tail
+
+        dirnames = set()
+        for dirname, parts in self.coalesce(moves, tails):
+            if dirname not in dirnames:
+                self.disable_processing_of_last_patch(dirname)
+            snk_file = os.path.join(self.sink_dir, dirname, parts[0][2])
+            if len(parts) == 1:
+                os.rename(parts[0][0], snk_file)
+            else:
+                self.concatenate([part[0] for part in parts], snk_file)
+            if parts[0][0] == snk_file:
+                # appended to a file of an earlier run, which the generator may have indexed.
+                self.discard_indexed(dirname, parts[0][2])
+            else:
+                self.count_files += 1
+            dirnames.add(dirname)
+        if moves:
+            print >> sys.stderr, "Done distributing by graph: %d N-Quads of %d files in %d files" \
+                                 % (self.count_nquads, self.count_parts, self.count_files)
+        return dirnames
+
+    def coalesce(self, moves, tails=None):
+        """
+        Group files to move into files to concatenate.
+        :param moves: list of (source path, directory name, file name, number of N-Quads) in order of file name
+        :param tails: dictionary of directory name and (path, file name, number of N-Quads) of the newest file in that
+                directory, to which files may be appended. Default: None, only concatenate files in moves
+        :return: list of (directory name, list of moves to concatenate into one file). A group that appends to a
+                file in tails starts with (path, directory name, file name, number of N-Quads) of that file.
+        """
+        if self.max_quads_per_file <= 0:
+            return [(move[1], [move]) for move in moves]
+
+        groups = []
+        open_groups = {}
+        for dirname, (path, filename, nquads) in (tails or {}).iteritems():
+            if nquads < self.max_quads_per_file:
+                # [directory name, N-Quads, parts, in groups]; a tail is not in groups until a move is appended to it
+                open_groups[dirname] = [dirname, nquads, [(path, dirname, filename, nquads)], False]
+        for move in moves:
+            dirname, nquads = move[1], move[3]
+            group = open_groups.get(dirname)
+            if group is None or group[1] + nquads > self.max_quads_per_file:
+                group = [dirname, 0, [], False]
+                open_groups[dirname] = group
+            if not group[3]:
+                groups.append(group)
+                group[3] = True
+            group[1] += nquads
+            group[2].append(move)
+        return [(group[0], group[2]) for group in groups]
+
+    def newest_file(self, dirname):
+        """
+        Find the newest rdf patch file in a directory of sink_dir.
+        :param dirname: the name of the directory in sink_dir
+        :return: (path, file name, number of N-Quads) of the file or None if the directory has no rdf patch files
+        """
+        paths = [path for path in glob(os.path.join(self.sink_dir, dirname, PATTERN_RDF_OUT + "*"))
+                 if os.path.basename(path) != SHAM_RDF_OUT_FILE]
+        if not paths:
+            return None
+        path = max(paths)
+        with open(path, "rb") as fp:
+            nquads = sum(1 for line in fp if not line.startswith("#"))
+        return path, os.path.basename(path), nquads
+
+    def discard_indexed(self, dirname, filename):
+        """
+        Remove a file that changed from the resource index of the resourcesync-generator in a directory of sink_dir.
+        :param dirname: the name of the directory in sink_dir
+        :param filename: the name of the file
+        """
+        directory = os.path.join(self.sink_dir, dirname)
+        if os.path.isfile(os.path.join(directory, FILE_RESOURCE_INDEX)):
+            index = ResourceIndex(directory)
+            index.discard([filename])
+            index.close()
+
+    @staticmethod
+    def concatenate(src_files, snk_file):
+        """
+        Concatenate src_files into snk_file and remove src_files. snk_file may be the first of src_files.
+        :param src_files: paths of files to concatenate, in order
+        :param snk_file: path of the file to write
+        """
+        tmp_file = os.path.join(os.path.dirname(snk_file), FILE_COALESCE_TMP)
+        with open(tmp_file, "wb") as out:
+            last = "\n"
+            for src_file in src_files:
+                if last != "\n":
+                    out.write("\n")
+                with open(src_file, "rb") as part:
+                    buf = part.read(BLOCK_SIZE)
+                    while buf:
+                        out.write(buf)
+                        last = buf[-1]
+                        buf = part.read(BLOCK_SIZE)
+        os.rename(tmp_file, snk_file)
+        for src_file in src_files:
+            if src_file != snk_file:
+                os.remove(src_file)
+
+    @staticmethod
+    def read_file(path):
+        """
+        Find the graph iri in the header of an rdf patch file and count its lines.
+        :param path: path to the rdf patch file
+        :return: (graph iri or None if the file has no graph header, number of lines)
+        """
+        graph = None
+        lines = 0
+        with open(path, "rb") as fp:
+            head = fp.read(HEADER_SIZE)
+            for line in head.split("\n")[:HEADER_LINES]:
+                if line.startswith(GRAPH_HEADER):
+                    graph = line[len(GRAPH_HEADER):].strip()
+                    break
+            if not graph:
+                return None, 0
+            buf = head
+            while buf:
+                lines += buf.count("\n")
+                buf = fp.read(BLOCK_SIZE)
+        return graph, lines
+
+    def graph_folder(self, graph):
+        """
+        Get the name of the directory for graph, create it and add it to the index file if it does not exist.
+        :param graph: the graph iri
+        :return: the name of the directory
+        """
+        if self.graph_folders is None:
+            self.graph_folders = {}
+            if os.path.isfile(self.index_path):
+                with open(self.index_path, "r") as index_file:
+                    for line in index_file:
+                        if "," in line:
+                            iri, dirname = line.rstrip("\n").rsplit(",", 1)
+                            self.graph_folders[iri] = dirname
+
+        dirname = self.graph_folders.get(graph)
+        if dirname is None:
+            # As 'echo $graph | base64 -w 0' in split-graphs.sh, though url safe.
+            dirname = base64.urlsafe_b64encode(graph + "\n")
+            self.graph_folders[graph] = dirname
+        if not os.path.isdir(os.path.join(self.sink_dir, dirname)):
+            os.makedirs(os.path.join(self.sink_dir, dirname))
+            with open(self.index_path, "a") as index_file:
+                index_file.write("%s,%s\n" % (graph, dirname))
+        return dirname
+
+    def verify_handshake(self):
+        """
+        Verify that handshake files in source_dir and sink_dir are equal, otherwise take appropriate action.
+        :return: the current value of the handshake or None if no handshake was found.
+        """
+        hs_source = self.read_value(os.path.join(self.source_dir, FILE_HANDSHAKE))
+        hs_sink = self.read_value(os.path.join(self.sink_dir, FILE_HANDSHAKE))
+
+        if hs_source is None:
+            print >> sys.stderr, "WARNING: No source handshake found. Not interfering with status quo."
+            return None
+
+        if hs_sink is None and os.listdir(self.sink_dir):
+            print >> sys.stderr, "Error: No sink handshake found and %s not empty." % self.sink_dir
+            print >> sys.stderr, "Not interfering with status quo."
+            return None
+
+        if hs_source != hs_sink and hs_sink is not None:
+            print >> sys.stderr, "Handshake not equal. source=%s sink=%s" % (hs_source, hs_sink)
+            print >> sys.stderr, "Cleaning %s" % self.sink_dir
+            for name in os.listdir(self.sink_dir):
+                path = os.path.join(self.sink_dir, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            self.graph_folders = None
+            hs_sink = None
+
+        if hs_sink is None:
+            with open(os.path.join(self.sink_dir, FILE_HANDSHAKE), "w") as hs_file:
+                hs_file.write(hs_source)
+            for name in (FILE_FILED_NQUADS, FILE_FILED_FILES, FILE_FILED_PARTS):
+                if os.path.isfile(os.path.join(self.sink_dir, name)):
+                    os.remove(os.path.join(self.sink_dir, name))
+            print >> sys.stderr, "Signed new handshake: %s" % hs_source
+
+        return hs_source
+
+    def sink_subdirs(self):
+        return [os.path.join(self.sink_dir, name) for name in os.listdir(self.sink_dir)
+                if os.path.isdir(os.path.join(self.sink_dir, name))]
+
+    def disable_processing_of_last_patch(self, dirname):
+        """
+        Disable processing of last real 'rdf_out_*' file in a sink directory by chained processes. Called before
+        files are filed to the directory, so directories that receive no files keep their sham file.
+        :param dirname: the name of the directory in sink_dir
+        """
+        sham_file = os.path.join(self.sink_dir, dirname, SHAM_RDF_OUT_FILE)
+        if os.path.exists(sham_file):
+            os.remove(sham_file)
+
+    def enable_processing_of_last_patch(self):
+        """
+        Enable processing of last real 'rdf_out_*' file in sink directories by chained processes. Only directories
+        without a sham file, i.e. directories that received files this run or that were left without a sham file by
+        an interrupted run, get a new one, so watchers see the other directories as unchanged.
+        """
+        for directory in self.sink_subdirs():
+            sham_file = os.path.join(directory, SHAM_RDF_OUT_FILE)
+            if not os.path.exists(sham_file):
+                open(sham_file, "a").close()
+
+    def write_metrics(self):
+        """
+        Write the metrics of this run to metrics_dir, if given.
+        """
+        self.metrics.set("vql_quads_exported", self.count_nquads)
+        self.metrics.set("vql_files_exported", self.count_files)
+        self.metrics.finish()
+        if self.metrics_dir:
+            self.metrics.write(self.metrics_dir, FILE_METRICS)
+
+    def report_totals(self):
+        """
+        Keep track of filed files and N-Quads, print the results of this run.
+        """
+        exported_nquads = self.read_value(os.path.join(self.source_dir, FILE_FILED_NQUADS), 0)
+        exported_files = self.read_value(os.path.join(self.source_dir, FILE_FILED_FILES), 0)
+        filed_nquads = self.read_value(os.path.join(self.sink_dir, FILE_FILED_NQUADS), 0) + self.count_nquads
+        filed_files = self.read_value(os.path.join(self.sink_dir, FILE_FILED_FILES), 0) + self.count_files
+        filed_parts = self.read_value(os.path.join(self.sink_dir, FILE_FILED_PARTS), 0) + self.count_parts
+
+        # The resourcesync-generator accounts for the files in sink_dir, the quad-logger for the files it exported.
+        with open(os.path.join(self.sink_dir, FILE_FILED_FILES), "w") as count_file:
+            count_file.write(str(filed_files))
+        with open(os.path.join(self.sink_dir, FILE_FILED_PARTS), "w") as count_file:
+            count_file.write(str(filed_parts))
+        with open(os.path.join(self.sink_dir, FILE_FILED_NQUADS), "w") as count_file:
+            count_file.write(str(filed_nquads))
+
+        if exported_nquads != filed_nquads:
+            print >> sys.stderr, "INFO: Quad count out of sync: exported N-Quads=%d, filed N-Quads=%d" \
+                                 % (exported_nquads, filed_nquads)
+        if exported_files != filed_parts:
+            print >> sys.stderr, "INFO: File count out of sync: exported files=%d, filed files=%d" \
+                                 % (exported_files, filed_parts)
+        print >> sys.stderr, "Filed since %s: %d N-Quads in \t %d files" % (self.handshake, filed_nquads, filed_files)
+
+    @staticmethod
+    def read_value(path, default=None):
+        """
+        :param path: path to a file with a single value
+        :param default: value if the file does not exist
+        :return: the value in the file, as int if default is an int
+        """
+        if not os.path.isfile(path):
+            return default
+        with open(path, "r") as value_file:
+            value = value_file.read().rstrip("\n")
+        return int(value) if isinstance(default, int) else value
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    # parser arguments:
+    # --source_dir: directory with rdf patch files not subdivided over graph iri
+    # --sink_dir: directory for rdf patch files subdivided over graph iri
+    # --max_quads_per_file: concatenate consecutive files of the same graph up to this number of N-Quads, 0: do not
+    # --metrics_dir: directory to write metrics of each run to. Default: do not write metrics
+    parser.add_argument('--source_dir', required=True)
+    parser.add_argument('--sink_dir', required=True)
+    parser.add_argument('--max_quads_per_file', type=int, default=0)
+    parser.add_argument('--metrics_dir', default="")
+    args = parser.parse_args()
+
+    if GraphSplitter(args.source_dir, args.sink_dir, args.max_quads_per_file, args.metrics_dir).split() is None:
+        sys.exit(1)
@@ -0,0 +1,145 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import json, os, time
+from contextlib import contextmanager
+
+# Durations and counters of a run, written as a file for the Prometheus node exporter textfile collector and as a
+# line in a JSON run log. The quad-logger and the graph-splitter write the same metric names from their shell
+# scripts, each with its own service label.
+#
+#   vql_phase_seconds{phase, graph}     seconds spent in a phase: handshake, list, create_zip, publish_metadata,
+#                                       cleanup, upload, switch, split, dump, parse
+#   vql_bytes_read{graph}               bytes of resources packaged
+#   vql_bytes_written{graph}            bytes of packages written
+#   vql_zips_created{graph}             packages written
+#   vql_bytes_uploaded{graph}           bytes copied to the storage backend
+#   vql_resources_deduplicated{graph}   resources not packaged because they duplicate a published resource
+#   vql_pending_files{graph}            rdf patch files not yet in a completed package
+#   vql_quads_exported                  N-Quads exported or filed
+#   vql_files_exported                  rdf patch files exported, filed or packaged
+#   vql_run_seconds                     duration of the run
+#   vql_last_run_timestamp_seconds      end of the run, in seconds since the epoch
+
+METRIC_HELP = {
+    "vql_phase_seconds": "Seconds spent in a phase of the last run.",
+    "vql_bytes_read": "Bytes of resources packaged in the last run.",
+    "vql_bytes_written": "Bytes of packages written in the last run.",
+    "vql_zips_created": "Packages written in the last run.",
+    "vql_bytes_uploaded": "Bytes copied to the storage backend in the last run.",
+    "vql_resources_deduplicated": "Resources referring to a published duplicate instead of being packaged.",
+    "vql_pending_files": "Rdf patch files not yet in a completed package.",
+    "vql_quads_exported": "N-Quads exported or filed in the last run.",
+    "vql_files_exported": "Rdf patch files exported, filed or packaged in the last run.",
+    "vql_run_seconds": "Duration of the last run in seconds.",
+    "vql_last_run_timestamp_seconds": "End of the last run in seconds since the epoch.",
+}
+
+
+class Metrics(object):
+    """
+    Collects metric values of one run. Values are keyed by metric name and labels; adding to an existing key
+    accumulates.
+    """
+
+    def __init__(self, **labels):
+        """
+        Initialize new Metrics.
+        :param labels: labels of all metrics, f.i. service="resourcesync-generator"
+        :return:
+        """
+        self.labels = labels
+        self.values = {}
+        self.start = time.time()
+
+    def add(self, name, value, **labels):
+        """
+        Add value to the metric name with labels.
+        :param name: the metric name
+        :param value: the value to add
+        :param labels: labels of the metric, f.i. graph="aHR0cDovL2V4YW1wbGUuY29tCg=="
+        """
+        key = (name, tuple(sorted(labels.items())))
+        self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        Set the metric name with labels to value.
+        """
+        self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def get(self, name, default=None, **labels):
+        """
+        :return: the value of the metric name with labels or default if it was not recorded
+        """
+        return self.values.get((name, tuple(sorted(labels.items()))), default)
+
+    @contextmanager
+    def timer(self, phase, **labels):
+        """
+        Add the seconds spent in the with-block to vql_phase_seconds of phase.
+        :param phase: the name of the phase
+        :param labels: further labels of the metric
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add("vql_phase_seconds", time.time() - start, phase=phase, **labels)
+
+    def merge(self, other):
+        """
+        Add the values of other, f.i. the metrics of a synchronizer that ran in a worker process.
+        :param other: Metrics
+        """
+        for (name, labels), value in other.values.items():
+            self.add(name, value, **dict(labels))
+
+    def finish(self):
+        """
+        Record the duration and end of the run.
+        """
+        now = time.time()
+        self.set("vql_run_seconds", now - self.start)
+        self.set("vql_last_run_timestamp_seconds", now)
+
+    def as_prometheus(self):
+        """
+        :return: the metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for name in sorted(set(name for name, labels in self.values)):
+            lines.append("# HELP %s %s" % (name, METRIC_HELP.get(name, name)))
+            lines.append("# TYPE %s gauge" % name)
+            for (key_name, labels), value in sorted(self.values.items()):
+                if key_name != name:
+                    continue
+                all_labels = sorted(self.labels.items()) + list(labels)
+                label_text = ",".join('%s="%s"' % (key, str(val).replace("\\", "\\\\").replace('"', '\\"'))
+                                      for key, val in all_labels)
+                lines.append("%s{%s} %s" % (name, label_text, repr(float(value))))
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self):
+        """
+        :return: the metrics as a dictionary for the JSON run log
+        """
+        return {"labels": self.labels,
+                "metrics": [dict(name=name, labels=dict(labels), value=value)
+                            for (name, labels), value in sorted(self.values.items())]}
+
+    def write(self, metrics_dir, basename):
+        """
+        Write the metrics to basename.prom in metrics_dir and append them as one line to the run log basename.json.
+        The .prom file is replaced atomically, as the textfile collector requires.
+        :param metrics_dir: the directory to write to
+        :param basename: the file name without extension, f.i. 'resourcesync_generator'
+        """
+        if not os.path.isdir(metrics_dir):
+            os.makedirs(metrics_dir)
+        prom_path = os.path.join(metrics_dir, basename + ".prom")
+        with open(prom_path + ".tmp", "w") as prom_file:
+            prom_file.write(self.as_prometheus())
+        os.rename(prom_path + ".tmp", prom_path)
+        with open(os.path.join(metrics_dir, basename + ".json"), "a") as log_file:
+            log_file.write(json.dumps(self.as_dict(), sort_keys=True) + "\n")
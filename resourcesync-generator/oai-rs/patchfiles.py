@@ -0,0 +1,143 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import base64, os, re, resync.w3c_datetime as w3cdt
+from resync.resource import Resource
+from resync.resource_list import ResourceList
+from urlset import Urlset, URL
+
+# Compact representation of rdf patch files that are listed for publishing. A resync.Resource keeps uri, path and
+# md5 as separate strings, and lastmod as a float, for each resource. Rdf patch files of one list share the prefix of
+# their uri and the directory of their path, so a PatchFile only keeps the name, the length, the lastmod in whole
+# seconds and the md5 as a 16 byte digest. Resources are created when they are needed to write packages and
+# documents.
+
+PATTERN_LASTMOD = re.compile("<lastmod>([^<]*)</lastmod>")
+PATTERN_MD5 = re.compile("hash=\"(?:[^\"]* )?md5:([^\" ]+)")
+PATTERN_LENGTH = re.compile("length=\"(\\d+)\"")
+
+
+class PatchFile(object):
+    """
+    An rdf patch file in a PatchFileList.
+    """
+    __slots__ = ("name", "length", "timestamp", "digest")
+
+    def __init__(self, name, length=None, timestamp=None, digest=None):
+        """
+        :param name: the file name
+        :param length: the length of the file
+        :param timestamp: lastmod in seconds since the epoch, or None if not known yet
+        :param digest: the md5 of the file as 16 bytes, or None if not known yet
+        """
+        self.name = name
+        self.length = length
+        self.timestamp = timestamp
+        self.digest = digest
+
+
+class PatchFileList(object):
+    """
+    A list of rdf patch files that share the prefix of their uri and the directory of their local path.
+    Iterating the list generates a resync.Resource for each file.
+    """
+
+    def __init__(self, url_prefix, directory=None):
+        """
+        Initialize a new PatchFileList.
+        :param url_prefix: the uri of a file is url_prefix + name
+        :param directory: the local path of a file is directory/name. Default: None, files have no local path
+        :return:
+        """
+        self.url_prefix = url_prefix
+        self.directory = directory
+        self.files = []
+
+    def __len__(self):
+        return len(self.files)
+
+    def __iter__(self):
+        for patch_file in self.files:
+            yield self.resource(patch_file)
+
+    def add(self, name, length=None, lastmod=None, md5=None):
+        """
+        Append a file.
+        :param name: the file name
+        :param length: the length of the file
+        :param lastmod: lastmod as xml-date, f.i. '2016-06-13T08:23:41Z', or None
+        :param md5: the md5 as base64, as in resync.Resource, or None
+        """
+        timestamp = int(w3cdt.str_to_datetime(lastmod)) if lastmod else None
+        digest = base64.b64decode(md5) if md5 else None
+        self.files.append(PatchFile(name, length, timestamp, digest))
+
+    def resource(self, patch_file):
+        """
+        :param patch_file: a PatchFile of this list
+        :return: the PatchFile as resync.Resource
+        """
+        path = os.path.join(self.directory, patch_file.name) if self.directory else None
+        md5 = base64.b64encode(patch_file.digest) if patch_file.digest is not None else None
+        return Resource(uri=self.url_prefix + patch_file.name, length=patch_file.length,
+                        timestamp=patch_file.timestamp, md5=md5, path=path)
+
+    def resource_list(self):
+        """
+        :return: the files as resync.ResourceList
+        """
+        resourcelist = ResourceList()
+        for resource in self:
+            resourcelist.add(resource)
+        return resourcelist
+
+    def keys(self):
+        """
+        :return: the sorted (name, md5 digest) of the files
+        """
+        return sorted((patch_file.name, patch_file.digest) for patch_file in self.files)
+
+    def is_same(self, other):
+        """
+        Compare the files of two lists by uri and md5. Files of which the md5 is not known are not the same as any
+        other file.
+        :param other: a PatchFileList
+        :return: True if both lists have the same files, False otherwise
+        """
+        if len(self) != len(other):
+            return False
+        if len(self) == 0:
+            return True
+        keys = self.keys()
+        return self.url_prefix == other.url_prefix and None not in (digest for name, digest in keys) \
+            and keys == other.keys()
+
+    @staticmethod
+    def read(path):
+        """
+        Read the resources of a sitemap document of the <urlset> format, as written by the resync library, without
+        creating a resync.Resource for each of them. The uri prefix of the list is taken from the first resource.
+        :param path: the local path of the document
+        :return: the PatchFileList
+        :raises RuntimeError: if the resources in the document do not share a uri prefix
+        """
+        patch_files = PatchFileList(None)
+        with open(path, "r") as fp:
+            for kind, text in Urlset.tokens(fp):
+                if kind != URL:
+                    continue
+                loc = Urlset.loc(text)
+                url_prefix, name = loc.rsplit("/", 1)
+                url_prefix += "/"
+                if patch_files.url_prefix is None:
+                    patch_files.url_prefix = url_prefix
+                elif url_prefix != patch_files.url_prefix:
+                    raise RuntimeError("Resource %s in %s is not published at %s" % (loc, path, patch_files.url_prefix))
+                lastmod = PATTERN_LASTMOD.search(text)
+                md5 = PATTERN_MD5.search(text)
+                length = PATTERN_LENGTH.search(text)
+                patch_files.add(name,
+                                length=int(length.group(1)) if length else None,
+                                lastmod=lastmod.group(1) if lastmod else None,
+                                md5=md5.group(1) if md5 else None)
+        return patch_files
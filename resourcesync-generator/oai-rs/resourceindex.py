@@ -0,0 +1,190 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+
+FILE_RESOURCE_INDEX = "vql_resource_index.db"
+
+
+class ResourceIndex(object):
+    """
+    Persistent index of resources in a resource directory.
+    The index keeps the lastmod timestamp and md5 of each resource, keyed by filename, size and modification time.
+    A resource that has not changed since it was last indexed need not be read again.
+    The index is kept as an sqlite database in the resource directory itself.
+    """
+
+    def __init__(self, resource_dir, filename=FILE_RESOURCE_INDEX):
+        """
+        Initialize a new ResourceIndex. The index is opened lazily on first use.
+        :param resource_dir: the directory whose resources are indexed
+        :param filename: the name of the index file in resource_dir
+        :return:
+        """
+        self.path = os.path.join(resource_dir, filename)
+        self.connection = None
+
+    def connect(self):
+        """
+        Open the index, creating it if it does not exist.
+        :return: the connection to the index
+        """
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.text_factory = str
+            self.connection.execute("CREATE TABLE IF NOT EXISTS resources ("
+                                    "filename TEXT PRIMARY KEY, size INTEGER, mtime REAL, "
+                                    "lastmod TEXT, md5 TEXT)")
+        return self.connection
+
+    def get(self, filename, size, mtime):
+        """
+        Look up the indexed properties of a resource.
+        :param filename: the name of the resource file
+        :param size: the current size of the resource file
+        :param mtime: the current modification time of the resource file
+        :return: (lastmod, md5) of the resource or None if the resource is not indexed or has changed since.
+        """
+        row = self.connect().execute("SELECT lastmod, md5 FROM resources WHERE filename=? AND size=? AND mtime=?",
+                                     (filename, size, mtime)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1]
+
+    def put(self, filename, size, mtime, lastmod, md5):
+        """
+        Index the properties of a resource, replacing any previous entry for the same filename.
+        :param filename: the name of the resource file
+        :param size: the size of the resource file
+        :param mtime: the modification time of the resource file
+        :param lastmod: the lastmod timestamp of the resource
+        :param md5: the md5 of the resource
+        """
+        self.connect().execute("INSERT OR REPLACE INTO resources (filename, size, mtime, lastmod, md5) "
+                               "VALUES (?, ?, ?, ?, ?)", (filename, size, mtime, lastmod, md5))
+
+    def discard(self, filenames):
+        """
+        Remove resources from the index, f.i. because they are packaged definitively.
+        :param filenames: names of the resource files to remove
+        """
+        self.connect().executemany("DELETE FROM resources WHERE filename=?", [(f,) for f in filenames])
+        self.commit()
+
+    def filenames(self):
+        """
+        :return: the names of all indexed resource files
+        """
+        return [f for (f,) in self.connect().execute("SELECT filename FROM resources")]
+
+    def retain(self, filenames):
+        """
+        Remove all resources from the index that are not in filenames.
+        :param filenames: names of the resource files currently in the resource directory
+        """
+        keep = set(filenames)
+        stale = [f for f in self.filenames() if f not in keep]
+        if stale:
+            self.discard(stale)
+
+    def commit(self):
+        """
+        Commit changes to the index, if any.
+        """
+        if self.connection is not None:
+            self.connection.commit()
+
+    def close(self):
+        """
+        Commit changes and close the index.
+        """
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+
+FILE_CONTENT_INDEX = "vql_content_index.db"
+
+
+class ContentIndex(object):
+    """
+    Persistent index of resources published in completed packages, keyed by md5.
+    A resource with the same md5 as an indexed resource need not be packaged again; it can refer to the package and
+    path the indexed resource was published in. Only completed packages are indexed, because their location does not
+    change. The index is kept as an sqlite database in the resource directory.
+    """
+
+    def __init__(self, resource_dir, filename=FILE_CONTENT_INDEX):
+        """
+        Initialize a new ContentIndex. The index is opened lazily on first use.
+        :param resource_dir: the directory whose resources are published
+        :param filename: the name of the index file in resource_dir
+        :return:
+        """
+        self.path = os.path.join(resource_dir, filename)
+        self.connection = None
+        self.length_set = None
+
+    def connect(self):
+        """
+        Open the index, creating it if it does not exist.
+        :return: the connection to the index
+        """
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.text_factory = str
+            self.connection.execute("CREATE TABLE IF NOT EXISTS contents ("
+                                    "md5 TEXT PRIMARY KEY, length INTEGER, package TEXT, path TEXT)")
+        return self.connection
+
+    def lengths(self):
+        """
+        :return: the set of lengths of indexed resources. Only resources of these lengths can have an indexed md5.
+        """
+        if self.length_set is None:
+            rows = self.connect().execute("SELECT DISTINCT length FROM contents")
+            self.length_set = set(length for (length,) in rows)
+        return self.length_set
+
+    def get(self, md5):
+        """
+        Look up where a resource with the given md5 was published.
+        :param md5: the md5 of the resource
+        :return: (url of the package, path in the package) or None if no resource with md5 was published.
+        """
+        row = self.connect().execute("SELECT package, path FROM contents WHERE md5=?", (md5,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1]
+
+    def put(self, md5, length, package, path):
+        """
+        Index a resource published in a completed package. A resource with the same md5 that was indexed before is
+        kept.
+        :param md5: the md5 of the resource
+        :param length: the length of the resource
+        :param package: the url of the package
+        :param path: the path of the resource in the package
+        """
+        self.connect().execute("INSERT OR IGNORE INTO contents (md5, length, package, path) VALUES (?, ?, ?, ?)",
+                               (md5, length, package, path))
+        self.lengths().add(length)
+
+    def commit(self):
+        """
+        Commit changes to the index, if any.
+        """
+        if self.connection is not None:
+            self.connection.commit()
+
+    def close(self):
+        """
+        Close the index. Changes that were not committed are discarded, so that the index does not refer to packages
+        of a run that failed.
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            self.length_set = None
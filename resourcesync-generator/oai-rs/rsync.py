@@ -7,6 +7,9 @@ sys.path.append(".")
 
 from argparse import ArgumentParser
 from syncdirector import SyncDirector
+from watcher import create_watcher
+from graphsplitter import GraphSplitter
+from storage import S3Storage, STORAGE_LOCAL, STORAGE_S3
 
 # Publish rdf patch files as resource dumps.
 
@@ -23,6 +26,33 @@ parser = ArgumentParser()
 # --write_separate_manifest: 'y' to write manifest included in published dump also in sink_dir as a separate file
 # --move_resources: 'y' to move definitely published resources from source_dir to sink_dir,
 #                   otherwise simply remove them from resource_dir.
+# --workers: the number of processes that publish graph directories in parallel
+# --compression: the compression of published dumps, f.i. 'deflate' or 'store' for zipsynchronizer.ZipSynchronizer,
+#                'xz' or 'zstd' for tarsynchronizer.TarSynchronizer. Default: the default of builder_class
+# --compression_level: the compression level of published dumps. Default: the default of the compression
+# --deduplicate: 'y' to refer to published resources with the same content instead of packaging them again
+# --max_package_size: complete a package when its resource files exceed this number of bytes. Default: no limit
+# --max_compressed_size: complete a package when it would exceed this number of bytes. Default: no limit
+# --max_package_age: complete a package when its oldest resource file is this old, as for sleep: f.i. 7d.
+#                    Default: no limit
+# --watch: 'y' to stay resident and publish graph directories as soon as the chained service finished a run,
+#          otherwise publish once and exit.
+# --run_interval: when watching, the interval between publishing all directories, as for sleep: f.i. 3600s or 1h
+# --poll_interval: when watching without inotify, seconds between polls of source_dir
+# --split_source_dir: directory with rdf patch files not subdivided over graph iri. If given, these files are split
+#                     over graph iri into source_dir before publishing, as graph-splitter does.
+# --max_quads_per_file: when splitting, concatenate consecutive files of the same graph up to this number of N-Quads.
+#                       Default: 0, do not concatenate
+# --versioned_sink: 'y' to publish each handshake to its own generation directory in sink_dir and switch to it
+#                   when it is complete, instead of clearing sink_dir when the handshake changes
+# --storage: where sink_dir is served from: 'local' for sink_dir itself, 's3' to copy sink_dir to an S3-compatible
+#            object store after each run. Credentials for 's3' are taken from the environment, as boto3 does.
+# --s3_bucket: the bucket to copy sink_dir to
+# --s3_prefix: the prefix of keys in the bucket, f.i. 'dumps/'. Default: the root of the bucket
+# --s3_endpoint_url: the url of the object store. Default: Amazon S3
+# --upload_workers: the number of files uploaded in parallel per graph directory
+# --metrics_dir: directory to write metrics of each run to, for the Prometheus textfile collector.
+#                Default: do not write metrics
 parser.add_argument('--source_dir', required=True)
 parser.add_argument('--sink_dir', required=True)
 parser.add_argument('--publish_url', required=True)
@@ -30,11 +60,74 @@ parser.add_argument('--builder_class', default="zipsynchronizer.ZipSynchronizer"
 parser.add_argument('--max_files_compressed', type=int, default=50000)
 parser.add_argument('--write_separate_manifest', default="y")
 parser.add_argument('--move_resources', default="n")
+parser.add_argument('--workers', type=int, default=1)
+parser.add_argument('--compression', default="")
+parser.add_argument('--compression_level', default="")
+parser.add_argument('--deduplicate', default="n")
+parser.add_argument('--max_package_size', default="")
+parser.add_argument('--max_compressed_size', default="")
+parser.add_argument('--max_package_age', default="")
+parser.add_argument('--watch', default="n")
+parser.add_argument('--run_interval', default="3600s")
+parser.add_argument('--poll_interval', type=int, default=10)
+parser.add_argument('--split_source_dir', default="")
+parser.add_argument('--max_quads_per_file', type=int, default=0)
+parser.add_argument('--versioned_sink', default="n")
+parser.add_argument('--storage', default=STORAGE_LOCAL)
+parser.add_argument('--s3_bucket', default="")
+parser.add_argument('--s3_prefix', default="")
+parser.add_argument('--s3_endpoint_url', default="")
+parser.add_argument('--upload_workers', type=int, default=4)
+parser.add_argument('--metrics_dir', default="")
 args = parser.parse_args()
 
+
+def seconds(interval):
+    """
+    :param interval: NUMBER[SUFFIX] as for sleep, SUFFIX being s, m, h or d
+    :return: the number of seconds
+    """
+    multipliers = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if interval[-1] in multipliers:
+        return float(interval[:-1]) * multipliers[interval[-1]]
+    return float(interval)
+
+
 write_separate_manifest = args.write_separate_manifest == "y"
 move_resources = args.move_resources == "y"
+synchronizer_options = {}
+if args.compression:
+    synchronizer_options["compression"] = args.compression
+if args.compression_level:
+    synchronizer_options["compression_level"] = int(args.compression_level)
+if args.deduplicate == "y":
+    synchronizer_options["deduplicate"] = True
+if args.max_package_size:
+    synchronizer_options["max_package_size"] = int(args.max_package_size)
+if args.max_compressed_size:
+    synchronizer_options["max_compressed_size"] = int(args.max_compressed_size)
+if args.max_package_age:
+    synchronizer_options["max_package_age"] = seconds(args.max_package_age)
+
+storage = None
+if args.storage == STORAGE_S3:
+    storage = S3Storage(args.sink_dir, args.s3_bucket, args.s3_prefix, args.s3_endpoint_url or None,
+                        args.upload_workers)
+elif args.storage != STORAGE_LOCAL:
+    raise RuntimeError("Unsupported storage: %s" % args.storage)
 
 director = SyncDirector(args.source_dir, args.sink_dir, args.publish_url, args.builder_class,
-                        args.max_files_compressed, write_separate_manifest, move_resources)
-director.synchronize()
\ No newline at end of file
+                        args.max_files_compressed, write_separate_manifest, move_resources, args.workers,
+                        synchronizer_options, metrics_dir=args.metrics_dir or None,
+                        versioned=args.versioned_sink == "y", storage=storage)
+splitter = None
+if args.split_source_dir:
+    splitter = GraphSplitter(args.split_source_dir, args.source_dir, args.max_quads_per_file,
+                            metrics_dir=args.metrics_dir or None)
+if args.watch == "y":
+    watched_dir = args.split_source_dir or args.source_dir
+    director.watch(create_watcher(watched_dir, args.poll_interval), seconds(args.run_interval), splitter=splitter)
+else:
+    if splitter is not None:
+        splitter.split()
+    director.synchronize()
\ No newline at end of file
@@ -0,0 +1,237 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import os, re
+from abc import ABCMeta, abstractmethod
+from multiprocessing.pool import ThreadPool
+from resourceindex import ResourceIndex
+
+# Storage backends for published resource dumps. Synchronizers write packages and metadata to a local publish
+# directory, which is also where they read the previous state from. A storage backend makes the publish directory
+# available where it is served from. LocalStorage serves the publish directory itself; S3Storage copies what changed
+# in the publish directory to an S3-compatible object store after each run.
+# S3Storage needs the optional module boto3.
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+STORAGE_LOCAL = "local"
+STORAGE_S3 = "s3"
+
+FILE_STORAGE_INDEX = "vql_storage_index.db"
+
+MIME_TYPES = {".zip": "application/zip", ".xz": "application/x-tar", ".zst": "application/x-tar",
+              ".xml": "application/xml"}
+
+
+def publish_order(name):
+    """
+    The order in which files of a publish directory are stored: packages and other resources first, then
+    manifests, then resource dump documents and finally the capability list, so that documents are only stored
+    after the files they refer to.
+    :param name: the file name
+    :return: the rank of the file, lower ranks are stored first
+    """
+    if name == "capability-list.xml":
+        return 4
+    if name == "resource-dump.xml":
+        return 3
+    if re.match(r"resource-dump-\d+\.xml$", name):
+        return 2
+    if name.endswith(".xml"):
+        return 1
+    return 0
+
+
+class Storage(object):
+    """
+    Abstract base class for storage backends. The key of a file is its path relative to root.
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self, root=None):
+        """
+        :param root: the local directory that corresponds to the root of the storage
+        """
+        self.root = root
+
+    @abstractmethod
+    def sync(self, local_dir):
+        """
+        Store the files in local_dir that changed since the last call and remove the files that were removed.
+        :param local_dir: a directory in root
+        :return: (number of files stored, number of bytes stored)
+        """
+        pass
+
+    @abstractmethod
+    def clear(self):
+        """
+        Remove all files in the storage, f.i. when the handshake changed.
+        """
+        pass
+
+
+class LocalStorage(Storage):
+    """
+    The publish directory is served as is.
+    """
+
+    def sync(self, local_dir):
+        return 0, 0
+
+    def clear(self):
+        pass
+
+
+class S3Storage(Storage):
+    """
+    Copies publish directories to a bucket of an S3-compatible object store. Which files were stored is kept in an
+    index in each publish directory, so that only files that changed since the last run are uploaded; publish
+    directories and the bucket are not scanned. Files are uploaded in parallel, large files in parts of part_size.
+    """
+
+    def __init__(self, root, bucket, prefix="", endpoint_url=None, workers=4, part_size=8 * 1024 * 1024,
+                 client=None):
+        """
+        Initialize a new S3Storage. Credentials are taken from the environment, as boto3 does.
+        :param root: the local directory that corresponds to prefix
+        :param bucket: the name of the bucket
+        :param prefix: the prefix of keys, f.i. 'dumps/'. Default: '', the root of the bucket
+        :param endpoint_url: the url of the object store. Default: None, Amazon S3
+        :param workers: the number of files uploaded in parallel
+        :param part_size: files larger than part_size are uploaded in parts of this size. S3 requires at least 5 MiB.
+        :param client: an S3 client. Default: None, a boto3 client is created on first use
+        :return:
+        """
+        Storage.__init__(self, root)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.workers = workers
+        self.part_size = part_size
+        self.client = client
+        self.own_client = client is None
+
+    def __getstate__(self):
+        # A boto3 client cannot be passed to worker processes; each process creates its own.
+        state = self.__dict__.copy()
+        if self.own_client:
+            state["client"] = None
+        return state
+
+    def connect(self):
+        """
+        :return: the S3 client, created on first use
+        :raises RuntimeError: if boto3 is not installed
+        """
+        if self.client is None:
+            if boto3 is None:
+                raise RuntimeError("Storage %s needs the boto3 module. Install boto3." % STORAGE_S3)
+            self.client = boto3.client("s3", endpoint_url=self.endpoint_url)
+        return self.client
+
+    def key(self, path):
+        """
+        :param path: local path of a file in root
+        :return: the key of the file
+        """
+        return self.prefix + os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def sync(self, local_dir):
+        if not os.path.isdir(local_dir):
+            return 0, 0
+        index = ResourceIndex(local_dir, FILE_STORAGE_INDEX)
+        try:
+            stats = {}
+            for name in os.listdir(local_dir):
+                path = os.path.join(local_dir, name)
+                if name.startswith("vql_") or name.endswith(".tmp") or not os.path.isfile(path):
+                    continue
+                stats[name] = os.stat(path)
+            changed = [name for name, stat in stats.items() if index.get(name, stat.st_size, stat.st_mtime) is None]
+            removed = [name for name in index.filenames() if name not in stats]
+
+            size = 0
+            if changed:
+                self.connect()
+                pool = ThreadPool(min(self.workers, len(changed)))
+                try:
+                    for rank in sorted(set(publish_order(name) for name in changed)):
+                        names = sorted(name for name in changed if publish_order(name) == rank)
+                        pool.map(self.upload, [os.path.join(local_dir, name) for name in names])
+                        for name in names:
+                            index.put(name, stats[name].st_size, stats[name].st_mtime, None, None)
+                            size += stats[name].st_size
+                        index.commit()
+                finally:
+                    pool.close()
+                    pool.join()
+
+            # Removed files are no longer referred to by the documents just stored.
+            if removed:
+                self.delete([self.key(os.path.join(local_dir, name)) for name in removed])
+                index.discard(removed)
+            return len(changed), size
+        finally:
+            index.close()
+
+    def upload(self, path):
+        """
+        Upload a file. Files larger than part_size are streamed in parts, so that at most one part per file is
+        kept in memory.
+        :param path: the local path of the file
+        """
+        client = self.connect()
+        key = self.key(path)
+        extra = {}
+        mime_type = MIME_TYPES.get(os.path.splitext(path)[1])
+        if mime_type:
+            extra["ContentType"] = mime_type
+
+        if os.stat(path).st_size <= self.part_size:
+            with open(path, "rb") as body:
+                client.put_object(Bucket=self.bucket, Key=key, Body=body, **extra)
+            return
+
+        upload_id = client.create_multipart_upload(Bucket=self.bucket, Key=key, **extra)["UploadId"]
+        try:
+            parts = []
+            with open(path, "rb") as body:
+                while True:
+                    data = body.read(self.part_size)
+                    if not data:
+                        break
+                    number = len(parts) + 1
+                    response = client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                  PartNumber=number, Body=data)
+                    parts.append({"PartNumber": number, "ETag": response["ETag"]})
+            client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                             MultipartUpload={"Parts": parts})
+        except:
+            client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    def delete(self, keys):
+        """
+        Delete objects, at most 1000 per request.
+        :param keys: the keys of the objects
+        """
+        for i in range(0, len(keys), 1000):
+            self.connect().delete_objects(Bucket=self.bucket,
+                                          Delete={"Objects": [{"Key": key} for key in keys[i:i + 1000]]})
+
+    def clear(self):
+        client = self.connect()
+        token = None
+        while True:
+            kwargs = {"Bucket": self.bucket, "Prefix": self.prefix}
+            if token:
+                kwargs["ContinuationToken"] = token
+            response = client.list_objects_v2(**kwargs)
+            self.delete([item["Key"] for item in response.get("Contents", [])])
+            token = response.get("NextContinuationToken")
+            if not response.get("IsTruncated") or not token:
+                break
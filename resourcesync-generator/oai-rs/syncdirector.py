@@ -3,17 +3,51 @@
 
 import importlib
 import os
+import re
 import shutil
+import tempfile
+import threading
+import time
+from multiprocessing import Pool
+
+from metrics import Metrics
 
 from resync.sitemap import Sitemap
 from resync.source_description import SourceDescription
 from synchronizer import RS_RESOURCESYNC, RS_WELL_KNOWN, RS_CAPABILITY_LIST_XML, RS_RESOURCE_DUMP_XML, \
+    RS_RESOURCE_DUMP_PART, \
     PREFIX_MANIFEST, PREFIX_END_PART, PREFIX_COMPLETED_PART, PATTERN_RDF_OUT
 
 FILE_HANDSHAKE = "vql_started_at.txt"
 FILE_INDEX = "vql_graph_folder.csv"
 FILE_FILED_FILES = "vql_files_count.txt"
 FILE_SYNCED_FILES = "vql_files_count.txt"
+FILE_METRICS = "resourcesync_generator"
+DIR_GENERATIONS = "vql_generations"
+
+
+def publish_resources(job):
+    """
+    Publish the resources of one source directory. This is a module level function, so that it can be executed
+    by worker processes.
+    :param job: tuple of synchronizer class, the positional arguments and the keyword arguments to its constructor
+    :return: (the result of publish() of the synchronizer, the metrics of the synchronizer)
+    """
+    sync_class, args, kwargs = job
+    synchronizer = sync_class(*args, **kwargs)
+    return synchronizer.publish(), synchronizer.metrics
+
+
+def remove_trees(paths):
+    """
+    Remove directories and files, f.i. in a background thread.
+    :param paths: the directories and files to remove
+    """
+    for path in paths:
+        if os.path.islink(path) or os.path.isfile(path):
+            os.remove(path)
+        else:
+            shutil.rmtree(path, ignore_errors=True)
 
 
 class SyncDirector(object):
@@ -27,11 +61,16 @@ class SyncDirector(object):
         Since a Source has one Capability List per set of resources that it distinguishes, the Source Description
         will enumerate as many Capability Lists as the Source has distinct sets of resources.
 
+    If versioned, each handshake is published to its own generation directory in sink_dir/vql_generations. The
+    entries of sink_dir are relative symlinks into the generation that is published. When the handshake changes,
+    the new generation is built while the old one stays published; at the end of the first run the symlinks are
+    switched to the new generation and the old generation is removed in the background.
     """
 
     def __init__(self, source_dir, sink_dir, publish_url, synchronizer_class,
                  max_files_compressed=50000, write_separate_manifest=True,
-                 move_resources=False):
+                 move_resources=False, workers=1, synchronizer_options=None, metrics_dir=None, versioned=False,
+                 storage=None):
         """
         Initialize a new SyncDirector.
         :param source_dir: the source directory for resources
@@ -41,6 +80,14 @@ class SyncDirector(object):
         :param max_files_compressed: the maximum number of resource files that should be compressed in one zip file
         :param write_separate_manifest: will each zip file be accompanied by a separate resourcedump manifest.
         :param move_resources: Do we move the zipped resources to publish_dir or simply delete them from resource_dir.
+        :param workers: the number of processes that publish graph directories in parallel.
+        :param synchronizer_options: dictionary of additional keyword arguments to the constructor of
+                synchronizer_class, f.i. {"compression": "store"}. Default: None
+        :param metrics_dir: directory to write metrics of each run to, see metrics.py. Default: None, do not write
+        :param versioned: publish each handshake to its own generation directory instead of clearing sink_dir when
+                the handshake changes. Default: False
+        :param storage: the storage backend sink_dir is served from, see storage.py. It is passed to
+                synchronizer_class as keyword argument storage. Default: None, sink_dir itself
         :return:
         """
         self.source_dir = source_dir
@@ -56,6 +103,20 @@ class SyncDirector(object):
         self.max_files_compressed = max_files_compressed
         self.write_separate_manifest = write_separate_manifest
         self.move_resources = move_resources
+        if workers < 1:
+            raise RuntimeError("Number of workers should be at least 1, got %s." % str(workers))
+        self.workers = workers
+        self.synchronizer_options = synchronizer_options or {}
+        self.metrics_dir = metrics_dir
+        self.metrics = Metrics(service="resourcesync-generator")
+        self.versioned = versioned
+        self.storage = storage
+        if self.versioned and self.storage is not None:
+            raise RuntimeError("A versioned sink cannot be combined with a storage backend.")
+        # The directory published to: sink_dir or, if versioned, the generation directory of the handshake.
+        self.publish_root = self.sink_dir
+        # Thread removing old generations
+        self.collector = None
 
         names = synchronizer_class.rsplit(".", 1)
         self.sync_class = getattr(importlib.import_module(names[0]), names[1])
@@ -67,10 +128,19 @@ class SyncDirector(object):
         self.total_count_def_resources = 0
         self.total_diff_end_resources = 0
 
-    def synchronize(self):
+        # The source description is kept in memory between runs of a watching SyncDirector.
+        self.src_desc = None
+        self.src_desc_handshake = None
+
+    def synchronize(self, dirnames=None):
         """
         Publish the resources found in source_dir in accordance with the Resourcesync Framework in sink_dir.
+        :param dirnames: names of the graph directories in source_dir to publish. Default: None, all directories
         """
+        self.total_count_def_resources = 0
+        self.total_diff_end_resources = 0
+        self.metrics = Metrics(service="resourcesync-generator")
+
         if not os.path.isdir(self.source_dir):
             os.makedirs(self.source_dir)
             print "Created %s" % self.source_dir
@@ -79,26 +149,38 @@ class SyncDirector(object):
             os.makedirs(self.sink_dir)
             print "Created %s" % self.sink_dir
 
-        self.handshake = self.verify_handshake()
+        with self.metrics.timer("handshake"):
+            self.handshake = self.verify_handshake()
         if self.handshake is None:
+            self.write_metrics()
             return
         ####################
 
         # print "Synchronizing state as of %s" % self.handshake
 
+        if self.storage is not None:
+            self.storage.root = self.publish_root
+
         ### initial resource description
-        wellknown = os.path.join(self.sink_dir, RS_WELL_KNOWN)
+        self.src_desc_path = os.path.join(self.publish_root, RS_WELL_KNOWN, RS_RESOURCESYNC)
+        wellknown = os.path.join(self.publish_root, RS_WELL_KNOWN)
         if not os.path.isdir(wellknown):
             os.makedirs(wellknown)
 
-        src_desc = SourceDescription()
-        new_src_desc = True
-        # Load existing resource-description, if any.
-        if os.path.isfile(self.src_desc_path):
-            new_src_desc = False
-            with open(self.src_desc_path, "r") as src_desc_file:
-                sm = Sitemap()
-                sm.parse_xml(src_desc_file, resources=src_desc)
+        new_src_desc = not os.path.isfile(self.src_desc_path)
+        if self.src_desc_handshake != self.handshake:
+            # sink_dir may have been shrubbed: publish all directories.
+            dirnames = None
+            self.src_desc = None
+        if self.src_desc is None or new_src_desc:
+            self.src_desc = SourceDescription()
+            self.src_desc_handshake = self.handshake
+            # Load existing resource-description, if any.
+            if not new_src_desc:
+                with open(self.src_desc_path, "r") as src_desc_file:
+                    sm = Sitemap()
+                    sm.parse_xml(src_desc_file, resources=self.src_desc)
+        src_desc = self.src_desc
 
         count_lists = len(src_desc.resources)
 
@@ -106,21 +188,65 @@ class SyncDirector(object):
         ### the existance of FILE_INDEX indicates whether resources reside directly in source_dir or in subdirectories.
         index_file = os.path.join(self.source_dir, FILE_INDEX)
         if os.path.isfile(index_file):
-            for dirname in os.walk(self.source_dir).next()[1]:
+            jobs = []
+            for dirname in sorted(os.walk(self.source_dir).next()[1]):
+                if dirnames is not None and dirname not in dirnames:
+                    continue
+                ### hidden directories, f.i. the staging directory of a partitioned dump, hold no graphs.
+                if dirname.startswith("."):
+                    continue
                 source = os.path.join(self.source_dir, dirname)
-                sink = os.path.join(self.sink_dir, dirname)
+                sink = os.path.join(self.publish_root, dirname)
                 publish_url = self.publish_url + dirname + "/"
-                self.__execute_sync__(source, sink, publish_url, src_desc)
+                jobs.append((source, sink, publish_url))
+            self.__execute_syncs__(jobs, src_desc)
         else:
-            self.__execute_sync__(self.source_dir, self.sink_dir, self.publish_url, src_desc)
+            self.__execute_sync__(self.source_dir, self.publish_root, self.publish_url, src_desc)
 
         if new_src_desc or count_lists != len(src_desc.resources):
             ### publish resource description
             with open(self.src_desc_path, "w") as src_desc_file:
                 src_desc_file.write(src_desc.as_xml())
                 print "New resource description. See %s" % self.src_desc_url
+        if self.storage is not None:
+            # after the capability lists it refers to
+            self.storage.sync(wellknown)
 
         self.report()
+        if self.versioned:
+            with self.metrics.timer("switch"):
+                self.switch_generation()
+        self.write_metrics()
+
+    def watch(self, watcher, interval=3600, rounds=None, splitter=None):
+        """
+        Stay resident and publish graph directories as soon as the watcher reports that the chained service
+        finished a run for them. All directories are published at the start and once every interval seconds.
+        :param watcher: a watcher of source_dir, or of the source directory of splitter, see watcher.py
+        :param interval: seconds between publishing all directories
+        :param rounds: the number of times to wait for the watcher before returning. Default: None, forever
+        :param splitter: a GraphSplitter with source_dir as sink directory that splits files before publishing.
+                Default: None
+        """
+        next_full = 0
+        while rounds is None or rounds > 0:
+            now = time.time()
+            if now >= next_full:
+                if splitter is not None:
+                    splitter.split()
+                self.synchronize()
+                next_full = now + interval
+                continue
+
+            changed = watcher.wait(next_full - now)
+            if rounds is not None:
+                rounds -= 1
+            if splitter is not None and changed:
+                changed = splitter.split() or set()
+            if "" in changed:
+                self.synchronize()
+            elif changed:
+                self.synchronize(changed)
 
     def __execute_sync__(self, source, sink, url, src_desc):
         """
@@ -130,10 +256,58 @@ class SyncDirector(object):
         :param url: the public url pointing to the sink
         :param src_desc: the current SourceDescription
         """
-        synchronizer = self.sync_class(source, sink, url,
-                            self.src_desc_url, self.max_files_compressed,
-                            self.write_separate_manifest, self.move_resources)
-        state_changed, count_def_resources, diff_end_resources = synchronizer.publish()
+        result, metrics = publish_resources(self.__job__(source, sink, url))
+        self.__merge_result__(url, result, src_desc, metrics)
+
+    def __execute_syncs__(self, jobs, src_desc):
+        """
+        Execute synchronisation of several source directories. If more than one worker was requested, the source
+        directories are published in parallel. Results are merged in the order of jobs.
+        :param jobs: list of (source, sink, url)
+        :param src_desc: the current SourceDescription
+        """
+        if self.workers == 1 or len(jobs) < 2:
+            for source, sink, url in jobs:
+                self.__execute_sync__(source, sink, url, src_desc)
+            return
+
+        pool = Pool(min(self.workers, len(jobs)))
+        try:
+            results = pool.map(publish_resources, [self.__job__(source, sink, url) for source, sink, url in jobs])
+        finally:
+            pool.close()
+            pool.join()
+
+        for (source, sink, url), (result, metrics) in zip(jobs, results):
+            self.__merge_result__(url, result, src_desc, metrics)
+
+    def __job__(self, source, sink, url):
+        """
+        Arguments for publish_resources for one source directory.
+        :param source: the directory where resources reside
+        :param sink: the directory to publish resources
+        :param url: the public url pointing to the sink
+        :return: tuple of synchronizer class, the positional arguments and the keyword arguments to its constructor
+        """
+        kwargs = self.synchronizer_options
+        if self.storage is not None:
+            kwargs = dict(kwargs, storage=self.storage)
+        return (self.sync_class,
+                (source, sink, url, self.src_desc_url, self.max_files_compressed,
+                 self.write_separate_manifest, self.move_resources),
+                kwargs)
+
+    def __merge_result__(self, url, result, src_desc, metrics=None):
+        """
+        Account for the result of the synchronisation of one source directory.
+        :param url: the public url pointing to the sink
+        :param result: (state_changed, count_def_resources, diff_end_resources)
+        :param src_desc: the current SourceDescription
+        :param metrics: the metrics of the synchronizer. Default: None
+        """
+        if metrics is not None:
+            self.metrics.merge(metrics)
+        state_changed, count_def_resources, diff_end_resources = result
         self.total_count_def_resources += count_def_resources
         self.total_diff_end_resources += diff_end_resources
         if state_changed:
@@ -141,13 +315,22 @@ class SyncDirector(object):
             if not capa_list_url in src_desc.resources:
                 src_desc.add_capability_list(capa_list_url)
 
+    def write_metrics(self):
+        """
+        Write the metrics of this run to metrics_dir, if given.
+        """
+        self.metrics.set("vql_files_exported", self.total_count_def_resources + self.total_diff_end_resources)
+        self.metrics.finish()
+        if self.metrics_dir:
+            self.metrics.write(self.metrics_dir, FILE_METRICS)
+
     def report(self):
         """
         Keep track of filed files and packaged resources, echo the results of this run to the console.
         """
         synced_files_def = 0
         synced_files_end = 0
-        synced_files_path = os.path.join(self.sink_dir, FILE_SYNCED_FILES)
+        synced_files_path = os.path.join(self.publish_root, FILE_SYNCED_FILES)
         if os.path.isfile(synced_files_path):
             with open(synced_files_path, "r") as sfile:
                 line = sfile.read()
@@ -211,11 +394,16 @@ class SyncDirector(object):
 
         if publish_handshake is None:
             # This can only be at the very start of synchronizing with a fresh empty publish_dir
-            if self.walk_publish_dir() > 0:
+            published = len(self.list_published()) if self.versioned else self.walk_publish_dir()
+            if published > 0:
                 print "Error: No publish handshake found and %s not empty. " \
                       "Not interfering with status quo of published resources." % self.sink_dir
                 return None
 
+        if self.versioned:
+            self.open_generation(resource_handshake, publish_handshake)
+            return resource_handshake
+
         if resource_handshake != publish_handshake:
             print "Resource_handshake is %s, publish_handshake is % s. Shrubbing %s" \
                   % (resource_handshake, publish_handshake, self.sink_dir)
@@ -224,12 +412,106 @@ class SyncDirector(object):
 
         if resource_handshake and publish_handshake is None:
             self.walk_publish_dir(remove_our_files=True)
+            if self.storage is not None:
+                self.storage.root = self.publish_root
+                self.storage.clear()
             with open(path_publish_handshake, "w") as w_file:
                 w_file.write(resource_handshake)
             print "Signed new handshake: %s" % resource_handshake
 
         return resource_handshake
 
+    def open_generation(self, resource_handshake, publish_handshake):
+        """
+        Set publish_root to the generation directory of resource_handshake, creating it if needed. If the handshake
+        changed, the generation that is published stays in place until switch_generation.
+        If sink_dir was published without generations, its entries are moved into the generation directory.
+        :param resource_handshake: the handshake of source_dir
+        :param publish_handshake: the handshake of the generation published in sink_dir, or None
+        """
+        generation = re.sub(r"[^\w.-]", "_", resource_handshake.strip())
+        self.publish_root = os.path.join(self.sink_dir, DIR_GENERATIONS, generation)
+        if os.path.isdir(self.publish_root):
+            return
+
+        os.makedirs(self.publish_root)
+        if resource_handshake == publish_handshake:
+            print "Moving published resources of %s to generation %s" % (self.sink_dir, generation)
+            for name in self.list_published():
+                path = os.path.join(self.sink_dir, name)
+                if not os.path.islink(path):
+                    os.rename(path, os.path.join(self.publish_root, name))
+                    os.symlink(os.path.join(DIR_GENERATIONS, generation, name), path)
+        else:
+            print "Resource_handshake is %s, publish_handshake is %s. Building generation %s alongside %s" \
+                  % (resource_handshake, publish_handshake, generation, self.sink_dir)
+
+    def switch_generation(self):
+        """
+        Publish the generation in publish_root: point the entries of sink_dir to the entries of the generation and
+        sign the handshake of the generation. Each entry is replaced atomically by renaming a symlink over it.
+        Entries that are not in the generation are removed, other generations are removed in the background.
+        """
+        generation = os.path.relpath(self.publish_root, self.sink_dir)
+        names = set(os.listdir(self.publish_root))
+        trash_dir = os.path.join(self.sink_dir, DIR_GENERATIONS)
+        link_tmp = os.path.join(trash_dir, "vql_link.tmp")
+        for name in sorted(names):
+            path = os.path.join(self.sink_dir, name)
+            target = os.path.join(generation, name)
+            if os.path.islink(path) and os.readlink(path) == target:
+                continue
+            if os.path.lexists(link_tmp):
+                os.remove(link_tmp)
+            os.symlink(target, link_tmp)
+            if os.path.isdir(path) and not os.path.islink(path):
+                # a directory cannot be replaced by a symlink in one rename
+                os.rename(path, os.path.join(tempfile.mkdtemp(dir=trash_dir), name))
+            os.rename(link_tmp, path)
+
+        for name in self.list_published():
+            if name not in names:
+                path = os.path.join(self.sink_dir, name)
+                if os.path.islink(path) or os.path.isfile(path):
+                    os.remove(path)
+                else:
+                    os.rename(path, os.path.join(tempfile.mkdtemp(dir=trash_dir), name))
+
+        publish_handshake = None
+        path_publish_handshake = os.path.join(self.sink_dir, FILE_HANDSHAKE)
+        if os.path.isfile(path_publish_handshake):
+            with open(path_publish_handshake, "r") as r_file:
+                publish_handshake = r_file.read()
+        if publish_handshake != self.handshake:
+            with open(path_publish_handshake + ".tmp", "w") as w_file:
+                w_file.write(self.handshake)
+            os.rename(path_publish_handshake + ".tmp", path_publish_handshake)
+            print "Signed new handshake: %s" % self.handshake
+
+        self.collect_generations()
+
+    def collect_generations(self):
+        """
+        Remove generations other than the one in publish_root in a background thread. The thread is not a daemon,
+        a process that ends waits for it.
+        """
+        if self.collector is not None and self.collector.is_alive():
+            return
+        generations_dir = os.path.join(self.sink_dir, DIR_GENERATIONS)
+        current = os.path.basename(self.publish_root)
+        stale = [os.path.join(generations_dir, name) for name in os.listdir(generations_dir) if name != current]
+        if stale:
+            print "Removing %d old generation(s) in the background" % len(stale)
+            self.collector = threading.Thread(target=remove_trees, args=(stale,))
+            self.collector.start()
+
+    def list_published(self):
+        """
+        :return: names of entries in sink_dir that are published from a generation directory.
+        """
+        return [name for name in os.listdir(self.sink_dir)
+                if name not in (FILE_HANDSHAKE, DIR_GENERATIONS) and self.is_our_file(name)]
+
     def walk_publish_dir(self, remove_our_files=False):
         """
         Count items in sink_dir that are created by resourcesync-generator
@@ -242,7 +524,7 @@ class SyncDirector(object):
                 our_things += 1
                 if remove_our_files:
                     file_path = os.path.join(self.sink_dir, a_file)
-                    if os.path.isfile(file_path):
+                    if os.path.islink(file_path) or os.path.isfile(file_path):
                         os.remove(file_path)
                     elif os.path.isdir(file_path):
                         shutil.rmtree(file_path)
@@ -254,6 +536,7 @@ class SyncDirector(object):
                                   FILE_SYNCED_FILES,
                                   PATTERN_RDF_OUT,
                                   RS_RESOURCE_DUMP_XML,
+                                  RS_RESOURCE_DUMP_PART,
                                   RS_CAPABILITY_LIST_XML,
                                   PREFIX_MANIFEST,
                                   PREFIX_COMPLETED_PART,
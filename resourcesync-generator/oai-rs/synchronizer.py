@@ -5,16 +5,21 @@ import re, os
 from abc import ABCMeta, abstractmethod
 from glob import glob
 from resync.utils import compute_md5_for_file
-from resync.resource import Resource
-from resync.resource_list import ResourceList
+from resourceindex import ResourceIndex
+from patchfiles import PatchFileList
+from metrics import Metrics
+from storage import LocalStorage
 
 
 RS_WELL_KNOWN = ".well-known"
 RS_RESOURCESYNC = "resourcesync"
 RS_CAPABILITY_LIST_XML = "capability-list.xml"
 RS_RESOURCE_DUMP_XML = "resource-dump.xml"
+RS_RESOURCE_DUMP_PART = "resource-dump-"
 
 PATTERN_RDF_OUT = "rdf_out_"
+# The sham rdf patch file that enables processing of the last real rdf patch file.
+SHAM_RDF_OUT_FILE = PATTERN_RDF_OUT + "99999999999999-99999999999999"
 
 PREFIX_COMPLETED_PART = "part_def_"
 PREFIX_END_PART = "part_end_"
@@ -68,6 +73,22 @@ class Synchronizer:
 
         self.dump_timestamp = None
 
+        # Number of rdf patch files in resource_dir found by the last listing, see patch_files.
+        self.count_listed = 0
+
+        self.resource_index = ResourceIndex(self.resource_dir)
+
+        # Subclasses that compute md5 and timestamp of resources while packaging them set this to True, so that
+        # add_patch_files does not read resources that are not yet indexed.
+        self.hash_on_write = False
+
+        # Where publish_dir is served from, see storage.py.
+        self.storage = LocalStorage()
+
+        # Durations and counters of publishing, labelled with the name of publish_dir.
+        self.metrics = Metrics()
+        self.graph = os.path.basename(os.path.normpath(self.publish_dir))
+
 
     @staticmethod
     def compute_timestamp(raw_ts):
@@ -89,13 +110,12 @@ class Synchronizer:
     @staticmethod
     def is_same(rl_1, rl_2):
         """
-        Compare (uri's of resources of) two resourcelists for equality.
-        :param rl_1: a Resourcelist
-        :param rl_2: a Resourcelist
+        Compare (uri's and md5 of resources of) two PatchFileLists for equality.
+        :param rl_1: a PatchFileList
+        :param rl_2: a PatchFileList
         :return: True if rl_1 resources are equal to rl_2 resources, False otherwise
         """
-        same, updated, deleted, created = rl_1.compare(rl_2)
-        return len(same) == len(rl_1) == len(rl_2)
+        return rl_1.is_same(rl_2)
 
     @staticmethod
     def last_modified(resourcelist):
@@ -122,12 +142,8 @@ class Synchronizer:
         filename = os.path.basename(path)
 
         if filename.startswith(PATTERN_RDF_OUT):
-            t = None
             with open(path) as search:
-                for line in search:
-                    if re.match("# at checkpoint.*", line):
-                        t = re.findall('\d+', line)[0]
-                        break
+                t = self.find_checkpoint(search)
 
             if t is None:
                 raise RuntimeError("Did not find timestamp in '%s'" % path)
@@ -139,15 +155,55 @@ class Synchronizer:
 
         return timestamp
 
-    def list_resources_chunk(self):
+    @staticmethod
+    def find_checkpoint(lines):
+        """
+        Find the raw timestamp in the first line starting with '# at checkpoint'.
+        :param lines: iterable of lines
+        :return: the raw timestamp or None if not found
+        """
+        for line in lines:
+            if re.match("# at checkpoint.*", line):
+                return re.findall('\d+', line)[0]
+        return None
+
+    def list_resources_chunks(self):
+        """
+        Iterate over the rdf-files in resource_dir in lists of the files for one package: at most
+        max_files_compressed files, less if fill_package says fewer files fill a package, and the last one possibly
+        with less. resource_dir is listed and sorted once, so listing a backlog of files costs time in proportion to
+        the number of files, and only one list is kept in memory at a time. Lists are PatchFileLists, that create
+        resync.Resources only when iterated. Booleans indicate whether the list fills a package and whether it is the
+        last one. If resource_dir has no rdf-files to publish, a single empty list is generated.
+        :return: generator of (PatchFileList, complete, exhausted)
+        """
+        rdf_out_files = self.patch_files()
+        start = 0
+        carry = []  # files listed that did not fit in the previous package
+        while True:
+            resourcelist = PatchFileList(self.publish_url, self.resource_dir)
+            resourcelist.files = carry
+            chunk = rdf_out_files[start:start + self.max_files_compressed - len(carry)]
+            self.add_patch_files(resourcelist, chunk)
+            start += len(chunk)
+            count = self.fill_package(resourcelist)
+            carry = resourcelist.files[count:] if count is not None else []
+            del resourcelist.files[len(resourcelist) - len(carry):]
+            exhausted = start >= len(rdf_out_files) and not carry
+            yield resourcelist, count is not None, exhausted
+            if exhausted:
+                return
+
+    def fill_package(self, patch_files):
         """
-        Fill a resource list up to max_files_compressed or with as much rdf-files as there are left in resource_dir.
-        A boolean indicates whether the resource_dir was exhausted.
-        :return: the ResourceList, exhausted
+        Decide whether files fill a package. Here a package is full with max_files_compressed files.
+        :param patch_files: PatchFileList of the next files to package, at most max_files_compressed
+        :return: the number of files at the start of patch_files that fill a package,
+                    or None if patch_files do not fill a package
         """
-        resourcelist = ResourceList()
-        exhausted = self.list_patch_files(resourcelist, max_files=self.max_files_compressed)
-        return resourcelist, exhausted
+        if len(patch_files) >= self.max_files_compressed:
+            return self.max_files_compressed
+        return None
 
     def list_patch_files(self, resourcelist, max_files=-1):
         """
@@ -158,23 +214,56 @@ class Synchronizer:
         :param max_files: the maximum number of resources to append to the list
         :return: True if the list includes the one but last rdf_out_* file in resource_dir, False otherwise
         """
+        rdf_out_files = self.patch_files()
+        if max_files > 0:
+            selected = rdf_out_files[:max_files]
+        else:
+            selected = rdf_out_files
+        patch_files = PatchFileList(self.publish_url, self.resource_dir)
+        self.add_patch_files(patch_files, selected)
+        for resource in patch_files:
+            resourcelist.add(resource)
+        return len(selected) == len(rdf_out_files)
+
+    def patch_files(self):
+        """
+        List the files with the name pattern 'rdf_out_*' in resource_dir, except for the last one in alphabetical
+        sort order, and remove files that are no longer in resource_dir from the resource index. The number of rdf
+        patch files found, including the last one and excluding the sham file, is kept in count_listed.
+        :return: the sorted paths of the files
+        """
         rdf_out_files = sorted(glob(os.path.join(self.resource_dir, PATTERN_RDF_OUT + "*")))
+        self.count_listed = len([file for file in rdf_out_files if os.path.basename(file) != SHAM_RDF_OUT_FILE])
+        self.resource_index.retain([os.path.basename(file) for file in rdf_out_files])
         if len(rdf_out_files) > 0:
             rdf_out_files.pop()  # remove last from list
-        n = 0
+        return rdf_out_files
+
+    def add_patch_files(self, patch_files, rdf_out_files):
+        """
+        Append rdf_out_files to a PatchFileList.
+        Timestamp and md5 of resources are taken from the resource index if the resource did not change since it was
+        indexed, otherwise they are computed and indexed. If hash_on_write is set, timestamp and md5 of resources
+        that are not indexed are left None.
+        :param patch_files: the PatchFileList to append to
+        :param rdf_out_files: paths of the files in resource_dir
+        """
         for file in rdf_out_files:
             filename = os.path.basename(file)
-            timestamp = self.extract_timestamp(file)
-            length = os.stat(file).st_size
-            md5 = compute_md5_for_file(file)
-            resourcelist.add(
-                Resource(self.publish_url + filename, md5=md5, length=length, lastmod=timestamp, path=file))
-            n += 1
-            if 0 < max_files == n:
-                break
-
-        exhausted = len(rdf_out_files) == n
-        return exhausted
+            stat = os.stat(file)
+            length = stat.st_size
+            indexed = self.resource_index.get(filename, length, stat.st_mtime)
+            if indexed:
+                timestamp, md5 = indexed
+            elif self.hash_on_write:
+                timestamp, md5 = None, None
+            else:
+                timestamp = self.extract_timestamp(file)
+                md5 = compute_md5_for_file(file)
+                self.resource_index.put(filename, length, stat.st_mtime, timestamp, md5)
+            patch_files.add(filename, length=length, lastmod=timestamp, md5=md5)
+
+        self.resource_index.commit()
 
     @abstractmethod
     def publish(self):
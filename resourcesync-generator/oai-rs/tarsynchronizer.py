@@ -0,0 +1,188 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import hashlib, base64, os, tarfile, time
+from StringIO import StringIO
+from zipsynchronizer import ZipSynchronizer
+from zipwriter import HashingFile
+
+# Strategy to publish rdf patch files as resource dumps in xz- or zstd-compressed tar format.
+# Compression codecs are optional dependencies.
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_XZ = "xz"
+COMPRESSION_ZSTD = "zstd"
+
+EXTENSIONS = {COMPRESSION_XZ: ".tar.xz", COMPRESSION_ZSTD: ".tar.zst"}
+
+
+def compressor(compression, level=None):
+    """
+    Create a compressor object with compress(data) and flush() methods.
+    :param compression: 'xz' or 'zstd'
+    :param level: the compression level: 0-9 for 'xz', 1-22 for 'zstd'. Default: None, the default level
+    :return: a compressor object
+    :raises RuntimeError: if the compression is not supported or its module is not installed
+    """
+    if compression == COMPRESSION_XZ:
+        if lzma is None:
+            raise RuntimeError("Compression %s needs the lzma module. Install backports.lzma." % compression)
+        if level is None:
+            return lzma.LZMACompressor()
+        return lzma.LZMACompressor(preset=level)
+    elif compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Compression %s needs the zstandard module. Install zstandard." % compression)
+        if level is None:
+            return zstandard.ZstdCompressor().compressobj()
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    raise RuntimeError("Unsupported compression: %s" % compression)
+
+
+class CompressingFile(object):
+    """
+    A file opened for writing that compresses the bytes written to it. The md5 of the compressed file is computed
+    while it is written.
+    """
+
+    def __init__(self, path, compressor):
+        self.output = HashingFile(path)
+        self.compressor = compressor
+
+    def write(self, data):
+        self.output.write(self.compressor.compress(data))
+
+    def close(self):
+        self.output.write(self.compressor.flush())
+        self.output.close()
+
+    def md5(self):
+        return self.output.digest()
+
+
+class HashingReader(object):
+    """
+    A file opened for reading that computes the md5 of the bytes read from it and keeps the first block read.
+    """
+
+    def __init__(self, path):
+        self.fp = open(path, "rb")
+        self.md5 = hashlib.md5()
+        self.head = None
+
+    def read(self, size=-1):
+        buf = self.fp.read(size)
+        if self.head is None:
+            self.head = buf
+        self.md5.update(buf)
+        return buf
+
+    def close(self):
+        self.fp.close()
+
+    def digest(self):
+        return base64.b64encode(self.md5.digest())
+
+
+class TarSynchronizer(ZipSynchronizer):
+    """
+    Takes care of presenting resources in accordance with the Resource Sync Framework as xz- or zstd-compressed
+    tar files. Compression of the whole tar file instead of each resource separately profits from the
+    repetition of graph iri's, subjects and predicates across resources.
+
+    Entries of the previous end package are not copied: the new end package is always written from scratch,
+    whatever the value of incremental.
+    """
+
+    MIME_TYPE = "application/x-tar"
+
+    def __init__(self, resource_dir, publish_dir, publish_url,
+                 src_desc_url=None,
+                 max_files_compressed=50000,
+                 write_separate_manifest=True,
+                 move_resources=False,
+                 incremental=False,
+                 max_dump_entries=50000,
+                 max_dump_size=50 * 1024 * 1024,
+                 compression=COMPRESSION_XZ,
+                 compression_level=None,
+                 deduplicate=False,
+                 storage=None,
+                 max_package_size=None,
+                 max_compressed_size=None,
+                 max_package_age=None):
+        """
+        Initialize a new TarSynchronizer.
+        :param compression: the compression of packages, 'xz' or 'zstd'
+        :param compression_level: the compression level, 0-9 for 'xz', 1-22 for 'zstd'. Default: None, the default
+                level
+        See ZipSynchronizer for the other parameters.
+        :return:
+        """
+        ZipSynchronizer.__init__(self, resource_dir, publish_dir, publish_url, src_desc_url, max_files_compressed,
+                                 write_separate_manifest, move_resources, incremental, max_dump_entries, max_dump_size,
+                                 compression, compression_level, deduplicate, storage, max_package_size,
+                                 max_compressed_size, max_package_age)
+
+    def verify_compression(self):
+        """
+        Verify the compression and compression level of this synchronizer and set the package extension.
+        :raises RuntimeError: if the compression is not supported or its module is not installed
+        """
+        compressor(self.compression, self.compression_level)
+        self.EXTENSION = EXTENSIONS[self.compression]
+
+    def write_zip(self, resourcelist, zip_path, zip_old=None, rl_old=None):
+        """
+        Write local resources in resourcelist to a compressed tar file, followed by a manifest.xml. Each resource is
+        read only once: its md5 and lastmod are computed while it is packaged, and set on the resource if missing.
+        --  This method has the side effect of changing local paths in resourcelist into paths relative in tar.
+        :param resourcelist: resources to package
+        :param zip_path: path to the tar file to write
+        :param zip_old: not used
+        :param rl_old: not used
+        :return: the md5 of the tar file
+        """
+        out = CompressingFile(zip_path, compressor(self.compression, self.compression_level))
+        package_url = self.publish_url + os.path.basename(zip_path)
+        self.package_content = {}
+        self.package_lengths = set()
+        try:
+            tar = tarfile.open(fileobj=out, mode="w|", format=tarfile.PAX_FORMAT)
+            for resource in resourcelist:
+                path = resource.path
+                resource.path = os.path.relpath(path, self.resource_dir)
+                if self.refer_duplicate(resource, path, package_url):
+                    continue
+                tarinfo = tar.gettarinfo(path, resource.path)
+                reader = HashingReader(path)
+                try:
+                    tar.addfile(tarinfo, reader)
+                finally:
+                    reader.close()
+                self.index_written_resource(resource, path, reader.digest(), reader.head or "")
+                self.add_package_content(resource)
+
+            # The manifest is written last, when md5 of all resources is known.
+            manifest = self.manifest(resourcelist).as_xml()
+            tarinfo = tarfile.TarInfo("manifest.xml")
+            tarinfo.size = len(manifest)
+            tarinfo.mtime = time.time()
+            tar.addfile(tarinfo, StringIO(manifest))
+            tar.close()
+        finally:
+            out.close()
+
+        return out.md5()
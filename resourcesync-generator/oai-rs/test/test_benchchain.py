@@ -0,0 +1,37 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, shutil, tempfile, unittest
+from benchchain import benchmark, compare, generate, STAGES
+
+
+class TestBenchChain(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_generate(self):
+        source_dir = os.path.join(self.work_dir, "source")
+        files, size = generate(source_dir, 2, 3, 4)
+        self.assertEqual(6, files)
+        patch_files = sorted(name for name in os.listdir(source_dir) if name.startswith("rdf_out_2016"))
+        self.assertEqual(6, len(patch_files))
+        self.assertEqual(size, sum(os.stat(os.path.join(source_dir, name)).st_size for name in patch_files))
+        with open(os.path.join(source_dir, patch_files[1]), "r") as patch_file:
+            lines = patch_file.readlines()
+        self.assertEqual(6, len(lines))
+        self.assertEqual("# graph          http://example.com/graph/1\n", lines[1])
+
+    def test_benchmark(self):
+        result = benchmark(self.work_dir, 2, 3, 4)
+        self.assertEqual(6, result["files"])
+        self.assertEqual(set(STAGES), set(result["stages"].keys()))
+        self.assertEqual([], compare(result, result))
+
+        baseline = {"stages": dict((stage, {"files_per_sec": values["files_per_sec"] * 2})
+                                   for stage, values in result["stages"].items()),
+                    "peak_rss_kb": result["peak_rss_kb"]}
+        self.assertEqual(len(STAGES), len(compare(result, baseline)))
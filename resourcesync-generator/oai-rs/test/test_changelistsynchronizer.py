@@ -0,0 +1,93 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, shutil, tempfile, unittest
+from changelistsynchronizer import ChangeListSynchronizer, RS_CHANGE_LIST_XML
+from synchronizer import RS_CAPABILITY_LIST_XML, RS_RESOURCE_DUMP_XML
+from resync.change_list import ChangeList
+from resync.sitemap import Sitemap
+from urlset import Urlset
+
+SAMPLE_FILES = ["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+                "rdf_out_00000000000000-00000000000003", "rdf_out_99999999999999-99999999999999", "started_at.txt"]
+
+
+class TestChangeListSynchronizer(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__name__))), "sample")
+        self.resource_dir = os.path.join(self.work_dir, "source")
+        os.makedirs(self.resource_dir)
+        self.publish_dir = os.path.join(self.work_dir, "aHR0cDovL2V4YW1wbGUuY29tCg==")
+        self.publish_url = "http://example.com/"
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def add_files(self, files):
+        for filename in files:
+            shutil.copy(os.path.join(self.sample_dir, filename), self.resource_dir)
+
+    def read_change_list(self):
+        change_list = ChangeList()
+        with open(os.path.join(self.publish_dir, RS_CHANGE_LIST_XML), "r") as change_list_file:
+            Sitemap().parse_xml(change_list_file, resources=change_list)
+        return change_list
+
+    def publish(self):
+        ChangeListSynchronizer(self.resource_dir, self.publish_dir, self.publish_url, max_files_compressed=2).publish()
+
+    def test_publish_changes(self):
+        self.add_files(SAMPLE_FILES[:2] + SAMPLE_FILES[4:])
+        self.publish()
+
+        # only the one but last file is listed and published
+        change_list = self.read_change_list()
+        self.assertEqual([self.publish_url + SAMPLE_FILES[0]], [resource.uri for resource in change_list])
+        resource = list(change_list)[0]
+        self.assertEqual("created", resource.change)
+        self.assertIsNotNone(resource.md5)
+        self.assertEqual(resource.lastmod, change_list.md_from)
+        self.assertTrue(os.path.isfile(os.path.join(self.publish_dir, SAMPLE_FILES[0])))
+
+        capabilities = set(Urlset(os.path.join(self.publish_dir, RS_CAPABILITY_LIST_XML)).locs())
+        self.assertEqual({self.publish_url + RS_RESOURCE_DUMP_XML, self.publish_url + RS_CHANGE_LIST_XML},
+                         capabilities)
+
+        # a run without new files leaves the change list as is
+        os.utime(os.path.join(self.publish_dir, RS_CHANGE_LIST_XML), (1000, 1000))
+        self.publish()
+        self.assertEqual(1000, os.stat(os.path.join(self.publish_dir, RS_CHANGE_LIST_XML)).st_mtime)
+
+    def test_remove_packaged_changes(self):
+        self.add_files(SAMPLE_FILES[:2])
+        self.publish()
+        self.assertEqual(1, len(self.read_change_list()))
+
+        # the first two files go into a completed package and leave the change list
+        self.add_files(SAMPLE_FILES[2:4])
+        self.publish()
+        change_list = self.read_change_list()
+        self.assertEqual([self.publish_url + SAMPLE_FILES[2]], [resource.uri for resource in change_list])
+        self.assertFalse(os.path.exists(os.path.join(self.publish_dir, SAMPLE_FILES[0])))
+        self.assertFalse(os.path.exists(os.path.join(self.publish_dir, SAMPLE_FILES[1])))
+        self.assertTrue(os.path.isfile(os.path.join(self.publish_dir, SAMPLE_FILES[2])))
+
+    def test_publish_appended_change(self):
+        self.add_files(SAMPLE_FILES[:2])
+        self.publish()
+        md5 = list(self.read_change_list())[0].md5
+
+        # the graph-splitter appends to a file by writing a new file and renaming it
+        path = os.path.join(self.resource_dir, SAMPLE_FILES[0])
+        with open(path, "r") as patch_file:
+            content = patch_file.read()
+        with open(path + ".tmp", "w") as patch_file:
+            patch_file.write(content + content)
+        os.rename(path + ".tmp", path)
+        self.publish()
+
+        self.assertNotEqual(md5, list(self.read_change_list())[0].md5)
+        with open(os.path.join(self.publish_dir, SAMPLE_FILES[0]), "r") as published_file:
+            self.assertEqual(content + content, published_file.read())
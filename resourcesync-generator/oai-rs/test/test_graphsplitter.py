@@ -0,0 +1,135 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64, os, shutil, unittest
+from graphsplitter import GraphSplitter, FILE_FILED_NQUADS, FILE_FILED_PARTS
+from syncdirector import FILE_HANDSHAKE, FILE_INDEX, FILE_FILED_FILES
+from watcher import SHAM_RDF_OUT_FILE, PollingWatcher
+from resourceindex import ResourceIndex
+
+GRAPHS = ["http://localhost:8890/one", "http://localhost:8890/two"]
+
+
+class TestGraphSplitter(unittest.TestCase):
+
+    def setUp(self):
+        self.source_dir = os.path.expanduser("~/tmp/splitter_test/source")
+        self.sink_dir = os.path.expanduser("~/tmp/splitter_test/sink")
+        for directory in (self.source_dir, self.sink_dir):
+            shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(self.source_dir)
+        with open(os.path.join(self.source_dir, FILE_HANDSHAKE), "w") as hs_file:
+            hs_file.write("20160805110708")
+
+    def write_patch(self, filename, graph, nquads):
+        with open(os.path.join(self.source_dir, filename), "w") as patch_file:
+            patch_file.write("# at checkpoint  20160712144328\n")
+            patch_file.write("# graph          %s\n" % graph)
+            for i in range(nquads):
+                patch_file.write("+ <http://one.com/%d> <http://two.com/one> \"%d\" <%s> .\n" % (i, i, graph))
+
+    def test_split(self):
+        self.write_patch("rdf_out_20160712144328-00000000000001", GRAPHS[0], 3)
+        self.write_patch("rdf_out_20160712144328-00000000000002", GRAPHS[1], 2)
+        self.write_patch("rdf_out_20160712144328-00000000000003", GRAPHS[0], 1)
+        open(os.path.join(self.source_dir, SHAM_RDF_OUT_FILE), "w").close()
+
+        dirnames = GraphSplitter(self.source_dir, self.sink_dir).split()
+
+        expected = [base64.urlsafe_b64encode(graph + "\n") for graph in GRAPHS]
+        self.assertEqual(set(expected), dirnames)
+        self.assertEqual(["rdf_out_20160712144328-00000000000001", "rdf_out_20160712144328-00000000000003",
+                          SHAM_RDF_OUT_FILE], sorted(os.listdir(os.path.join(self.sink_dir, expected[0]))))
+        self.assertEqual([SHAM_RDF_OUT_FILE], [name for name in os.listdir(self.source_dir)
+                                               if name.startswith("rdf_out_")])
+        with open(os.path.join(self.sink_dir, FILE_INDEX), "r") as index_file:
+            self.assertEqual(["%s,%s\n" % pair for pair in zip(GRAPHS, expected)], index_file.readlines())
+        with open(os.path.join(self.sink_dir, FILE_FILED_NQUADS), "r") as count_file:
+            self.assertEqual("6", count_file.read())
+        with open(os.path.join(self.sink_dir, FILE_FILED_FILES), "r") as count_file:
+            self.assertEqual("3", count_file.read())
+
+        # a second run with a new file for a known graph accumulates the counts
+        self.write_patch("rdf_out_20160712144328-00000000000004", GRAPHS[1], 4)
+        self.assertEqual({expected[1]}, GraphSplitter(self.source_dir, self.sink_dir).split())
+        with open(os.path.join(self.sink_dir, FILE_FILED_NQUADS), "r") as count_file:
+            self.assertEqual("10", count_file.read())
+        with open(os.path.join(self.sink_dir, FILE_INDEX), "r") as index_file:
+            self.assertEqual(2, len(index_file.readlines()))
+
+    def test_untouched_graph_not_reported(self):
+        self.write_patch("rdf_out_20160712144328-00000000000001", GRAPHS[0], 1)
+        self.write_patch("rdf_out_20160712144328-00000000000002", GRAPHS[1], 1)
+        open(os.path.join(self.source_dir, SHAM_RDF_OUT_FILE), "w").close()
+        GraphSplitter(self.source_dir, self.sink_dir).split()
+        one, two = [base64.urlsafe_b64encode(graph + "\n") for graph in GRAPHS]
+        sham_one = os.path.join(self.sink_dir, one, SHAM_RDF_OUT_FILE)
+        for dirname in (one, two):
+            os.utime(os.path.join(self.sink_dir, dirname, SHAM_RDF_OUT_FILE), (1000, 1000))
+        watcher = PollingWatcher(self.sink_dir)
+
+        # only the directory of graph two receives a file; the sham file of graph one is left as is
+        self.write_patch("rdf_out_20160712144328-00000000000003", GRAPHS[1], 1)
+        self.assertEqual({two}, GraphSplitter(self.source_dir, self.sink_dir).split())
+        self.assertEqual(1000, os.stat(sham_one).st_mtime)
+        self.assertEqual({two}, watcher.wait(0))
+
+    def test_no_source_handshake(self):
+        os.remove(os.path.join(self.source_dir, FILE_HANDSHAKE))
+        self.assertIsNone(GraphSplitter(self.source_dir, self.sink_dir).split())
+
+    def test_split_coalesce(self):
+        for i in range(1, 6):
+            self.write_patch("rdf_out_20160712144328-%014d" % i, GRAPHS[i % 2], 2)
+        open(os.path.join(self.source_dir, SHAM_RDF_OUT_FILE), "w").close()
+
+        GraphSplitter(self.source_dir, self.sink_dir, max_quads_per_file=4).split()
+
+        # graph one: files 2 and 4 in one file; graph two: files 1 and 3 in one file, file 5 in another one.
+        one_dir = os.path.join(self.sink_dir, base64.urlsafe_b64encode(GRAPHS[0] + "\n"))
+        two_dir = os.path.join(self.sink_dir, base64.urlsafe_b64encode(GRAPHS[1] + "\n"))
+        self.assertEqual(["rdf_out_20160712144328-00000000000002", SHAM_RDF_OUT_FILE], sorted(os.listdir(one_dir)))
+        self.assertEqual(["rdf_out_20160712144328-00000000000001", "rdf_out_20160712144328-00000000000005",
+                          SHAM_RDF_OUT_FILE], sorted(os.listdir(two_dir)))
+        with open(os.path.join(two_dir, "rdf_out_20160712144328-00000000000001"), "r") as patch_file:
+            lines = patch_file.readlines()
+        self.assertEqual(8, len(lines))
+        self.assertTrue(lines[0].startswith("# at checkpoint"))
+        self.assertTrue(lines[4].startswith("# at checkpoint"))
+        with open(os.path.join(self.sink_dir, FILE_FILED_NQUADS), "r") as count_file:
+            self.assertEqual("10", count_file.read())
+        # the resourcesync-generator accounts for 3 files, the quad-logger for 5
+        with open(os.path.join(self.sink_dir, FILE_FILED_FILES), "r") as count_file:
+            self.assertEqual("3", count_file.read())
+        with open(os.path.join(self.sink_dir, FILE_FILED_PARTS), "r") as count_file:
+            self.assertEqual("5", count_file.read())
+
+    def test_split_coalesce_with_earlier_run(self):
+        self.write_patch("rdf_out_20160712144328-00000000000001", GRAPHS[0], 2)
+        self.write_patch("rdf_out_20160712144328-00000000000002", GRAPHS[1], 2)
+        open(os.path.join(self.source_dir, SHAM_RDF_OUT_FILE), "w").close()
+        GraphSplitter(self.source_dir, self.sink_dir, max_quads_per_file=4).split()
+        one_dir = os.path.join(self.sink_dir, base64.urlsafe_b64encode(GRAPHS[0] + "\n"))
+        first = os.path.join(one_dir, "rdf_out_20160712144328-00000000000001")
+        index = ResourceIndex(one_dir)
+        index.put("rdf_out_20160712144328-00000000000001", 1, 1.0, "2016-07-12T14:43:28Z", "md5")
+        index.close()
+
+        # file 3 is appended to file 1 of the earlier run, file 4 does not fit and starts a new file.
+        self.write_patch("rdf_out_20160712144328-00000000000003", GRAPHS[0], 1)
+        self.write_patch("rdf_out_20160712144328-00000000000004", GRAPHS[0], 2)
+        dirnames = GraphSplitter(self.source_dir, self.sink_dir, max_quads_per_file=4).split()
+
+        self.assertEqual({os.path.basename(one_dir)}, dirnames)
+        self.assertEqual(["rdf_out_20160712144328-00000000000001", "rdf_out_20160712144328-00000000000004",
+                          SHAM_RDF_OUT_FILE], sorted(name for name in os.listdir(one_dir)
+                                                     if name.startswith("rdf_out_")))
+        with open(first, "r") as patch_file:
+            lines = patch_file.readlines()
+        self.assertEqual(7, len(lines))
+        self.assertTrue(lines[4].startswith("# at checkpoint"))
+        self.assertEqual([], ResourceIndex(one_dir).filenames())
+        with open(os.path.join(self.sink_dir, FILE_FILED_FILES), "r") as count_file:
+            self.assertEqual("3", count_file.read())
+        with open(os.path.join(self.sink_dir, FILE_FILED_PARTS), "r") as count_file:
+            self.assertEqual("4", count_file.read())
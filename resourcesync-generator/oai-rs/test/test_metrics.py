@@ -0,0 +1,65 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, shutil, tempfile, unittest
+from metrics import Metrics
+from zipsynchronizer import ZipSynchronizer
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_add_and_merge(self):
+        metrics = Metrics(service="test")
+        metrics.add("vql_zips_created", 1, graph="a")
+        metrics.add("vql_zips_created", 2, graph="a")
+        with metrics.timer("list", graph="a"):
+            pass
+        other = Metrics()
+        other.add("vql_zips_created", 4, graph="a")
+        other.add("vql_zips_created", 1, graph="b")
+        metrics.merge(other)
+
+        self.assertEqual(7, metrics.get("vql_zips_created", graph="a"))
+        self.assertEqual(1, metrics.get("vql_zips_created", graph="b"))
+        self.assertTrue(metrics.get("vql_phase_seconds", phase="list", graph="a") >= 0)
+        self.assertIsNone(metrics.get("vql_phase_seconds", phase="create_zip", graph="a"))
+
+    def test_write(self):
+        metrics = Metrics(service="test")
+        metrics.add("vql_bytes_written", 10, graph="a")
+        metrics.finish()
+        metrics.write(self.work_dir, "test")
+        metrics.write(self.work_dir, "test")
+
+        with open(os.path.join(self.work_dir, "test.prom"), "r") as prom_file:
+            lines = prom_file.read().splitlines()
+        self.assertIn("# TYPE vql_bytes_written gauge", lines)
+        self.assertIn('vql_bytes_written{service="test",graph="a"} 10.0', lines)
+        self.assertFalse(os.path.exists(os.path.join(self.work_dir, "test.prom.tmp")))
+
+        with open(os.path.join(self.work_dir, "test.json"), "r") as log_file:
+            runs = [json.loads(line) for line in log_file]
+        self.assertEqual(2, len(runs))
+        self.assertEqual({"service": "test"}, runs[0]["labels"])
+        self.assertIn({"name": "vql_bytes_written", "labels": {"graph": "a"}, "value": 10}, runs[0]["metrics"])
+
+    def test_pending_files(self):
+        sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__name__))), "sample")
+        resource_dir = os.path.join(self.work_dir, "source")
+        os.makedirs(resource_dir)
+        for filename in ["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+                         "rdf_out_00000000000000-00000000000003", "rdf_out_99999999999999-99999999999999",
+                         "started_at.txt"]:
+            shutil.copy(os.path.join(sample_dir, filename), resource_dir)
+        syncer = ZipSynchronizer(resource_dir, os.path.join(self.work_dir, "dump"), "http://example.com/",
+                                 max_files_compressed=2)
+        syncer.publish()
+
+        # files 1 and 2 are in a completed package, file 3 is pending; the sham file does not count.
+        self.assertEqual(1, syncer.metrics.get("vql_pending_files", graph="dump"))
@@ -0,0 +1,57 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, shutil, tempfile, unittest
+from patchfiles import PatchFileList
+from zipsynchronizer import ZipSynchronizer
+
+SAMPLE_FILES = ["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+                "rdf_out_00000000000000-00000000000003", "started_at.txt"]
+
+
+class TestPatchFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_read_and_compare(self):
+        patch_files = PatchFileList("http://example.com/g/", self.work_dir)
+        patch_files.add("rdf_out_1", length=10, lastmod="2016-06-13T08:23:41Z", md5="1B2M2Y8AsgTpgAmY7PhCfg==")
+        patch_files.add("rdf_out_2&3", length=12, lastmod="2016-06-13T08:23:42Z", md5="XUFAKrxLKna5cZ2REBfFkg==")
+        path = os.path.join(self.work_dir, "list.xml")
+        with open(path, "w") as list_file:
+            list_file.write(patch_files.resource_list().as_xml())
+
+        read = PatchFileList.read(path)
+        self.assertEqual("http://example.com/g/", read.url_prefix)
+        self.assertTrue(read.is_same(patch_files))
+        resources = list(read)
+        self.assertEqual("http://example.com/g/rdf_out_2&3", resources[1].uri)
+        self.assertEqual("2016-06-13T08:23:41Z", resources[0].lastmod)
+        self.assertEqual("1B2M2Y8AsgTpgAmY7PhCfg==", resources[0].md5)
+        self.assertEqual(12, resources[1].length)
+        self.assertEqual(os.path.join(self.work_dir, "rdf_out_1"), list(patch_files)[0].path)
+
+        other = PatchFileList("http://example.com/g/")
+        other.add("rdf_out_1", md5="1B2M2Y8AsgTpgAmY7PhCfg==")
+        other.add("rdf_out_2&3")
+        self.assertFalse(read.is_same(other))
+        other.files[1].digest = read.files[1].digest
+        self.assertTrue(read.is_same(other))
+        other.url_prefix = "http://example.com/h/"
+        self.assertFalse(read.is_same(other))
+        self.assertTrue(PatchFileList(None).is_same(PatchFileList("http://example.com/g/")))
+
+    def test_publish_unchanged(self):
+        sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__name__))), "sample")
+        resource_dir = os.path.join(self.work_dir, "source")
+        os.makedirs(resource_dir)
+        for filename in SAMPLE_FILES:
+            shutil.copy(os.path.join(sample_dir, filename), resource_dir)
+        publish_dir = os.path.join(self.work_dir, "dump")
+
+        self.assertTrue(ZipSynchronizer(resource_dir, publish_dir, "http://example.com/").publish()[0])
+        self.assertFalse(ZipSynchronizer(resource_dir, publish_dir, "http://example.com/").publish()[0])
@@ -0,0 +1,67 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, shutil, unittest
+from resourceindex import ResourceIndex, FILE_RESOURCE_INDEX
+from zipsynchronizer import ZipSynchronizer
+from glob import glob
+
+
+class TestResourceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.resource_dir = os.path.expanduser("~/tmp/index_test/resources")
+        shutil.rmtree(self.resource_dir, ignore_errors=True)
+        os.makedirs(self.resource_dir)
+
+    def copy_samples(self):
+        src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__name__))), "sample")
+        for path in glob(os.path.join(src_dir, "rdf_out_*")):
+            shutil.copy(path, self.resource_dir)
+
+    def test_get_put(self):
+        index = ResourceIndex(self.resource_dir)
+        self.assertIsNone(index.get("rdf_out_1", 10, 1.5))
+
+        index.put("rdf_out_1", 10, 1.5, "2016-07-12T14:43:28Z", "abc")
+        self.assertEqual(("2016-07-12T14:43:28Z", "abc"), index.get("rdf_out_1", 10, 1.5))
+        # changed size or modification time invalidates the entry
+        self.assertIsNone(index.get("rdf_out_1", 11, 1.5))
+        self.assertIsNone(index.get("rdf_out_1", 10, 2.5))
+        index.close()
+
+        # index is persistent
+        index = ResourceIndex(self.resource_dir)
+        self.assertEqual(("2016-07-12T14:43:28Z", "abc"), index.get("rdf_out_1", 10, 1.5))
+        index.close()
+
+    def test_discard_and_retain(self):
+        index = ResourceIndex(self.resource_dir)
+        for name in ["rdf_out_1", "rdf_out_2", "rdf_out_3"]:
+            index.put(name, 1, 1.0, "ts", "md5")
+
+        index.discard(["rdf_out_1"])
+        self.assertIsNone(index.get("rdf_out_1", 1, 1.0))
+
+        index.retain(["rdf_out_3"])
+        self.assertIsNone(index.get("rdf_out_2", 1, 1.0))
+        self.assertEqual(("ts", "md5"), index.get("rdf_out_3", 1, 1.0))
+        index.close()
+
+    def test_publish_keeps_index_of_pending_resources(self):
+        self.copy_samples()
+        publish_url = "http://example.com/rdf/pub/"
+        publish_dir = os.path.expanduser("~/tmp/index_test/dump")
+        shutil.rmtree(publish_dir, ignore_errors=True)
+
+        syncer = ZipSynchronizer(self.resource_dir, publish_dir, publish_url, max_files_compressed=2)
+        syncer.publish()
+        self.assertTrue(os.path.isfile(os.path.join(self.resource_dir, FILE_RESOURCE_INDEX)))
+
+        # resources in definitive zips are removed from the index; pending resources are indexed
+        index = ResourceIndex(self.resource_dir)
+        rows = index.connect().execute("SELECT filename FROM resources").fetchall()
+        index.close()
+        pending = sorted(os.path.basename(p) for p in glob(os.path.join(self.resource_dir, "rdf_out_*")))
+        # the last file in sort order is never listed
+        self.assertEqual(pending[:-1], sorted(name for (name,) in rows))
@@ -0,0 +1,112 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, shutil, tempfile, unittest
+from storage import S3Storage, publish_order
+from synchronizer import RS_RESOURCE_DUMP_XML, RS_CAPABILITY_LIST_XML
+from zipsynchronizer import ZipSynchronizer
+
+SAMPLE_FILES = ["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+                "rdf_out_00000000000000-00000000000003", "rdf_out_99999999999999-99999999999999", "started_at.txt"]
+
+
+class StandInObjectStore(object):
+    """
+    Keeps objects in memory and logs the keys of objects stored, as an S3 client of an object store would.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.stored = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body.read()
+        self.stored.append(Key)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = "upload-%d" % len(self.uploads)
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": "etag-%d" % PartNumber}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = "".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+        self.stored.append(Key)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            self.objects.pop(item["Key"], None)
+
+    def list_objects_v2(self, Bucket, Prefix, **kwargs):
+        return {"Contents": [{"Key": key} for key in sorted(self.objects) if key.startswith(Prefix)],
+                "IsTruncated": False}
+
+
+class TestStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__name__))), "sample")
+        self.resource_dir = os.path.join(self.work_dir, "source")
+        os.makedirs(self.resource_dir)
+        for filename in SAMPLE_FILES:
+            shutil.copy(os.path.join(sample_dir, filename), self.resource_dir)
+        self.sink_dir = os.path.join(self.work_dir, "sink")
+        # the name of a publish directory is the base64 translation of a graph iri
+        self.publish_dir = os.path.join(self.sink_dir, "aHR0cDovL2V4YW1wbGUuY29tCg==")
+        self.store = StandInObjectStore()
+        self.storage = S3Storage(self.sink_dir, "bucket", "dumps/", part_size=200, client=self.store)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def publish(self):
+        ZipSynchronizer(self.resource_dir, self.publish_dir, "http://example.com/", max_files_compressed=1,
+                        storage=self.storage).publish()
+
+    def key(self, name):
+        return "dumps/aHR0cDovL2V4YW1wbGUuY29tCg==/" + name
+
+    def test_publish_order(self):
+        names = [RS_CAPABILITY_LIST_XML, RS_RESOURCE_DUMP_XML, "resource-dump-00001.xml", "manifest_part_def_00000.xml",
+                 "part_def_00000.zip"]
+        self.assertEqual(list(reversed(names)), sorted(names, key=publish_order))
+
+    def test_sync(self):
+        self.publish()
+
+        zips = sorted(name for name in os.listdir(self.publish_dir) if name.endswith(".zip"))
+        self.assertTrue(len(zips) > 1)
+        for name in os.listdir(self.publish_dir):
+            if not name.startswith("vql_"):
+                with open(os.path.join(self.publish_dir, name), "rb") as local_file:
+                    self.assertEqual(local_file.read(), self.store.objects[self.key(name)])
+        # documents are stored after the packages they refer to
+        stored = self.store.stored
+        self.assertTrue(max(stored.index(self.key(name)) for name in zips) < stored.index(self.key(RS_RESOURCE_DUMP_XML)))
+        self.assertEqual(self.key(RS_CAPABILITY_LIST_XML), stored[-1])
+        # packages larger than part_size are uploaded in parts
+        self.assertTrue(any(len(self.store.objects[self.key(name)]) > 200 for name in zips))
+
+        # a run without changes stores nothing
+        del self.store.stored[:]
+        self.publish()
+        self.assertEqual([], self.store.stored)
+
+        # only new packages and changed documents are stored
+        self.storage.root = self.sink_dir
+        os.remove(os.path.join(self.publish_dir, zips[0]))
+        self.storage.sync(self.publish_dir)
+        self.assertNotIn(self.key(zips[0]), self.store.objects)
+        self.assertIn(self.key(zips[1]), self.store.objects)
+
+        self.storage.clear()
+        self.assertEqual({}, self.store.objects)
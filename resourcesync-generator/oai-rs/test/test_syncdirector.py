@@ -1,4 +1,106 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import base64, os, shutil, unittest
+from resync.sitemap import Sitemap
+from resync.source_description import SourceDescription
+from syncdirector import SyncDirector, FILE_HANDSHAKE, FILE_INDEX, DIR_GENERATIONS
+from synchronizer import RS_WELL_KNOWN, RS_RESOURCESYNC, RS_CAPABILITY_LIST_XML
 
+GRAPHS = ["http://localhost:8890/one", "http://localhost:8890/two", "http://localhost:8890/three"]
+SAMPLE_FILES = ["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+                "rdf_out_00000000000000-00000000000003", "rdf_out_99999999999999-99999999999999"]
+
+
+class TestSyncDirector(unittest.TestCase):
+
+    def create_source(self, source_dir):
+        src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__name__))), "sample")
+        shutil.rmtree(source_dir, ignore_errors=True)
+        os.makedirs(source_dir)
+        shutil.copy(os.path.join(src_dir, "started_at.txt"), os.path.join(source_dir, FILE_HANDSHAKE))
+        with open(os.path.join(source_dir, FILE_INDEX), "w") as index_file:
+            for graph in GRAPHS:
+                dirname = base64.urlsafe_b64encode(graph + "\n")
+                index_file.write("%s,%s\n" % (graph, dirname))
+                os.makedirs(os.path.join(source_dir, dirname))
+                for filename in SAMPLE_FILES:
+                    shutil.copy(os.path.join(src_dir, filename), os.path.join(source_dir, dirname))
+
+    def synchronize(self, workers):
+        source_dir = os.path.expanduser("~/tmp/director_test/source")
+        sink_dir = os.path.expanduser("~/tmp/director_test/sink")
+        self.create_source(source_dir)
+        shutil.rmtree(sink_dir, ignore_errors=True)
+
+        director = SyncDirector(source_dir, sink_dir, "http://example.com/rdf/pub/",
+                                "zipsynchronizer.ZipSynchronizer", max_files_compressed=2, workers=workers)
+        director.synchronize()
+
+        src_desc = SourceDescription()
+        with open(os.path.join(sink_dir, RS_WELL_KNOWN, RS_RESOURCESYNC), "r") as src_desc_file:
+            Sitemap().parse_xml(src_desc_file, resources=src_desc)
+        return director, src_desc
+
+    def test_synchronize_graph_directories(self):
+        director, src_desc = self.synchronize(workers=1)
+
+        self.assertEqual(len(GRAPHS) * 2, director.total_count_def_resources)
+        self.assertEqual(len(GRAPHS), director.total_diff_end_resources)
+        self.assertEqual(len(GRAPHS), len(src_desc.resources))
+        for uri in src_desc.resources.keys():
+            self.assertTrue(uri.endswith(RS_CAPABILITY_LIST_XML))
+
+    def test_synchronize_with_workers(self):
+        director_1, src_desc_1 = self.synchronize(workers=1)
+        director_n, src_desc_n = self.synchronize(workers=3)
+
+        self.assertEqual(director_1.total_count_def_resources, director_n.total_count_def_resources)
+        self.assertEqual(director_1.total_diff_end_resources, director_n.total_diff_end_resources)
+        self.assertEqual(sorted(src_desc_1.resources.keys()), sorted(src_desc_n.resources.keys()))
+
+    def test_invalid_workers(self):
+        self.assertRaises(RuntimeError, SyncDirector, "source", "sink", "http://example.com/",
+                          "zipsynchronizer.ZipSynchronizer", workers=0)
+
+    def test_synchronize_changed_directories(self):
+        director, src_desc = self.synchronize(workers=1)
+        src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__name__))), "sample")
+        for graph in GRAPHS[:2]:
+            shutil.copy(os.path.join(src_dir, "rdf_out_20140101010101-00000000000000"),
+                        os.path.join(director.source_dir, base64.urlsafe_b64encode(graph + "\n")))
+
+        director.synchronize([base64.urlsafe_b64encode(GRAPHS[0] + "\n")])
+
+        # Only the first graph directory is published: its old package end and the new file fill a complete package.
+        self.assertEqual(2, director.total_count_def_resources)
+        self.assertEqual(-1, director.total_diff_end_resources)
+
+    def test_synchronize_versioned(self):
+        source_dir = os.path.expanduser("~/tmp/director_test/source")
+        sink_dir = os.path.expanduser("~/tmp/director_test/sink")
+        self.create_source(source_dir)
+        shutil.rmtree(sink_dir, ignore_errors=True)
+        director = SyncDirector(source_dir, sink_dir, "http://example.com/rdf/pub/",
+                                "zipsynchronizer.ZipSynchronizer", max_files_compressed=2, versioned=True)
+        director.synchronize()
+
+        first = os.path.join(DIR_GENERATIONS, director.handshake)
+        dirname = base64.urlsafe_b64encode(GRAPHS[0] + "\n")
+        self.assertEqual(os.path.join(first, dirname), os.readlink(os.path.join(sink_dir, dirname)))
+        self.assertTrue(os.path.isfile(os.path.join(sink_dir, dirname, RS_CAPABILITY_LIST_XML)))
+        self.assertTrue(os.path.isfile(os.path.join(sink_dir, RS_WELL_KNOWN, RS_RESOURCESYNC)))
+
+        # a new handshake is built alongside the published generation, which is removed after the switch
+        with open(os.path.join(source_dir, FILE_HANDSHAKE), "w") as hs_file:
+            hs_file.write("20170101000000")
+        shutil.rmtree(os.path.join(source_dir, base64.urlsafe_b64encode(GRAPHS[2] + "\n")))
+        director.synchronize()
+        director.collector.join()
+
+        second = os.path.join(DIR_GENERATIONS, "20170101000000")
+        self.assertEqual(os.path.join(second, dirname), os.readlink(os.path.join(sink_dir, dirname)))
+        self.assertFalse(os.path.lexists(os.path.join(sink_dir, base64.urlsafe_b64encode(GRAPHS[2] + "\n"))))
+        self.assertFalse(os.path.exists(os.path.join(sink_dir, first)))
+        with open(os.path.join(sink_dir, FILE_HANDSHAKE), "r") as hs_file:
+            self.assertEqual("20170101000000", hs_file.read())
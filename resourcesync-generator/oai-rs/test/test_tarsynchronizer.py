@@ -0,0 +1,67 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, shutil, tarfile, unittest
+import tarsynchronizer
+from glob import glob
+from io import BytesIO
+from resync.resource_dump_manifest import ResourceDumpManifest
+from resync.sitemap import Sitemap
+from resync.utils import compute_md5_for_file
+from synchronizer import PREFIX_END_PART
+from tarsynchronizer import TarSynchronizer
+
+NAMES = ["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+         "rdf_out_00000000000000-00000000000003"]
+
+
+class TestTarSynchronizer(unittest.TestCase):
+
+    def publish(self, compression):
+        """
+        Publish the sample files in a tar package with compression.
+        :param compression: 'xz' or 'zstd'
+        :return: the path of the end package
+        """
+        self.src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__name__))), "sample")
+        resource_dir = os.path.join(self.src_dir, "test")
+        shutil.rmtree(resource_dir, ignore_errors=True)
+        os.makedirs(resource_dir)
+        for filename in NAMES + ["started_at.txt"]:
+            shutil.copy(os.path.join(self.src_dir, filename), resource_dir)
+        publish_dir = os.path.expanduser("~/tmp/tarrer_test/dump")
+        shutil.rmtree(publish_dir, ignore_errors=True)
+
+        syncer = TarSynchronizer(resource_dir, publish_dir, "http://example.com/rdf/pub/", compression=compression)
+        syncer.publish()
+
+        extension = tarsynchronizer.EXTENSIONS[compression]
+        tar_end_files = glob(os.path.join(publish_dir, PREFIX_END_PART + "*" + extension))
+        self.assertEqual(1, len(tar_end_files))
+        return tar_end_files[0]
+
+    def assert_package(self, tar):
+        self.assertEqual(NAMES[:2] + ["manifest.xml"], tar.getnames())
+        manifest = ResourceDumpManifest()
+        Sitemap().parse_xml(tar.extractfile("manifest.xml"), resources=manifest)
+        for resource in manifest:
+            self.assertEqual(compute_md5_for_file(os.path.join(self.src_dir, resource.path)), resource.md5)
+            self.assertEqual(open(os.path.join(self.src_dir, resource.path), "rb").read(),
+                             tar.extractfile(resource.path).read())
+
+    @unittest.skipIf(tarsynchronizer.lzma is None, "lzma module not installed")
+    def test_publish_xz(self):
+        tar_end_file = self.publish("xz")
+        with tarfile.open(fileobj=tarsynchronizer.lzma.LZMAFile(tar_end_file)) as tar:
+            self.assert_package(tar)
+
+    @unittest.skipIf(tarsynchronizer.zstandard is None, "zstandard module not installed")
+    def test_publish_zstd(self):
+        tar_end_file = self.publish("zstd")
+        with open(tar_end_file, "rb") as package:
+            data = tarsynchronizer.zstandard.ZstdDecompressor().decompressobj().decompress(package.read())
+        with tarfile.open(fileobj=BytesIO(data)) as tar:
+            self.assert_package(tar)
+
+    def test_unsupported_compression(self):
+        self.assertRaises(RuntimeError, TarSynchronizer, "source", "sink", "http://example.com/", compression="gzip")
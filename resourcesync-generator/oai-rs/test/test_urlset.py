@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, shutil, unittest
+import urlset
+from resync.resource import Resource
+from resync.resource_dump import ResourceDump
+from resync.sitemap import Sitemap
+from urlset import Urlset
+
+
+class TestUrlset(unittest.TestCase):
+
+    def setUp(self):
+        self.publish_dir = os.path.expanduser("~/tmp/urlset_test")
+        shutil.rmtree(self.publish_dir, ignore_errors=True)
+        os.makedirs(self.publish_dir)
+        self.path = os.path.join(self.publish_dir, "resource-dump.xml")
+
+    @staticmethod
+    def zip_resource(name):
+        return Resource(uri="http://example.com/rdf/pub/%s.zip" % name, lastmod="2016-07-12T14:43:28Z",
+                        length=100, md5="9KUpadFs+e5WSU3higieWw==", mime_type="application/zip")
+
+    @staticmethod
+    def template():
+        rs_dump = ResourceDump()
+        rs_dump.md_at = "2016-07-12T14:43:28Z"
+        rs_dump.link_set(rel="up", href="http://example.com/rdf/pub/capability-list.xml")
+        return rs_dump
+
+    def read(self):
+        rs_dump = ResourceDump()
+        with open(self.path, "r") as rs_dump_file:
+            Sitemap().parse_xml(rs_dump_file, resources=rs_dump)
+        return rs_dump
+
+    def test_update_same_as_resync(self):
+        doc = Urlset(self.path)
+        doc.update([self.zip_resource("part_def_00000"), self.zip_resource("part_end_00000")],
+                   md_completed="2016-07-12T14:43:29Z", template=self.template())
+        doc.update([self.zip_resource("part_def_00001")],
+                   excluded_locs=["http://example.com/rdf/pub/part_end_00000.zip"],
+                   md_completed="2016-07-12T14:43:30Z", template=self.template())
+
+        expected = self.template()
+        expected.add(self.zip_resource("part_def_00000"))
+        expected.add(self.zip_resource("part_def_00001"))
+        expected.md_completed = "2016-07-12T14:43:30Z"
+        with open(self.path, "r") as rs_dump_file:
+            self.assertEqual(expected.as_xml(), rs_dump_file.read())
+
+    def test_update_in_small_blocks(self):
+        doc = Urlset(self.path)
+        doc.update([self.zip_resource("part_def_%05d" % i) for i in range(10)], template=self.template())
+        block_size = urlset.BLOCK_SIZE
+        urlset.BLOCK_SIZE = 7
+        try:
+            doc.update([self.zip_resource("part_def_00010")],
+                       excluded_locs=["http://example.com/rdf/pub/part_def_00003.zip"], template=self.template())
+        finally:
+            urlset.BLOCK_SIZE = block_size
+
+        locs = list(doc.locs())
+        self.assertEqual(10, len(locs))
+        self.assertNotIn("http://example.com/rdf/pub/part_def_00003.zip", locs)
+        self.assertEqual(10, len(self.read()))
+
+    def test_missing_excluded_loc(self):
+        doc = Urlset(self.path)
+        doc.update([self.zip_resource("part_def_00000")], template=self.template())
+        with open(self.path, "r") as rs_dump_file:
+            before = rs_dump_file.read()
+
+        self.assertRaises(RuntimeError, doc.update, [self.zip_resource("part_def_00001")],
+                          excluded_locs=["http://example.com/rdf/pub/part_end_00000.zip"], template=self.template())
+        with open(self.path, "r") as rs_dump_file:
+            self.assertEqual(before, rs_dump_file.read())
+        self.assertFalse(os.path.isfile(self.path + ".tmp"))
+
+    def test_excluded_prefix(self):
+        doc = Urlset(self.path)
+        doc.update([self.zip_resource("part_def_00000"), self.zip_resource("part_end_00000")],
+                   template=self.template())
+        removed = doc.update(excluded_prefix="http://example.com/rdf/pub/part_end_", template=self.template())
+
+        self.assertEqual(["http://example.com/rdf/pub/part_end_00000.zip"], removed)
+        self.assertEqual(["http://example.com/rdf/pub/part_def_00000.zip"], list(doc.locs()))
@@ -0,0 +1,42 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, shutil, time, unittest
+import watcher
+from watcher import PollingWatcher, InotifyWatcher, SHAM_RDF_OUT_FILE
+
+
+class TestWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.source_dir = os.path.expanduser("~/tmp/watcher_test/source")
+        shutil.rmtree(self.source_dir, ignore_errors=True)
+        os.makedirs(os.path.join(self.source_dir, "one"))
+        os.makedirs(os.path.join(self.source_dir, "two"))
+        self.touch("one")
+
+    def touch(self, dirname, mtime=None):
+        path = os.path.join(self.source_dir, dirname, SHAM_RDF_OUT_FILE)
+        open(path, "a").close()
+        os.utime(path, (mtime, mtime) if mtime else None)
+
+    def test_polling_watcher(self):
+        sham_watcher = PollingWatcher(self.source_dir, poll_interval=0.01)
+        self.assertEqual(set(), sham_watcher.wait(0))
+
+        self.touch("two")
+        self.assertEqual({"two"}, sham_watcher.wait(0))
+        self.touch("one", time.time() + 10)
+        self.assertEqual({"one"}, sham_watcher.wait(0))
+        self.assertEqual(set(), sham_watcher.wait(0.02))
+
+    @unittest.skipIf(watcher.pyinotify is None, "pyinotify module not installed")
+    def test_inotify_watcher(self):
+        sham_watcher = InotifyWatcher(self.source_dir)
+        try:
+            self.assertEqual(set(), sham_watcher.wait(0.01))
+            self.touch("two")
+            self.touch("")
+            self.assertEqual({"", "two"}, sham_watcher.wait(1))
+        finally:
+            sham_watcher.close()
@@ -1,7 +1,11 @@
 
 import os, shutil, unittest
-from zipsynchronizer import ZipSynchronizer
-from synchronizer import PREFIX_END_PART, PREFIX_COMPLETED_PART
+from zipfile import ZipFile, ZIP_STORED
+from zipsynchronizer import ZipSynchronizer, REL_DUPLICATE
+from resync.resource_dump_manifest import ResourceDumpManifest
+from resync.sitemap import Sitemap
+from synchronizer import PREFIX_END_PART, PREFIX_COMPLETED_PART, RS_RESOURCE_DUMP_XML, RS_RESOURCE_DUMP_PART
+from urlset import Urlset
 from glob import glob
 
 
@@ -93,7 +97,182 @@ class TestZipSynchronizer(unittest.TestCase):
         zip_end_files = glob(os.path.join(publish_dir, PREFIX_END_PART + "*.zip"))
         self.assertEqual(0, len(zip_end_files))
 
+    def test_publish_incremental_zip_end(self):
+        resource_dir = self.copy_files(["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+            "rdf_out_00000000000000-00000000000003", "started_at.txt"])
+        publish_url = "http://example.com/rdf/pub/"
+        publish_dir = os.path.expanduser("~/tmp/zipper_test/dump")
+        shutil.rmtree(publish_dir, ignore_errors=True)
+
+        syncer = ZipSynchronizer(resource_dir, publish_dir, publish_url, max_files_compressed=10)
+        syncer.publish()
+
+        # add another file; entries of the old zip end are copied into the new zip end
+        self.copy_files(["rdf_out_20140101010101-00000000000000"], rmtree=False)
+        syncer = ZipSynchronizer(resource_dir, publish_dir, publish_url, max_files_compressed=10)
+        syncer.publish()
+
+        zip_end_files = glob(os.path.join(publish_dir, PREFIX_END_PART + "*.zip"))
+        self.assertEqual(1, len(zip_end_files))
+        with ZipFile(zip_end_files[0]) as zf:
+            self.assertIsNone(zf.testzip())
+            names = zf.namelist()
+            self.assertEqual(["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+                              "rdf_out_00000000000000-00000000000003", "manifest.xml"], names)
+            for name in names[:-1]:
+                with open(os.path.join(resource_dir, name), "rb") as source:
+                    self.assertEqual(source.read(), zf.read(name))
+
+    def test_publish_resource_dump_index(self):
+        resource_dir = self.copy_files(["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+            "rdf_out_00000000000000-00000000000003", "rdf_out_20140101010101-00000000000000",
+            "rdf_out_20150101010101-00000000000000", "started_at.txt"])
+        publish_url = "http://example.com/rdf/pub/"
+        publish_dir = os.path.expanduser("~/tmp/zipper_test/dump")
+        shutil.rmtree(publish_dir, ignore_errors=True)
+
+        syncer = ZipSynchronizer(resource_dir, publish_dir, publish_url, max_files_compressed=1, max_dump_entries=2)
+        syncer.publish()
+
+        rs_dump_path = os.path.join(publish_dir, RS_RESOURCE_DUMP_XML)
+        self.assertTrue(Urlset.is_index(rs_dump_path))
+        parts = sorted(glob(os.path.join(publish_dir, RS_RESOURCE_DUMP_PART + "*.xml")))
+        self.assertEqual(2, len(parts))
+        self.assertEqual(2, len(list(Urlset(parts[0]).locs())))
+
+        # a new file only affects the newest resource dump document
+        mtime_first = os.stat(parts[0]).st_mtime
+        self.copy_files(["rdf_out_20160101010101-00000000000000"], rmtree=False)
+        syncer = ZipSynchronizer(resource_dir, publish_dir, publish_url, max_files_compressed=1, max_dump_entries=2)
+        syncer.publish()
 
+        self.assertEqual(mtime_first, os.stat(parts[0]).st_mtime)
+        parts = sorted(glob(os.path.join(publish_dir, RS_RESOURCE_DUMP_PART + "*.xml")))
+        self.assertEqual(3, len(parts))
+        locs = []
+        for part in parts:
+            part_locs = list(Urlset(part).locs())
+            self.assertTrue(len(part_locs) <= 2)
+            locs.extend(part_locs)
+        zips = sorted(glob(os.path.join(publish_dir, PREFIX_COMPLETED_PART + "*.zip")))
+        self.assertEqual([publish_url + os.path.basename(z) for z in zips], locs)
 
+    def test_publish_stored(self):
+        resource_dir = self.copy_files(["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+            "rdf_out_00000000000000-00000000000003", "started_at.txt"])
+        publish_url = "http://example.com/rdf/pub/"
+        publish_dir = os.path.expanduser("~/tmp/zipper_test/dump")
+        shutil.rmtree(publish_dir, ignore_errors=True)
 
+        syncer = ZipSynchronizer(resource_dir, publish_dir, publish_url, compression="store")
+        syncer.publish()
 
+        zip_end_files = glob(os.path.join(publish_dir, PREFIX_END_PART + "*.zip"))
+        with ZipFile(zip_end_files[0]) as zf:
+            self.assertIsNone(zf.testzip())
+            for zinfo in zf.infolist():
+                self.assertEqual(ZIP_STORED, zinfo.compress_type)
+
+    def test_publish_deduplicated(self):
+        resource_dir = self.copy_files(["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000003",
+            "rdf_out_99999999999999-99999999999999", "started_at.txt"])
+        # duplicate in the same package, in a later completed package and in the zip end
+        shutil.copy(os.path.join(resource_dir, "rdf_out_00000000000000-00000000000001"),
+                    os.path.join(resource_dir, "rdf_out_00000000000000-00000000000002"))
+        shutil.copy(os.path.join(resource_dir, "rdf_out_00000000000000-00000000000003"),
+                    os.path.join(resource_dir, "rdf_out_00000000000000-00000000000004"))
+        shutil.copy(os.path.join(resource_dir, "rdf_out_00000000000000-00000000000001"),
+                    os.path.join(resource_dir, "rdf_out_00000000000000-00000000000005"))
+        publish_url = "http://example.com/rdf/pub/"
+        publish_dir = os.path.expanduser("~/tmp/zipper_test/dump")
+        shutil.rmtree(publish_dir, ignore_errors=True)
+
+        syncer = ZipSynchronizer(resource_dir, publish_dir, publish_url, max_files_compressed=2, deduplicate=True)
+        syncer.publish()
+
+        def manifest(zip_name):
+            with ZipFile(os.path.join(publish_dir, zip_name)) as zf:
+                names = zf.namelist()
+                rdm = ResourceDumpManifest()
+                Sitemap().parse_xml(fh=zf.open("manifest.xml"), resources=rdm)
+            return names, dict((os.path.basename(r.uri), r) for r in rdm)
+
+        names, resources = manifest(PREFIX_COMPLETED_PART + "00000.zip")
+        self.assertEqual(["rdf_out_00000000000000-00000000000001", "manifest.xml"], names)
+        duplicate = resources["rdf_out_00000000000000-00000000000002"]
+        self.assertIsNone(duplicate.path)
+        self.assertEqual(resources["rdf_out_00000000000000-00000000000001"].md5, duplicate.md5)
+        self.assertEqual({"rel": REL_DUPLICATE, "href": publish_url + PREFIX_COMPLETED_PART + "00000.zip",
+                          "path": "rdf_out_00000000000000-00000000000001"}, duplicate.link(REL_DUPLICATE))
+
+        names, resources = manifest(PREFIX_COMPLETED_PART + "00001.zip")
+        self.assertEqual(["rdf_out_00000000000000-00000000000003", "manifest.xml"], names)
+        self.assertEqual(publish_url + PREFIX_COMPLETED_PART + "00001.zip",
+                         resources["rdf_out_00000000000000-00000000000004"].link_href(REL_DUPLICATE))
+
+        names, resources = manifest(PREFIX_END_PART + "00000.zip")
+        self.assertEqual(["manifest.xml"], names)
+        self.assertEqual(publish_url + PREFIX_COMPLETED_PART + "00000.zip",
+                         resources["rdf_out_00000000000000-00000000000005"].link_href(REL_DUPLICATE))
+        self.assertEqual(3, syncer.metrics.get("vql_resources_deduplicated", graph="dump"))
+
+    def test_invalid_compression(self):
+        self.assertRaises(RuntimeError, ZipSynchronizer, "source", "sink", "http://example.com/", compression="xz")
+        self.assertRaises(RuntimeError, ZipSynchronizer, "source", "sink", "http://example.com/", compression_level=10)
+
+    def test_list_resources_chunks(self):
+        resource_dir = self.copy_files(["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+            "rdf_out_00000000000000-00000000000003", "rdf_out_20140101010101-00000000000000",
+            "rdf_out_20150101010101-00000000000000", "rdf_out_99999999999999-99999999999999"])
+        syncer = ZipSynchronizer(resource_dir, os.path.expanduser("~/tmp/zipper_test/dump"), "http://example.com/",
+                                 max_files_compressed=2)
+
+        chunks = [([os.path.basename(r.uri) for r in rl], complete, exhausted)
+                  for rl, complete, exhausted in syncer.list_resources_chunks()]
+        self.assertEqual([(["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002"],
+                           True, False),
+                          (["rdf_out_00000000000000-00000000000003", "rdf_out_20140101010101-00000000000000"],
+                           True, False),
+                          (["rdf_out_20150101010101-00000000000000"], False, True)], chunks)
+
+        # files added while chunks are generated wait for the next run
+        chunks = syncer.list_resources_chunks()
+        next(chunks)
+        self.copy_files(["rdf_out_20160101010101-00000000000000"], rmtree=False)
+        self.assertEqual([2, 1], [len(rl) for rl, complete, exhausted in chunks])
+        syncer.resource_index.close()
+
+        self.copy_files(["started_at.txt"])
+        self.assertEqual([(0, False, True)],
+                         [(len(rl), complete, exhausted) for rl, complete, exhausted in syncer.list_resources_chunks()])
+
+    def test_package_limits(self):
+        files = ["rdf_out_00000000000000-00000000000001", "rdf_out_00000000000000-00000000000002",
+                 "rdf_out_00000000000000-00000000000003", "rdf_out_20140101010101-00000000000000",
+                 "rdf_out_99999999999999-99999999999999"]
+        resource_dir = self.copy_files(files)
+        lengths = [os.stat(os.path.join(resource_dir, filename)).st_size for filename in files]
+        publish_dir = os.path.expanduser("~/tmp/zipper_test/dump")
+
+        # packages are cut when their resources exceed max_package_size; the rest is carried to the next package
+        syncer = ZipSynchronizer(resource_dir, publish_dir, "http://example.com/",
+                                 max_package_size=lengths[2] + lengths[3])
+        chunks = [([os.path.basename(r.uri) for r in rl], complete, exhausted)
+                  for rl, complete, exhausted in syncer.list_resources_chunks()]
+        self.assertEqual([(files[0:2], True, False), (files[2:4], False, True)], chunks)
+        syncer.resource_index.close()
+
+        # a resource exceeding the limit fills a package on its own
+        syncer = ZipSynchronizer(resource_dir, publish_dir, "http://example.com/", max_package_size=1)
+        self.assertEqual([1, 1, 1, 1], [len(rl) for rl, complete, exhausted in syncer.list_resources_chunks()])
+        syncer.resource_index.close()
+
+        # the end package is completed when its oldest resource is max_package_age old
+        shutil.rmtree(publish_dir, ignore_errors=True)
+        ZipSynchronizer(resource_dir, publish_dir, "http://example.com/", max_package_age=100 * 365 * 86400).publish()
+        self.assertEqual(1, len(glob(os.path.join(publish_dir, PREFIX_END_PART + "*.zip"))))
+        ZipSynchronizer(resource_dir, publish_dir, "http://example.com/", max_package_age=0).publish()
+        self.assertEqual(0, len(glob(os.path.join(publish_dir, PREFIX_END_PART + "*.zip"))))
+        self.assertEqual(1, len(glob(os.path.join(publish_dir, PREFIX_COMPLETED_PART + "*.zip"))))
+        self.assertEqual(["rdf_out_99999999999999-99999999999999"],
+                         [os.path.basename(path) for path in glob(os.path.join(resource_dir, "rdf_out_*"))])
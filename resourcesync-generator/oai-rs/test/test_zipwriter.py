@@ -0,0 +1,35 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, shutil, unittest
+from resync.utils import compute_md5_for_file
+from zipfile import ZipFile
+from zipwriter import ZipWriter
+
+
+class TestZipWriter(unittest.TestCase):
+
+    def test_write_resource(self):
+        src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__name__))), "sample")
+        zip_dir = os.path.expanduser("~/tmp/zipwriter_test")
+        shutil.rmtree(zip_dir, ignore_errors=True)
+        os.makedirs(zip_dir)
+        zip_path = os.path.join(zip_dir, "test.zip")
+        names = ["rdf_out_00000000000000-00000000000001", "rdf_out_20140101010101-00000000000000"]
+
+        zf = ZipWriter(zip_path)
+        for name in names:
+            path = os.path.join(src_dir, name)
+            md5, head = zf.write_resource(path, name)
+            self.assertEqual(compute_md5_for_file(path), md5)
+            with open(path, "rb") as source:
+                self.assertTrue(source.read().startswith(head))
+        zf.writestr("manifest.xml", "<urlset/>")
+        zf.close()
+
+        self.assertEqual(compute_md5_for_file(zip_path), zf.md5())
+        with ZipFile(zip_path) as zf:
+            self.assertIsNone(zf.testzip())
+            for name in names:
+                with open(os.path.join(src_dir, name), "rb") as source:
+                    self.assertEqual(source.read(), zf.read(name))
@@ -0,0 +1,259 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import os, re
+from StringIO import StringIO
+from xml.sax.saxutils import quoteattr, unescape
+
+BLOCK_SIZE = 64 * 1024
+
+URL_OPEN = "<url>"
+URL_CLOSE = "</url>"
+URLSET_CLOSE = "</urlset>"
+URLSET_OPEN = "<urlset"
+SITEMAPINDEX_OPEN = "<sitemapindex"
+
+HEADER = "header"
+URL = "url"
+FOOTER = "footer"
+
+
+class Urlset(object):
+    """
+    A sitemap document of the <urlset> format on disc, as written by the resync library, that is updated by
+    streaming instead of parsing the whole document into a tree and serializing it again.
+    Memory use of an update does not depend on the number of <url> elements already in the document.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize a new Urlset.
+        :param path: the local path of the document
+        :return:
+        """
+        self.path = path
+        self.count = None
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def size(self):
+        return os.stat(self.path).st_size
+
+    @staticmethod
+    def is_index(path):
+        """
+        See if the document at path is a sitemapindex, only reading the start of the document.
+        :param path: the local path of the document
+        :return: True if the document is a <sitemapindex>, False otherwise
+        """
+        with open(path, "r") as fp:
+            start = fp.read(1024)
+        return SITEMAPINDEX_OPEN in start and URLSET_OPEN not in start
+
+    def locs(self):
+        """
+        Iterate over the locations of <url> elements in the document.
+        :return: generator of loc
+        """
+        with open(self.path, "r") as fp:
+            for kind, text in self.tokens(fp):
+                if kind == URL:
+                    yield self.loc(text)
+
+    def update(self, resources=(), excluded_locs=(), excluded_prefix=None, md_completed=None, template=None):
+        """
+        Append resources to the document and remove excluded <url> elements from it. The document is written to a
+        temporary file that replaces the document when completed.
+        :param resources: resync.Resources to append
+        :param excluded_locs: locations of <url> elements to remove. All of them should be present in the document.
+        :param excluded_prefix: remove <url> elements whose location starts with this prefix.
+        :param md_completed: new value of the completed attribute of the document's rs:md element, if any.
+        :param template: an empty resync list of the type of this document. Used to serialize new resources and,
+                if the document does not exist, its header.
+        :return: the locations of the removed <url> elements.
+        After the update the number of <url> elements in the document is available as self.count.
+        """
+        excluded_locs = set(excluded_locs)
+        removed = []
+        count = 0
+        tmp_path = self.path + ".tmp"
+        source = open(self.path, "r") if self.exists() else StringIO(template.as_xml())
+        try:
+            with open(tmp_path, "w") as out:
+                for kind, text in self.tokens(source):
+                    if kind == HEADER:
+                        if md_completed is not None:
+                            text = self.set_completed(text, md_completed)
+                        out.write(text)
+                    elif kind == URL:
+                        loc = self.loc(text)
+                        if loc in excluded_locs or (excluded_prefix and loc.startswith(excluded_prefix)):
+                            removed.append(loc)
+                        else:
+                            out.write(text)
+                            count += 1
+                    else:
+                        for url in self.serialize(resources, template):
+                            out.write(url)
+                            count += 1
+                        out.write(text)
+
+            missing = excluded_locs.difference(removed)
+            if missing:
+                raise RuntimeError("Could not find %s in %s" % (", ".join(sorted(missing)), self.path))
+            os.rename(tmp_path, self.path)
+            self.count = count
+        finally:
+            source.close()
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+
+        return removed
+
+    def roll_over(self, keep, target, part, index_url):
+        """
+        Move all but the first keep <url> elements of the document to a new document. The first keep <url>
+        elements are written to target, which may be the path of this document. The new document has the same header
+        as this document. Both documents link to their sitemapindex.
+        :param keep: the number of <url> elements to keep
+        :param target: the local path for the document with the first keep <url> elements
+        :param part: the local path for the new document with the remaining <url> elements
+        :param index_url: the public url of the sitemapindex
+        """
+        tmp_target = target + ".tmp"
+        tmp_part = part + ".tmp"
+        count = 0
+        try:
+            with open(self.path, "r") as source, open(tmp_target, "w") as out_target, open(tmp_part, "w") as out_part:
+                for kind, text in self.tokens(source):
+                    if kind == HEADER:
+                        text = self.set_index(text, index_url)
+                        out_target.write(text)
+                        out_part.write(text)
+                    elif kind == URL:
+                        if count < keep:
+                            out_target.write(text)
+                        else:
+                            out_part.write(text)
+                        count += 1
+                    else:
+                        out_target.write(text)
+                        out_part.write(text)
+            os.rename(tmp_part, part)
+            os.rename(tmp_target, target)
+        finally:
+            for tmp_path in (tmp_target, tmp_part):
+                if os.path.isfile(tmp_path):
+                    os.remove(tmp_path)
+
+        self.path = target
+        self.count = min(keep, count)
+
+    @staticmethod
+    def serialize(resources, template):
+        """
+        Serialize resources to <url> elements in the same way the resync library does.
+        :param resources: resync.Resources to serialize
+        :param template: an empty resync list used to serialize the resources
+        :return: list of <url> elements as strings
+        """
+        container = template.__class__()
+        for resource in resources:
+            container.add(resource)
+        if len(container) == 0:
+            return []
+        return [text for kind, text in Urlset.tokens(StringIO(container.as_xml())) if kind == URL]
+
+    @staticmethod
+    def tokens(fp):
+        """
+        Split a <urlset> document in its header, the <url> elements and its footer, reading fp in blocks.
+        :param fp: file-like object to read from
+        :return: generator of (kind, text), kind being one of HEADER, URL, FOOTER
+        """
+        buf = ""
+        header_done = False
+        while True:
+            block = fp.read(BLOCK_SIZE)
+            buf += block
+            if not header_done:
+                start = Urlset.first_of(buf, URL_OPEN, URLSET_CLOSE)
+                if start < 0:
+                    if not block:
+                        raise RuntimeError("Not a sitemap document of the <urlset> format")
+                    continue
+                yield HEADER, buf[:start]
+                buf = buf[start:]
+                header_done = True
+
+            while True:
+                stripped = buf.lstrip()
+                if not stripped.startswith(URL_OPEN):
+                    break
+                end = stripped.find(URL_CLOSE)
+                if end < 0:
+                    break
+                end += len(URL_CLOSE)
+                yield URL, stripped[:end]
+                buf = stripped[end:]
+
+            if not block:
+                if URLSET_CLOSE not in buf:
+                    raise RuntimeError("Unexpected end of sitemap document of the <urlset> format")
+                yield FOOTER, buf
+                return
+
+    @staticmethod
+    def first_of(text, *markers):
+        """
+        :return: the lowest index in text of any of the markers, or -1 if none of them is found.
+        """
+        found = [i for i in (text.find(marker) for marker in markers) if i >= 0]
+        return min(found) if found else -1
+
+    @staticmethod
+    def loc(url):
+        """
+        :param url: a <url> element as string
+        :return: the location in the <url> element
+        """
+        match = re.search("<loc>([^<]*)</loc>", url)
+        if match is None:
+            raise RuntimeError("No location found in %s" % url)
+        return unescape(match.group(1))
+
+    @staticmethod
+    def set_completed(header, md_completed):
+        """
+        Set the completed attribute of the rs:md element in the header of a document.
+        :param header: the header of a document
+        :param md_completed: the new value
+        :return: the header with the new value
+        """
+        md_start = header.find("<rs:md ")
+        if md_start < 0:
+            raise RuntimeError("No rs:md element found in %s" % header)
+        md_end = header.find("/>", md_start)
+        md = header[md_start:md_end]
+        if re.search(' completed="[^"]*"', md):
+            md = re.sub(' completed="[^"]*"', ' completed="%s"' % md_completed, md)
+        else:
+            md = md.rstrip() + ' completed="%s" ' % md_completed
+        return header[:md_start] + md + header[md_end:]
+
+    @staticmethod
+    def set_index(header, index_url):
+        """
+        Add a link to the sitemapindex to the header of a document, if not already present.
+        :param header: the header of a document
+        :param index_url: the public url of the sitemapindex
+        :return: the header with a link to the sitemapindex
+        """
+        if 'rel="index"' in header:
+            return header
+        start = header.find(URLSET_OPEN)
+        if start < 0:
+            raise RuntimeError("No <urlset> element found in %s" % header)
+        end = header.find(">", start) + 1
+        return header[:end] + '<rs:ln href=%s rel="index" />' % quoteattr(index_url) + header[end:]
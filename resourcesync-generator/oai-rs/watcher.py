@@ -0,0 +1,126 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import os, time
+from synchronizer import SHAM_RDF_OUT_FILE
+
+# Watch a source directory for the sham rdf patch file that marks the end of a run of the chained services.
+# pyinotify is an optional dependency; without it the source directory is polled.
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+
+def create_watcher(source_dir, poll_interval=10):
+    """
+    Create an InotifyWatcher if pyinotify is installed, otherwise a PollingWatcher.
+    :param source_dir: the directory to watch
+    :param poll_interval: seconds between polls of a PollingWatcher
+    :return: a watcher
+    """
+    if pyinotify is not None:
+        return InotifyWatcher(source_dir)
+    return PollingWatcher(source_dir, poll_interval)
+
+
+class PollingWatcher(object):
+    """
+    Detects the (re)appearance of the sham rdf patch file in source_dir and its subdirectories by comparing the
+    modification time of the sham file in each directory with the time seen at the previous poll.
+    The sham file is removed and touched again by the chained service with each run.
+    """
+
+    def __init__(self, source_dir, poll_interval=10):
+        """
+        Initialize a new PollingWatcher. Sham files present at initialization are not reported as changes.
+        :param source_dir: the directory to watch
+        :param poll_interval: seconds between polls
+        :return:
+        """
+        self.source_dir = source_dir
+        self.poll_interval = poll_interval
+        self.seen = self.scan()
+
+    def scan(self):
+        """
+        :return: dictionary of directory name relative to source_dir ("" for source_dir itself) and the modification
+                    time of the sham file in that directory
+        """
+        sham_times = {}
+        if not os.path.isdir(self.source_dir):
+            return sham_times
+        dirnames = [""] + [name for name in os.listdir(self.source_dir)
+                           if os.path.isdir(os.path.join(self.source_dir, name))]
+        for dirname in dirnames:
+            try:
+                sham_times[dirname] = os.stat(os.path.join(self.source_dir, dirname, SHAM_RDF_OUT_FILE)).st_mtime
+            except OSError:
+                pass
+        return sham_times
+
+    def wait(self, timeout):
+        """
+        Wait until a sham file appeared or timeout seconds have passed.
+        :param timeout: maximum seconds to wait
+        :return: set of names of directories relative to source_dir in which a sham file appeared, possibly empty
+        """
+        deadline = time.time() + timeout
+        while True:
+            sham_times = self.scan()
+            changed = set(dirname for dirname, mtime in sham_times.iteritems() if self.seen.get(dirname) != mtime)
+            self.seen = sham_times
+            remaining = deadline - time.time()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.poll_interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Detects the (re)appearance of the sham rdf patch file in source_dir and its subdirectories with inotify.
+    """
+
+    def __init__(self, source_dir):
+        """
+        Initialize a new InotifyWatcher.
+        :param source_dir: the directory to watch
+        :return:
+        """
+        self.source_dir = os.path.abspath(source_dir)
+        if not os.path.isdir(self.source_dir):
+            os.makedirs(self.source_dir)
+        self.changed = set()
+        self.watch_manager = pyinotify.WatchManager()
+        self.notifier = pyinotify.Notifier(self.watch_manager, self.process_event)
+        mask = pyinotify.IN_CREATE | pyinotify.IN_ATTRIB | pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO
+        self.watch_manager.add_watch(self.source_dir, mask, rec=True, auto_add=True)
+
+    def process_event(self, event):
+        if event.name == SHAM_RDF_OUT_FILE:
+            dirname = os.path.relpath(event.path, self.source_dir)
+            self.changed.add("" if dirname == "." else dirname)
+
+    def wait(self, timeout):
+        """
+        Wait until a sham file appeared or timeout seconds have passed.
+        :param timeout: maximum seconds to wait
+        :return: set of names of directories relative to source_dir in which a sham file appeared, possibly empty
+        """
+        deadline = time.time() + timeout
+        while not self.changed:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not self.notifier.check_events(timeout=int(remaining * 1000)):
+                break
+            self.notifier.read_events()
+            self.notifier.process_events()
+        changed = self.changed
+        self.changed = set()
+        return changed
+
+    def close(self):
+        self.notifier.stop()
@@ -1,21 +1,31 @@
 #! /usr/bin/env python2
 # -*- coding: utf-8 -*-
 
-import os, re, shutil, base64, resync.w3c_datetime as w3cdt
+import os, re, shutil, time, base64, resync.w3c_datetime as w3cdt
+from copy import copy
 from glob import glob
 from synchronizer import Synchronizer, PREFIX_MANIFEST, PREFIX_COMPLETED_PART, PREFIX_END_PART, \
-    RS_RESOURCE_DUMP_XML, RS_CAPABILITY_LIST_XML
-from resync.dump import Dump
+    RS_RESOURCE_DUMP_XML, RS_RESOURCE_DUMP_PART, RS_CAPABILITY_LIST_XML
 from resync.resource import Resource
-from resync.resource_list import ResourceList
 from resync.sitemap import Sitemap
 from resync.resource_dump import ResourceDump
 from resync.resource_dump_manifest import ResourceDumpManifest
 from resync.capability_list import CapabilityList
 from resync.utils import compute_md5_for_file
+from resourceindex import ContentIndex
+from patchfiles import PatchFileList
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+from zipwriter import ZipWriter, BLOCK_SIZE
+from urlset import Urlset
 
 # Strategy to publish rdf patch files as resource dumps in g-zip format.
 
+COMPRESSION_DEFLATE = "deflate"
+COMPRESSION_STORE = "store"
+
+# Relation of the link from a duplicate resource in a manifest to the package and path of the resource it duplicates.
+REL_DUPLICATE = "duplicate"
+
 
 class ZipSynchronizer(Synchronizer):
     """
@@ -29,13 +39,38 @@ class ZipSynchronizer(Synchronizer):
         ... The ResourceSync framework follows community-defined limits for when to publish multiple documents of
         the <urlset> format. At time of publication of this specification, the limit is 50,000 items per document
         and a document size of 50 MB. ...
+
+    If resource-dump.xml exceeds these limits it is turned into a sitemapindex of resource-dump-xxxxx.xml documents.
+    Only the newest of these documents is updated.
+
+    Resources are deflated with the given compression level or, with compression 'store', packaged uncompressed.
+
+    With deduplicate, a resource with the same content as a resource in a completed package, or as a resource
+    earlier in the same package, is not packaged again. Its entry in the manifest has no path, but a link
+
+        <rs:ln rel="duplicate" href="{url of the package}" path="{path in the package}"/>
+
+    to the resource it duplicates.
     """
 
+    EXTENSION = ".zip"
+    MIME_TYPE = "application/zip"
+
     def __init__(self, resource_dir, publish_dir, publish_url,
                  src_desc_url=None,
                  max_files_compressed=50000,
                  write_separate_manifest=True,
-                 move_resources=False):
+                 move_resources=False,
+                 incremental=True,
+                 max_dump_entries=50000,
+                 max_dump_size=50 * 1024 * 1024,
+                 compression=COMPRESSION_DEFLATE,
+                 compression_level=None,
+                 deduplicate=False,
+                 storage=None,
+                 max_package_size=None,
+                 max_compressed_size=None,
+                 max_package_age=None):
         """
         Initialize a new ZipSynchronizer.
         :param resource_dir: the source directory for resources
@@ -45,14 +80,69 @@ class ZipSynchronizer(Synchronizer):
         :param max_files_compressed: the maximum number of resource files that should be compressed in one zip file
         :param write_separate_manifest: will each zip file be accompanied by a separate resourcedump manifest.
         :param move_resources: Do we move the zipped resources to publish_dir or simply delete them from resource_dir.
+        :param incremental: Do we copy resources already compressed in the old zip end file into the new zip end file
+                instead of compressing them again.
+        :param max_dump_entries: the maximum number of zip files listed in one resource dump document
+        :param max_dump_size: the maximum size in bytes of one resource dump document
+        :param compression: the compression of resources in packages, 'deflate' or 'store'
+        :param compression_level: the compression level, 0-9 for 'deflate'. Default: None, the default level
+        :param deduplicate: refer to published resources with the same md5 instead of packaging them again.
+                Default: False
+        :param storage: the storage backend publish_dir is served from, see storage.py. Default: None, publish_dir
+                itself
+        :param max_package_size: a package is complete when its resources exceed this number of bytes, before
+                compression. Default: None, no limit
+        :param max_compressed_size: a package is complete when it would exceed this number of bytes. The size of a
+                package is estimated from the compression ratio of the last package written. Default: None, no limit
+        :param max_package_age: a package is complete when its oldest resource is this number of seconds old.
+                Default: None, no limit
         :return:
         """
         Synchronizer.__init__(self, resource_dir, publish_dir, publish_url, src_desc_url, max_files_compressed,
                               write_separate_manifest, move_resources)
+        self.incremental = incremental
+        self.max_dump_entries = max_dump_entries
+        self.max_dump_size = max_dump_size
+        self.hash_on_write = True
+        self.compression = compression
+        self.compression_level = compression_level
+        self.verify_compression()
+        self.deduplicate = deduplicate
+        self.content_index = ContentIndex(self.resource_dir)
+        # md5 -> path of resources in the package being written, and their lengths
+        self.package_content = {}
+        self.package_lengths = set()
+        if storage is not None:
+            self.storage = storage
+        self.max_package_size = max_package_size
+        self.max_compressed_size = max_compressed_size
+        self.max_package_age = max_package_age
+        # compressed size / size of resources of the last package written
+        self.compression_ratio = None
+
+    def verify_compression(self):
+        """
+        Verify the compression and compression level of this synchronizer.
+        :raises RuntimeError: if the compression or compression level is not supported
+        """
+        if self.compression not in (COMPRESSION_DEFLATE, COMPRESSION_STORE):
+            raise RuntimeError("Unsupported compression for %s: %s" % (self.__class__.__name__, self.compression))
+        if self.compression_level is not None and not 0 <= self.compression_level <= 9:
+            raise RuntimeError("Compression level should be 0-9, got %s." % str(self.compression_level))
+
+    def strip_extension(self, path):
+        """
+        :param path: path or name of a package
+        :return: path without the package extension
+        """
+        if path.endswith(self.EXTENSION):
+            return path[:-len(self.EXTENSION)]
+        return path
 
     def publish(self):
         """
-        Try and publish or remove zip end if something went wrong.
+        Try and publish or remove zip end if something went wrong. Store publish_dir with the storage backend
+        if publishing succeeded.
 
         :return: (  boolean indicating if change in sink directory or subdirectories,
                     amount of resources definitively packaged,
@@ -67,10 +157,10 @@ class ZipSynchronizer(Synchronizer):
             #print "Created %s" % self.publish_dir
 
         try:
-            return self.do_publish()
+            result = self.do_publish()
         except:
             # Something went wrong. Best we can do is clean up end of zip chain.
-            zip_end_files = glob(os.path.join(self.publish_dir, PREFIX_END_PART + "*.zip"))
+            zip_end_files = glob(os.path.join(self.publish_dir, PREFIX_END_PART + "*" + self.EXTENSION))
             for ze_file in zip_end_files:
                 os.remove(ze_file)
                 print "error recovery: removed %s" % ze_file
@@ -88,25 +178,24 @@ class ZipSynchronizer(Synchronizer):
                 print "error recovery: removed %s" % ze_mani
 
             # remove zip-end entries from resource-dump.xml
-            rs_dump_path = os.path.join(self.publish_dir, RS_RESOURCE_DUMP_XML)
-            rs_dump = ResourceDump()
-            if os.path.isfile(rs_dump_path):
-                with open(rs_dump_path, "r") as rs_dump_file:
-                    sm = Sitemap()
-                    sm.parse_xml(rs_dump_file, resources=rs_dump)
-
-            prefix = self.publish_url + PREFIX_END_PART
-
-            for uri in rs_dump.resources.keys():
-                if uri.startswith(prefix):
-                    del rs_dump.resources[uri]
+            rs_dump_path = self.newest_resource_dump()
+            rs_dump_doc = Urlset(rs_dump_path)
+            if rs_dump_doc.exists():
+                prefix = self.publish_url + PREFIX_END_PART
+                for uri in rs_dump_doc.update(excluded_prefix=prefix, template=ResourceDump()):
                     print "error recovery: removed %s from %s" % (uri, rs_dump_path)
 
-            with open(rs_dump_path, "w") as rs_dump_file:
-                rs_dump_file.write(rs_dump.as_xml())
-
             print "error recovery: walk through error recovery completed. Now raising ..."
             raise
+        finally:
+            self.resource_index.close()
+            self.content_index.close()
+
+        # Packages and metadata are only stored when the publish directory is consistent.
+        with self.metrics.timer("upload", graph=self.graph):
+            size = self.storage.sync(self.publish_dir)[1]
+        self.metrics.add("vql_bytes_uploaded", size, graph=self.graph)
+        return result
 
     def do_publish(self):
         """
@@ -130,48 +219,96 @@ class ZipSynchronizer(Synchronizer):
         state_changed = False
         exhausted = False
 
+        chunks = self.list_resources_chunks()
         while not exhausted:
-            resourcelist, exhausted = self.list_resources_chunk()
+            with self.metrics.timer("list", graph=self.graph):
+                patch_files, complete, exhausted = next(chunks)
 
-            if len(resourcelist) == self.max_files_compressed:  # complete zip
+            if complete:
                 state_changed = True
+                resourcelist = patch_files.resource_list()
                 count_def_resources += len(resourcelist)
+                zip_old = path_zip_end_old if self.incremental else None
                 zip_resource = self.create_zip(resourcelist, PREFIX_COMPLETED_PART, False,
-                                               self.write_separate_manifest)
+                                               self.write_separate_manifest, zip_old, rl_end_old)
                 new_zips.add(zip_resource)
+                if self.deduplicate:
+                    self.index_content(resourcelist, zip_resource.uri)
                 # move resources from resource_dir
-                for resource in resourcelist:
-                    r_path = os.path.join(self.resource_dir, resource.path)
-                    if self.move_resources:
-                        shutil.move(r_path, self.publish_dir)
-                    else:
-                        os.remove(r_path)
-            elif not self.is_same(resourcelist, rl_end_old):
+                with self.metrics.timer("cleanup", graph=self.graph):
+                    for resource in resourcelist:
+                        r_path = os.path.join(self.resource_dir, resource.path)
+                        if self.move_resources:
+                            shutil.move(r_path, os.path.join(self.publish_dir, os.path.basename(r_path)))
+                        else:
+                            os.remove(r_path)
+                    self.resource_index.discard([os.path.basename(resource.path) for resource in resourcelist])
+            elif not self.is_same(patch_files, rl_end_old):
                 assert exhausted
                 state_changed = True
-                if len(resourcelist) > 0:
+                if len(patch_files) > 0:
+                    resourcelist = patch_files.resource_list()
                     diff_end_resources += len(resourcelist)
+                    zip_old = path_zip_end_old if self.incremental else None
                     zip_resource = self.create_zip(resourcelist, PREFIX_END_PART, True,
-                                                   self.write_separate_manifest)
+                                                   self.write_separate_manifest, zip_old, rl_end_old)
                     new_zips.add(zip_resource)
 
         # publish new metadata. Exclude zip_end_old
         if state_changed:
-            self.publish_metadata(new_zips, path_zip_end_old)
+            with self.metrics.timer("publish_metadata", graph=self.graph):
+                self.publish_metadata(new_zips, path_zip_end_old)
+            self.content_index.commit()
 
         # remove old zip end file, resource list and manifest;
         # account for difference of resources provisionally packaged.
         if state_changed and path_zip_end_old:
             diff_end_resources -= len(rl_end_old)
-            os.remove(path_zip_end_old)
-            os.remove(os.path.splitext(path_zip_end_old)[0] + ".xml")
-            manifest = PREFIX_MANIFEST + os.path.splitext(os.path.basename(path_zip_end_old))[0] + ".xml"
-            manifest_file = os.path.join(self.publish_dir, manifest)
-            if os.path.isfile(manifest_file):
-                os.remove(manifest_file)
-
+            with self.metrics.timer("cleanup", graph=self.graph):
+                os.remove(path_zip_end_old)
+                os.remove(self.strip_extension(path_zip_end_old) + ".xml")
+                manifest = PREFIX_MANIFEST + self.strip_extension(os.path.basename(path_zip_end_old)) + ".xml"
+                manifest_file = os.path.join(self.publish_dir, manifest)
+                if os.path.isfile(manifest_file):
+                    os.remove(manifest_file)
+
+        # files listed minus files moved into completed packages, without listing resource_dir again.
+        self.metrics.set("vql_pending_files", self.count_listed - count_def_resources, graph=self.graph)
         return state_changed, count_def_resources, diff_end_resources
 
+    def fill_package(self, patch_files):
+        """
+        Decide whether files fill a package. A package is full with max_files_compressed files, when its resources
+        exceed max_package_size, when it would exceed max_compressed_size or when its oldest resource is
+        max_package_age old. A single resource that exceeds a size limit fills a package on its own.
+        :param patch_files: PatchFileList of the next files to package, at most max_files_compressed
+        :return: the number of files at the start of patch_files that fill a package,
+                    or None if patch_files do not fill a package
+        """
+        count = Synchronizer.fill_package(self, patch_files)
+        limits = []
+        if self.max_package_size is not None:
+            limits.append(self.max_package_size)
+        if self.max_compressed_size is not None:
+            limits.append(self.max_compressed_size / (self.compression_ratio or 1.0))
+        if limits:
+            limit = min(limits)
+            size = 0
+            for i, patch_file in enumerate(patch_files.files):
+                size += patch_file.length or 0
+                if size > limit:
+                    count = min(count or len(patch_files), max(i, 1))
+                    break
+
+        if count is None and self.max_package_age is not None and len(patch_files) > 0:
+            oldest = patch_files.files[0]
+            timestamp = oldest.timestamp
+            if timestamp is None:
+                timestamp = w3cdt.str_to_datetime(self.extract_timestamp(os.path.join(self.resource_dir, oldest.name)))
+            if time.time() - timestamp >= self.max_package_age:
+                count = len(patch_files)
+        return count
+
     def publish_metadata(self, new_zips, exluded_zip=None):
         """
         (Re)publish metadata with addition of new_zips. An excluded zip will be removed from previously published
@@ -184,34 +321,22 @@ class ZipSynchronizer(Synchronizer):
         capa_list_url = self.publish_url + RS_CAPABILITY_LIST_XML
         capa_list_path = os.path.join(self.publish_dir, RS_CAPABILITY_LIST_XML)
 
+        # Header for a new resource-dump: set start time.
         rs_dump = ResourceDump()
-
-        # Load existing resource-dump, if any. Else set start time.
-        if os.path.isfile(rs_dump_path):
-            with open(rs_dump_path, "r") as rs_dump_file:
-                sm = Sitemap()
-                sm.parse_xml(rs_dump_file, resources=rs_dump)
-
-        else:
-            rs_dump.md_at = w3cdt.datetime_to_str(no_fractions=True)
-            rs_dump.link_set(rel="up", href=capa_list_url)
+        rs_dump.md_at = w3cdt.datetime_to_str(no_fractions=True)
+        rs_dump.link_set(rel="up", href=capa_list_url)
 
         # Remove excluded zip, if any
+        excluded_locs = []
         if exluded_zip:
-            loc = self.publish_url + os.path.basename(exluded_zip)
-            if loc in rs_dump.resources:
-                del rs_dump.resources[loc]
-            else:
-                raise RuntimeError("Could not find %s in %s" % (loc, rs_dump_path))
+            excluded_locs.append(self.publish_url + os.path.basename(exluded_zip))
 
-        # Add new zips
-        for resource in new_zips:
-            rs_dump.add(resource)
-
-        # Write resource-dump.xml
-        rs_dump.md_completed = w3cdt.datetime_to_str(no_fractions=True)
-        with open(rs_dump_path, "w") as rs_dump_file:
-            rs_dump_file.write(rs_dump.as_xml())
+        # Add new zips and write resource-dump.xml, without loading the existing resource-dump.
+        # If resource-dump.xml is a sitemapindex, only the newest resource dump is written.
+        rs_dump_doc = Urlset(self.newest_resource_dump())
+        rs_dump_doc.update(new_zips, excluded_locs=excluded_locs,
+                           md_completed=w3cdt.datetime_to_str(no_fractions=True), template=rs_dump)
+        self.roll_over_resource_dump(rs_dump_doc, len(new_zips))
 
         # There are several ways to decode base64, among them
         # iri = base64.b64decode(os.path.basename(self.publish_dir)).rstrip('\n')
@@ -231,78 +356,160 @@ class ZipSynchronizer(Synchronizer):
 
             print "New %s. See %s" % (RS_CAPABILITY_LIST_XML, capa_list_url)
 
+    def read_resource_dump_index(self):
+        """
+        Read resource-dump.xml if it is a sitemapindex.
+        :return: the sitemapindex as a ResourceDump with the resource dump documents as resources,
+                    or None if resource-dump.xml is not a sitemapindex.
+        """
+        rs_dump_path = os.path.join(self.publish_dir, RS_RESOURCE_DUMP_XML)
+        if not os.path.isfile(rs_dump_path) or not Urlset.is_index(rs_dump_path):
+            return None
+
+        index = ResourceDump()
+        with open(rs_dump_path, "r") as rs_dump_file:
+            sm = Sitemap()
+            sm.parse_xml(rs_dump_file, resources=index, sitemapindex=True)
+        return index
+
+    def newest_resource_dump(self):
+        """
+        :return: the local path of the resource dump document that new zips are added to.
+        """
+        index = self.read_resource_dump_index()
+        if index is None or len(index) == 0:
+            return os.path.join(self.publish_dir, RS_RESOURCE_DUMP_XML)
+        return os.path.join(self.publish_dir, os.path.basename(list(index)[-1].uri))
+
+    def roll_over_resource_dump(self, rs_dump_doc, count_new):
+        """
+        If the resource dump document rs_dump_doc exceeds max_dump_entries or max_dump_size, move zips to
+        new resource dump documents and list all resource dump documents in resource-dump.xml as a sitemapindex.
+        Zips added during this run go to the new resource dump document, unless that would exceed max_dump_entries.
+        :param rs_dump_doc: the Urlset of the newest resource dump document, just updated
+        :param count_new: the number of zips added to rs_dump_doc during this run
+        """
+        rs_dump_url = self.publish_url + RS_RESOURCE_DUMP_XML
+        rs_dump_path = os.path.join(self.publish_dir, RS_RESOURCE_DUMP_XML)
+
+        index = None
+        while rs_dump_doc.count > self.max_dump_entries or rs_dump_doc.size() > self.max_dump_size:
+            keep = rs_dump_doc.count - count_new
+            if not 0 < keep <= self.max_dump_entries:
+                keep = self.max_dump_entries
+            if keep >= rs_dump_doc.count:
+                break
+
+            if index is None:
+                index = self.read_resource_dump_index()
+            if index is None:
+                # resource-dump.xml becomes the first resource dump document of a sitemapindex
+                index = ResourceDump()
+                index.md_at = w3cdt.datetime_to_str(no_fractions=True)
+                index.link_set(rel="up", href=self.publish_url + RS_CAPABILITY_LIST_XML)
+                index.add(Resource(uri=self.publish_url + "%s%05d.xml" % (RS_RESOURCE_DUMP_PART, 0)))
+            target = os.path.join(self.publish_dir, os.path.basename(list(index)[-1].uri))
+
+            part_name = "%s%05d.xml" % (RS_RESOURCE_DUMP_PART, len(index))
+            total = rs_dump_doc.count
+            rs_dump_doc.roll_over(keep, target, os.path.join(self.publish_dir, part_name), rs_dump_url)
+            index.add(Resource(uri=self.publish_url + part_name))
+            print "New %s. See %s" % (part_name, self.publish_url + part_name)
+
+            rs_dump_doc = Urlset(os.path.join(self.publish_dir, part_name))
+            rs_dump_doc.count = total - keep
+            count_new = min(count_new, rs_dump_doc.count)
+
+        if index is not None:
+            index.md_completed = w3cdt.datetime_to_str(no_fractions=True)
+            index.default_capability()
+            with open(rs_dump_path + ".tmp", "w") as index_file:
+                Sitemap().resources_as_xml(index, sitemapindex=True, fh=index_file)
+            os.rename(rs_dump_path + ".tmp", rs_dump_path)
+
     def get_state_published(self):
         """
-        See if publish_dir has a zip end file. If so, return the path of the zip end file and the resourcelist
-        (with local paths) of resources published in the zip end file.
+        See if publish_dir has a zip end file. If so, return the path of the zip end file and the PatchFileList
+        of resources published in the zip end file.
         :return:    - the path to the zip end file or None if there is no zip end file.
-                    - the resourcelist of resources published in zip end file or an empty list if there is no zip end file.
+                    - the PatchFileList of resources published in zip end file or an empty list if there is no zip end
+                      file.
         """
         path_zip_end_old = None
-        rl_end_old = ResourceList()
+        rl_end_old = PatchFileList(self.publish_url)
 
-        zip_end_files = glob(os.path.join(self.publish_dir, PREFIX_END_PART + "*.zip"))
+        zip_end_files = glob(os.path.join(self.publish_dir, PREFIX_END_PART + "*" + self.EXTENSION))
         if len(zip_end_files) > 1:
-            raise RuntimeError("Found more than one %s*.zip files. Inconsistent structure of %s."
-                               % (PREFIX_END_PART, self.publish_dir))
+            raise RuntimeError("Found more than one %s*%s files. Inconsistent structure of %s."
+                               % (PREFIX_END_PART, self.EXTENSION, self.publish_dir))
         elif len(zip_end_files) == 1:
             path_zip_end_old = zip_end_files[0]
 
         if path_zip_end_old:
-            rl_file = open(os.path.splitext(path_zip_end_old)[0] + ".xml", "r")
-            sm = Sitemap()
-            sm.parse_xml(rl_file, resources=rl_end_old)
-            rl_file.close()
+            rl_end_old = PatchFileList.read(self.strip_extension(path_zip_end_old) + ".xml")
+            size = sum(patch_file.length or 0 for patch_file in rl_end_old.files)
+            if size > 0:
+                self.compression_ratio = os.stat(path_zip_end_old).st_size / float(size)
 
         return path_zip_end_old, rl_end_old
 
-    def create_zip(self, resourcelist, prefix, write_list=False, write_manifest=True):
+    def create_zip(self, resourcelist, prefix, write_list=False, write_manifest=True, zip_old=None, rl_old=None):
         """
         Dump local resources in resourcelist to a zip file with the specified prefix. The index in the zip file name
         will be 1 higher than the last zip file index with the same prefix. A manifest.xml will be included in the
         zip.
-        --  The resync.Dump.write_zip method used in this method has the side effect of changing local paths in
+        --  The write_zip method used in this method has the side effect of changing local paths in
             resourcelist into paths relative in zip.
         :param resourcelist: resources to zip
         :param prefix: prefix of the zip file
         :param write_list: True if resourcelist should be written to local disc. Default: False
         :param write_manifest: True if a separate manifest file should be written to disc, False otherwise. Default: True
+        :param zip_old: path to a previously written zip file whose entries can be copied. Default: None
+        :param rl_old: the PatchFileList of resources packaged in zip_old. Default: None
         :return: the created zip as a resync.Resource.
         """
 
         md_at = None  # w3cdt.datetime_to_str(no_fractions=True) # attribute gets lost in read > write cycle with resync library.
         index = -1
-        zipfiles = sorted(glob(os.path.join(self.publish_dir, prefix + "*.zip")))
+        zipfiles = sorted(glob(os.path.join(self.publish_dir, prefix + "*" + self.EXTENSION)))
         if len(zipfiles) > 0:
             last_zip_file = zipfiles[len(zipfiles) - 1]
             basename = os.path.basename(last_zip_file)
             index = int(re.findall('\d+', basename)[0])
 
         zip_name = "%s%05d" % (prefix, index + 1)
+        zip_path = os.path.join(self.publish_dir, zip_name + self.EXTENSION)
+        # paths in resourcelist will be stripped, md5 and lastmod of resources will be set.
+        with self.metrics.timer("create_zip", graph=self.graph):
+            size = sum(resource.length or 0 for resource in resourcelist)
+            self.metrics.add("vql_bytes_read", size, graph=self.graph)
+            md5 = self.write_zip(resourcelist, zip_path, zip_old, rl_old)
+            if md5 is None:
+                md5 = compute_md5_for_file(zip_path)
+
         if (write_list):
-            # this is the given resourcelist with local paths. As such it is *not* the resourcedump_manifest.
+            # this is the given resourcelist. As such it is *not* the resourcedump_manifest.
             rl_file = open(os.path.join(self.publish_dir, zip_name + ".xml"), "w")
             rl_file.write(resourcelist.as_xml())
             rl_file.close()
 
-        zip_path = os.path.join(self.publish_dir, zip_name + ".zip")
-        dump = Dump()
-        dump.path_prefix = self.resource_dir
-        dump.write_zip(resourcelist, zip_path)  # paths in resourcelist will be stripped.
         md_completed = None  # w3cdt.datetime_to_str(no_fractions=True) # attribute gets lost in read > write cycle with resync library.
         #print "Zipped %d resources in %s" % (len(resourcelist), zip_path)
 
-        loc = self.publish_url + zip_name + ".zip"  # mandatory
-        lastmod = self.last_modified(resourcelist)  # optional
-        md_type = "application/zip"                 # recommended
+        loc = self.publish_url + zip_name + self.EXTENSION  # mandatory
+        lastmod = self.last_modified(resourcelist)          # optional
+        md_type = self.MIME_TYPE                            # recommended
         md_length = os.stat(zip_path).st_size
-        md5 = compute_md5_for_file(zip_path)
+        if size > 0:
+            self.compression_ratio = md_length / float(size)
+        self.metrics.add("vql_bytes_written", md_length, graph=self.graph)
+        self.metrics.add("vql_zips_created", 1, graph=self.graph)
 
         zip_resource = Resource(uri=loc, lastmod=lastmod,
                                 length=md_length, md5=md5, mime_type=md_type,
                                 md_at=md_at, md_completed=md_completed)
         if write_manifest:
-            rdm = ResourceDumpManifest(resources=resourcelist.resources)
+            rdm = self.manifest(resourcelist)
             rdm_file = open(os.path.join(self.publish_dir, PREFIX_MANIFEST + zip_name + ".xml"), "w")
             rdm_url = self.publish_url + PREFIX_MANIFEST + zip_name + ".xml"
             rdm_file.write(rdm.as_xml())
@@ -311,6 +518,140 @@ class ZipSynchronizer(Synchronizer):
 
         return zip_resource
 
+    def write_zip(self, resourcelist, zip_path, zip_old=None, rl_old=None):
+        """
+        Write local resources in resourcelist to a zip file, followed by a manifest.xml. Each resource is read only
+        once: its md5 and lastmod are computed while it is compressed, and set on the resource if missing. Resources
+        that are packaged unchanged in zip_old are copied as is from zip_old, without decompressing and
+        recompressing them.
+        --  This method has the side effect of changing local paths in resourcelist into paths relative in zip.
+        :param resourcelist: resources to zip
+        :param zip_path: path to the zip file to write
+        :param zip_old: path to a previously written zip file whose entries can be copied. Default: None
+        :param rl_old: the PatchFileList of resources packaged in zip_old. Default: None
+        :return: the md5 of the zip file or None if it could not be computed while writing.
+        """
+        real_path = {}
+        for resource in resourcelist:
+            archive_path = os.path.relpath(resource.path, self.resource_dir)
+            real_path[archive_path] = resource.path
+            resource.path = archive_path
+
+        old_md5 = {}
+        if zip_old and rl_old is not None:
+            for resource in rl_old:
+                old_md5[resource.uri] = resource.md5
+
+        source = ZipFile(zip_old, "r") if old_md5 else None
+        if self.compression == COMPRESSION_STORE:
+            zf = ZipWriter(zip_path, compression=ZIP_STORED)
+        elif self.compression_level is None:
+            zf = ZipWriter(zip_path, compression=ZIP_DEFLATED)
+        else:
+            zf = ZipWriter(zip_path, compression=ZIP_DEFLATED, compresslevel=self.compression_level)
+        package_url = self.publish_url + os.path.basename(zip_path)
+        self.package_content = {}
+        self.package_lengths = set()
+        try:
+            for resource in resourcelist:
+                if self.refer_duplicate(resource, real_path[resource.path], package_url):
+                    continue
+                zinfo = None
+                if source and resource.md5 is not None and old_md5.get(resource.uri) == resource.md5:
+                    zinfo = source.NameToInfo.get(resource.path)
+                if zinfo:
+                    zf.copy_entry(source, zinfo)
+                else:
+                    md5, head = zf.write_resource(real_path[resource.path], resource.path)
+                    self.index_written_resource(resource, real_path[resource.path], md5, head)
+                self.add_package_content(resource)
+            # The manifest is written last, when md5 of all resources is known.
+            zf.writestr("manifest.xml", self.manifest(resourcelist).as_xml())
+        finally:
+            zf.close()
+            if source:
+                source.close()
+
+        return zf.md5()
+
+    def refer_duplicate(self, resource, path, package_url):
+        """
+        If deduplicate is set and a resource with the same md5 was published in a completed package or earlier in the
+        package being written, link resource to that package and path instead of packaging it.
+        A resource of which the md5 is not known yet is only read in advance if a resource of the same length was
+        published.
+        :param resource: the resource to package, with its path relative in the package
+        :param path: the local path of the resource
+        :param package_url: the url of the package being written
+        :return: True if resource is a duplicate and should not be packaged, False otherwise
+        """
+        if not self.deduplicate:
+            return False
+        if resource.md5 is None:
+            if resource.length not in self.package_lengths and resource.length not in self.content_index.lengths():
+                return False
+            with open(path, "rb") as resource_file:
+                head = resource_file.read(BLOCK_SIZE)
+            self.index_written_resource(resource, path, compute_md5_for_file(path), head)
+
+        if resource.md5 in self.package_content:
+            published = package_url, self.package_content[resource.md5]
+        else:
+            published = self.content_index.get(resource.md5)
+        if published is None:
+            return False
+        resource.link_set(rel=REL_DUPLICATE, href=published[0], path=published[1])
+        self.metrics.add("vql_resources_deduplicated", 1, graph=self.graph)
+        return True
+
+    def add_package_content(self, resource):
+        """
+        Keep md5 and path of a resource packaged in the package being written, so that later duplicates in the same
+        package can refer to it.
+        :param resource: the resource packaged, with its path relative in the package
+        """
+        if self.deduplicate:
+            self.package_content.setdefault(resource.md5, resource.path)
+            self.package_lengths.add(resource.length)
 
+    def index_content(self, resourcelist, package_url):
+        """
+        Keep md5 and path of resources packaged in a completed package in the content index.
+        :param resourcelist: resources in the package, with their paths relative in the package
+        :param package_url: the url of the package
+        """
+        for resource in resourcelist:
+            if resource.link(REL_DUPLICATE) is None:
+                self.content_index.put(resource.md5, resource.length, package_url, resource.path)
 
-
+    def manifest(self, resourcelist):
+        """
+        :param resourcelist: resources in a package, with their paths relative in the package
+        :return: the ResourceDumpManifest of the package. Duplicates are listed without path, as they are not in
+                    the package.
+        """
+        resources = []
+        for resource in resourcelist:
+            if resource.link(REL_DUPLICATE) is not None:
+                resource = copy(resource)
+                resource.path = None
+            resources.append(resource)
+        return ResourceDumpManifest(resources=resources)
+
+    def index_written_resource(self, resource, path, md5, head):
+        """
+        Set md5 and lastmod of a resource that has just been written to a zip file and keep them in the resource index.
+        :param resource: the resource written
+        :param path: the local path of the resource
+        :param md5: the md5 computed while writing
+        :param head: the first block of bytes read from the resource
+        """
+        if resource.lastmod is None:
+            lines = head.split("\n")
+            if len(head) < os.stat(path).st_size:
+                lines.pop()  # may be incomplete
+            t = self.find_checkpoint(lines)
+            resource.lastmod = self.compute_timestamp(t) if t else self.extract_timestamp(path)
+        resource.md5 = md5
+        stat = os.stat(path)
+        self.resource_index.put(os.path.basename(path), stat.st_size, stat.st_mtime, resource.lastmod, md5)
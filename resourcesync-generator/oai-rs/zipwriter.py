@@ -0,0 +1,175 @@
+#! /usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+import base64, copy, hashlib, os, struct, time, zlib
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP64_LIMIT, sizeFileHeader, structFileHeader, \
+    _FH_FILENAME_LENGTH, _FH_EXTRA_FIELD_LENGTH, _DD_SIGNATURE
+
+BLOCK_SIZE = 1024 * 1024
+
+
+class HashingFile(object):
+    """
+    A file opened for writing that computes the md5 of the bytes written to it, as long as it is written
+    sequentially.
+    """
+
+    def __init__(self, path):
+        self.name = path
+        self.fp = open(path, "wb")
+        self.md5 = hashlib.md5()
+        self.position = 0
+        self.sequential = True
+
+    def write(self, data):
+        self.fp.write(data)
+        self.md5.update(data)
+        self.position += len(data)
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        self.fp.seek(offset, whence)
+        if self.fp.tell() != self.position:
+            self.sequential = False
+        self.position = self.fp.tell()
+
+    def flush(self):
+        self.fp.flush()
+
+    def close(self):
+        self.fp.close()
+
+    def digest(self):
+        """
+        :return: the base64-encoded md5 of the file in the same format as resync.utils.compute_md5_for_file,
+                    or None if the file was not written sequentially.
+        """
+        if not self.sequential:
+            return None
+        return base64.b64encode(self.md5.digest())
+
+
+class ZipWriter(ZipFile):
+    """
+    A ZipFile for writing that reads each resource only once: its md5 is computed while it is compressed into the
+    archive. Entries from another zip file can be copied without decompressing and recompressing them.
+    The md5 of the zip file itself is computed while it is written.
+    """
+
+    def __init__(self, file, compression=ZIP_DEFLATED, compresslevel=zlib.Z_DEFAULT_COMPRESSION):
+        """
+        Initialize a new ZipWriter.
+        :param file: path to the zip file to write
+        :param compression: the compression type for new entries
+        :param compresslevel: the deflate level (0-9) for new entries written with write_resource
+        :return:
+        """
+        self.output = HashingFile(file)
+        self.compresslevel = compresslevel
+        ZipFile.__init__(self, self.output, mode="w", compression=compression, allowZip64=True)
+
+    def close(self):
+        """
+        Write the ending records and close the zip file.
+        """
+        ZipFile.close(self)
+        self.output.close()
+
+    def md5(self):
+        """
+        :return: the base64-encoded md5 of the closed zip file, or None if it could not be computed while writing.
+        """
+        return self.output.digest()
+
+    def write_resource(self, path, arcname):
+        """
+        Compress the file at path into the archive under the name arcname. The file is read once; its md5 is computed
+        while compressing. Sizes and CRC are written in a data descriptor after the data, so that the zip file is
+        written sequentially.
+        :param path: the local path of the file
+        :param arcname: the name of the file in the archive
+        :return: (base64-encoded md5 of the file, the first block of bytes read from the file)
+        """
+        st = os.stat(path)
+        zinfo = ZipInfo(arcname, time.localtime(st.st_mtime)[0:6])
+        zinfo.external_attr = (st.st_mode & 0xFFFF) << 16L
+        zinfo.compress_type = self.compression
+        zinfo.flag_bits = 0x08
+        zinfo.file_size = st.st_size
+        zinfo.header_offset = self.fp.tell()
+        self._writecheck(zinfo)
+        self._didModify = True
+
+        zip64 = zinfo.file_size * 1.05 > ZIP64_LIMIT
+        self.fp.write(zinfo.FileHeader(zip64))
+
+        cmpr = None
+        if zinfo.compress_type == ZIP_DEFLATED:
+            cmpr = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15)
+
+        md5 = hashlib.md5()
+        head = None
+        crc = 0
+        file_size = 0
+        compress_size = 0
+        with open(path, "rb") as fp:
+            while True:
+                buf = fp.read(BLOCK_SIZE)
+                if not buf:
+                    break
+                if head is None:
+                    head = buf
+                file_size += len(buf)
+                crc = zlib.crc32(buf, crc) & 0xffffffff
+                md5.update(buf)
+                if cmpr:
+                    buf = cmpr.compress(buf)
+                compress_size += len(buf)
+                self.fp.write(buf)
+        if cmpr:
+            buf = cmpr.flush()
+            compress_size += len(buf)
+            self.fp.write(buf)
+
+        if not zip64 and (file_size > ZIP64_LIMIT or compress_size > ZIP64_LIMIT):
+            raise RuntimeError("File size of %s has increased during compressing" % path)
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = compress_size
+        fmt = "<LLQQ" if zip64 else "<LLLL"
+        self.fp.write(struct.pack(fmt, _DD_SIGNATURE, zinfo.CRC, zinfo.compress_size, zinfo.file_size))
+
+        self.filelist.append(zinfo)
+        self.NameToInfo[zinfo.filename] = zinfo
+        return base64.b64encode(md5.digest()), head or ""
+
+    def copy_entry(self, source, zinfo):
+        """
+        Copy an entry from source into this zip file as is.
+        :param source: an open ZipFile
+        :param zinfo: the ZipInfo of the entry in source
+        """
+        source.fp.seek(zinfo.header_offset)
+        fheader = struct.unpack(structFileHeader, source.fp.read(sizeFileHeader))
+        source.fp.seek(fheader[_FH_FILENAME_LENGTH] + fheader[_FH_EXTRA_FIELD_LENGTH], 1)
+
+        new_info = copy.copy(zinfo)
+        # Sizes and CRC are written in the local header, not in a data descriptor.
+        new_info.flag_bits &= ~0x08
+        new_info.header_offset = self.fp.tell()
+        self._writecheck(new_info)
+        self._didModify = True
+        self.fp.write(new_info.FileHeader())
+
+        remaining = zinfo.compress_size
+        while remaining > 0:
+            buf = source.fp.read(min(BLOCK_SIZE, remaining))
+            if not buf:
+                raise RuntimeError("Unexpected end of %s while copying %s" % (source.filename, zinfo.filename))
+            self.fp.write(buf)
+            remaining -= len(buf)
+
+        self.filelist.append(new_info)
+        self.NameToInfo[new_info.filename] = new_info